@@ -1,17 +1,16 @@
 import { useEffect, useMemo, useState } from 'react';
-import { executeSQL } from '@/services/queryApi';
+import { fetchDashboardPanel, DashboardRollupRow } from '@/services/queryApi';
  
 export function useDashboardData() {
-  const [rawRows, setRawRows] = useState<any[]>([]);
+  const [rawRows, setRawRows] = useState<DashboardRollupRow[]>([]);
   const [loading, setLoading] = useState(true);
  
-  /* ---------------- Fetch ONCE (ALL DATA) ---------------- */
+  /* ---------------- Fetch ONCE (server-side client rollup) ---------------- */
   useEffect(() => {
     async function fetchData() {
       try {
         // IMPORTANT: no month filter → all months aggregated
-        const res = await executeSQL('select * from revenue');
-        setRawRows(res.data);
+        setRawRows(await fetchDashboardPanel('client'));
       } catch (err) {
         console.error('Dashboard fetch failed', err);
       } finally {
@@ -26,22 +25,13 @@ export function useDashboardData() {
   const clientData = useMemo(() => {
     if (!rawRows.length) return [];
  
-    const clientMap = new Map<string, number>();
- 
-    rawRows.forEach((row) => {
-      const revenue = Number(row.actual_revenue) || 0;
-      const client = row.customer;
- 
-      clientMap.set(client, (clientMap.get(client) || 0) + revenue);
-    });
- 
-    const clients = Array.from(clientMap.entries()).map(
-      ([client, revenue]) => ({
-        name: client.replace(/^47D_/, '').split('-')[0].trim(),
-        fullName: client,
-        value: revenue, // USD
-      })
-    );
+    const clients = rawRows
+      .filter((row) => row.label)
+      .map((row) => ({
+        name: row.label!.replace(/^47D_/, '').split('-')[0].trim(),
+        fullName: row.label!,
+        value: Number(row.revenue) || 0, // USD
+      }));
  
     // Sort descending (Pareto requirement)
     clients.sort((a, b) => b.value - a.value);
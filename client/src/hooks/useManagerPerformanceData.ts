@@ -1,16 +1,15 @@
 import { useEffect, useMemo, useState } from 'react';
-import { executeSQL } from '@/services/queryApi';
+import { fetchDashboardPanel, DashboardRollupRow } from '@/services/queryApi';
 
 export function useManagerPerformanceData() {
-  const [rows, setRows] = useState<any[]>([]);
+  const [rows, setRows] = useState<DashboardRollupRow[]>([]);
   const [loading, setLoading] = useState(true);
 
   /* ---------------- Fetch ONCE ---------------- */
   useEffect(() => {
     async function fetchData() {
       try {
-        const res = await executeSQL('select * from revenue');
-        setRows(res.data ?? []);
+        setRows(await fetchDashboardPanel('manager'));
       } catch (err) {
         console.error('Manager performance fetch failed', err);
       } finally {
@@ -31,8 +30,8 @@ export function useManagerPerformanceData() {
     >();
 
     rows.forEach((r) => {
-      const manager = r.manager; // 🔁 change ONLY if column differs
-      const revenue = Number(r.actual_revenue) || 0;
+      const manager = r.label; // project_manager rollup
+      const revenue = Number(r.revenue) || 0;
 
       if (!manager || revenue <= 0) return;
 
@@ -1,23 +1,14 @@
 import { useEffect, useMemo, useState } from 'react';
-import { executeSQL } from '@/services/queryApi';
+import { fetchDashboardPanel, DashboardRollupRow } from '@/services/queryApi';
 
 export function useTimeIntelligenceData() {
-  const [rows, setRows] = useState<any[]>([]);
+  const [rows, setRows] = useState<DashboardRollupRow[]>([]);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
     async function fetchData() {
       try {
-        const res = await executeSQL(`
-          SELECT 
-            month,
-            SUM(actual_revenue) AS revenue
-          FROM revenue
-          GROUP BY month
-          ORDER BY month
-        `);
-
-        setRows(res.data ?? []);
+        setRows(await fetchDashboardPanel('time'));
       } catch (err) {
         console.error('Time intelligence fetch failed', err);
       } finally {
@@ -42,7 +33,7 @@ export function useTimeIntelligenceData() {
           : null;
 
       return {
-        month: new Date(r.month).toLocaleString('en-US', { month: 'short' }),
+        month: new Date(r.label ?? '').toLocaleString('en-US', { month: 'short' }),
         revenue,
         growth,
       };
@@ -1,7 +1,7 @@
 import React, { useState } from 'react';
 import { Sparkles, Send, Bot, User } from 'lucide-react';
 import { cn } from '@/lib/utils';
-import { askAnalyticsQuestion } from '@/services/nlpApi';
+import { streamAnalyticsQuestion } from '@/services/nlpApi';
 
 /* ---------------- Types ---------------- */
 interface Message {
@@ -137,23 +137,62 @@ const AIInsightsChat: React.FC = () => {
     setInputValue('');
     setIsTyping(true);
 
+    // Assistant reply, filled in as pipeline events stream in
+    const replyId = (Date.now() + 1).toString();
+    const updateReply = (patch: Partial<Message>) =>
+      setMessages((prev) =>
+        prev.map((m) => (m.id === replyId ? { ...m, ...patch } : m))
+      );
+
+    let sql = '';
+    let columns: string[] = [];
+    let rows: Record<string, any>[] = [];
+    let started = false;
+
     try {
-      const result = await askAnalyticsQuestion(userMessage.content);
-      const parsed = parseBackendResponse(result);
+      await streamAnalyticsQuestion(userMessage.content, ({ event, data }) => {
+        if (!started) {
+          started = true;
+          setIsTyping(false);
+          setMessages((prev) => [
+            ...prev,
+            { id: replyId, role: 'assistant', content: '🧠 Thinking…', timestamp: new Date() },
+          ]);
+        }
 
-      setMessages((prev) => [
-        ...prev,
-        {
-          id: (Date.now() + 1).toString(),
-          role: 'assistant',
-          timestamp: new Date(),
-          ...(parsed.text ? { content: parsed.text } : {}),
-          ...(parsed.table ? { table: parsed.table } : {}),
-        },
-      ]);
+        switch (event) {
+          case 'token':
+            sql += data.text;
+            updateReply({ content: `🧠 Writing SQL…\n${sql.replace(/```(sql)?/g, '').trim()}` });
+            break;
+          case 'validated':
+          case 'executing':
+            updateReply({ content: '⏳ Running query…' });
+            break;
+          case 'columns':
+            columns = data.columns;
+            break;
+          case 'rows':
+            // Show rows as they arrive; the final layout is decided on "done"
+            rows = rows.concat(data.rows);
+            updateReply({ content: undefined, table: { columns, rows } });
+            break;
+          case 'done': {
+            const parsed = parseBackendResponse({ data: rows });
+            updateReply({ content: parsed.text, table: parsed.table });
+            break;
+          }
+          case 'error':
+            updateReply({
+              content: '⚠️ Sorry, something went wrong while analyzing your data.',
+              table: undefined,
+            });
+            break;
+        }
+      });
     } catch {
       setMessages((prev) => [
-        ...prev,
+        ...prev.filter((m) => m.id !== replyId),
         {
           id: (Date.now() + 2).toString(),
           role: 'assistant',
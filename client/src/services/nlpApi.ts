@@ -23,3 +23,63 @@ export async function askAnalyticsQuestion(question: string) {
 
   return res.data;
 }
+
+/* ---------------- Streamed pipeline (Server-Sent Events) ---------------- */
+export type AnalyticsStreamEvent =
+  | { event: 'stage'; data: { stage: string } }
+  | { event: 'token'; data: { text: string } }
+  | { event: 'sql'; data: { sql: string; cache: any; prompt: any } }
+  | { event: 'validated'; data: Record<string, never> }
+  | { event: 'executing'; data: { rollup: string | null } }
+  | { event: 'columns'; data: { columns: string[]; column_types: string[] } }
+  | { event: 'rows'; data: { rows: Record<string, any>[] } }
+  | { event: 'done'; data: { row_count: number; timings: Record<string, number> } }
+  | { event: 'error'; data: { error: string; stage: string; sql: string | null; retry_after?: number } };
+
+// POST + fetch instead of EventSource, which only supports GET
+export async function streamAnalyticsQuestion(
+  question: string,
+  onEvent: (event: AnalyticsStreamEvent) => void,
+  signal?: AbortSignal
+) {
+  const res = await fetch(`${API_BASE}/api/v1/generate-sql/stream`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      Accept: 'text/event-stream',
+    },
+    body: JSON.stringify({ query: question }),
+    signal,
+  });
+
+  if (!res.ok || !res.body) {
+    throw new Error(`AI service returned ${res.status}`);
+  }
+
+  const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = '';
+
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += value;
+
+    // Events are separated by a blank line
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf('\n\n');
+
+      let event = 'message';
+      let data = '';
+      for (const line of block.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      }
+      if (data) {
+        onEvent({ event, data: JSON.parse(data) } as AnalyticsStreamEvent);
+      }
+    }
+  }
+}
@@ -13,4 +13,54 @@ export async function executeSQL(query: string, parameters = {}) {
   
     return response.json();
   }
-  
\ No newline at end of file
+  
+export type DashboardPanel = 'client' | 'skill' | 'designation' | 'manager' | 'time';
+
+export interface DashboardRollupRow {
+  label: string | null;
+  revenue: number;
+  row_count: number;
+}
+
+export interface DashboardRollups {
+  panels: Record<DashboardPanel, DashboardRollupRow[]>;
+  total: DashboardRollupRow | null;
+}
+
+// Every panel comes from one GROUPING SETS request, shared by all dashboard
+// hooks and reused for a minute (pages mounting together hit the server once)
+const DASHBOARD_TTL_MS = 60_000;
+
+let dashboardRequest: { promise: Promise<DashboardRollups>; fetchedAt: number } | null = null;
+
+export function fetchDashboard(): Promise<DashboardRollups> {
+  if (dashboardRequest && Date.now() - dashboardRequest.fetchedAt < DASHBOARD_TTL_MS) {
+    return dashboardRequest.promise;
+  }
+
+  const promise = (async () => {
+    const response = await fetch('http://localhost:8000/api/v1/dashboard');
+
+    if (!response.ok) {
+      throw new Error('Dashboard fetch failed');
+    }
+
+    const res = await response.json();
+    return { panels: res.panels, total: res.total ?? null };
+  })();
+
+  dashboardRequest = { promise, fetchedAt: Date.now() };
+  // A failed request is not reused: the next caller retries
+  promise.catch(() => {
+    if (dashboardRequest?.promise === promise) dashboardRequest = null;
+  });
+  return promise;
+}
+
+// Rows of one dashboard panel, from the shared dashboard request
+export async function fetchDashboardPanel(
+  panel: DashboardPanel
+): Promise<DashboardRollupRow[]> {
+  const dashboard = await fetchDashboard();
+  return dashboard.panels[panel] ?? [];
+}
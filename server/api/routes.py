@@ -1,13 +1,31 @@
 """FastAPI route handlers"""
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 # --- Services ---
 from services.query_router import query_router  # For legacy manual SQL
 from services.gemini_sql import sql_service     # For new AI SQL
+from services.dashboard_engine import dashboard_engine  # Server-side dashboard rollups
+from services import result_formats
+from services import metrics
+from db.connection import db
+from services.result_cache import result_cache
+from services.prepared_statements import prepared_statements
+from services.rollups import rollup_manager
+from services.columnar import columnar_replica
+from services.approximate import sampled_replica
+from services.query_control import QueryCancelledError, run_until_disconnected
+from services.concurrency import AdmissionRejected
+from services.warmup import warmup_state
 
-router = APIRouter()
+# Every route reports its response serialization time (see services/metrics.py)
+router = APIRouter(route_class=metrics.TimedRoute)
+
+# nginx's "client closed request": nobody is left to read the response
+HTTP_499_CLIENT_CLOSED_REQUEST = 499
 
 # --- Request Models ---
 
@@ -15,6 +33,14 @@ class SQLQueryRequest(BaseModel):
     """Request model for manual SQL execution"""
     query: str
     parameters: Optional[Dict[str, Any]] = None
+    approximate: bool = Field(False, title="Estimate aggregates over revenue from a row sample")
+    row_budget: Optional[int] = Field(None, gt=0, title="Most rows returned by a raw-row query")
+
+class SQLStreamRequest(BaseModel):
+    """Request model for streamed SQL execution"""
+    query: str
+    parameters: Optional[Dict[str, Any]] = None
+    itersize: Optional[int] = Field(None, gt=0, title="Rows per fetch batch")
 
 class GenerateSQLRequest(BaseModel):
     """
@@ -22,25 +48,96 @@ class GenerateSQLRequest(BaseModel):
     Only requires 'query'. Schema is handled internally.
     """
     query: str = Field(..., title="User Question", example="Show me the total actual revenue")
+    approximate: bool = Field(False, title="Estimate aggregates over revenue from a row sample")
+
+
+class GenerateSQLBatchRequest(BaseModel):
+    """Request model for answering several questions in one call"""
+    queries: List[str] = Field(..., min_length=1, title="User Questions")
+    approximate: bool = Field(False, title="Estimate aggregates over revenue from a row sample")
+
+
+# --- Response Formatting ---
+
+def _resolve_format(format: Optional[str], accept: Optional[str]) -> str:
+    """Negotiate the response format or fail with 406"""
+    fmt = result_formats.negotiate_format(format, accept)
+    if fmt is None:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail=f"Unsupported format '{format}'. Available: json, {result_formats.COLUMNAR}, {result_formats.ARROW}"
+        )
+    if fmt == result_formats.ARROW and not result_formats.arrow_available():
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail="Arrow IPC responses require pyarrow to be installed"
+        )
+    return fmt
+
+def _json_response(payload: Any) -> Response:
+    """
+    Pre-encoded JSON response (skips FastAPI's jsonable_encoder pass)
+
+    Rows go straight from the fetched values to bytes with the fast
+    encoder; the encoding is reported as the "serialize" stage.
+    """
+    with metrics.timed("serialize"):
+        return Response(content=result_formats.encode_json(payload), media_type=result_formats.JSON_MEDIA_TYPE)
+
+def _render(result: Dict[str, Any], fmt: str, metadata_keys: List[str]) -> Response:
+    """Encode a successful result in the negotiated format"""
+    if fmt == result_formats.COLUMNAR:
+        return _json_response(result_formats.to_columnar(result))
+    if fmt == result_formats.ARROW:
+        with metrics.timed("serialize"):
+            return Response(
+                content=result_formats.to_arrow_ipc(result, metadata_keys),
+                media_type=result_formats.ARROW_MEDIA_TYPE
+            )
+    return _json_response(result)
 
 
 # --- Endpoints ---
 
 @router.post("/api/query/sql", tags=["query"])
-async def execute_sql_query(request: SQLQueryRequest):
+async def execute_sql_query(
+    request: SQLQueryRequest,
+    http_request: Request,
+    format: Optional[str] = Query(None, description="json (default), columnar or arrow"),
+    accept: Optional[str] = Header(None)
+):
     """
     Execute a raw SQL query manually (Legacy Endpoint).
+    
+    Use `?format=columnar` (or `Accept: application/vnd.apache.arrow.stream`)
+    to receive column arrays instead of one dictionary per row.
+    The query is cancelled on the server if the client disconnects.
+    
+    With `approximate`, aggregates over revenue the in-memory replica
+    cannot answer are estimated from a row sample, with confidence bounds
+    per row (`bounds`) and the sample details under `approximate`.
+    `row_budget` caps the rows of a raw-row query (`truncated` is set).
     """
+    fmt = _resolve_format(format, accept)
     try:
-        result = query_router.execute_sql_query(request.query, request.parameters)
+        result = await run_until_disconnected(
+            http_request,
+            lambda cancellation: query_router.execute_sql_query_async(
+                request.query, request.parameters, cancellation, request.approximate, request.row_budget
+            )
+        )
         
         if not result.get("success", False):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=result.get("error", "SQL Execution failed")
             )
-        return result
+        return _render(result, fmt, ["mode", "row_count", "execution_time_ms"])
         
+    except QueryCancelledError as e:
+        raise HTTPException(status_code=HTTP_499_CLIENT_CLOSED_REQUEST, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -48,18 +145,58 @@ async def execute_sql_query(request: SQLQueryRequest):
         )
 
 
+@router.post("/api/query/sql/stream", tags=["query"])
+async def stream_sql_query(request: SQLStreamRequest):
+    """
+    Execute a raw SQL query and stream the rows as NDJSON.
+    
+    Rows are read through a server-side cursor in batches of `itersize`,
+    so server memory stays flat regardless of the result size.
+    """
+    result = query_router.stream_sql_query(
+        request.query, request.parameters, request.itersize
+    )
+    
+    if not result.get("success", False):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=result.get("error", "SQL Execution failed")
+        )
+    
+    return StreamingResponse(result["stream"], media_type="application/x-ndjson")
+
+
 @router.post("/api/v1/generate-sql", tags=["nl2sql"])
-async def generate_sql(request: GenerateSQLRequest):
+async def generate_sql(
+    request: GenerateSQLRequest,
+    http_request: Request,
+    format: Optional[str] = Query(None, description="json (default), columnar or arrow"),
+    accept: Optional[str] = Header(None)
+):
     """
     **Direct-to-SQL Pipeline**
     
     1. Receives your natural language question.
     2. Sends it to **Gemini 1.5 Flash**.
     3. Executes the generated SQL on the 'revenue' table.
-    4. Returns the data rows.
+    4. Returns the data rows (row, columnar or Arrow IPC format).
+    
+    Concurrent identical questions share one Gemini call and one query.
+    When the pipeline is at capacity, requests queue briefly and are then
+    rejected with 429 and a Retry-After header. If every client waiting on
+    a question disconnects, the Gemini call or the running query is cancelled.
+    
+    Raw-row answers are capped at `NL_ROW_BUDGET` rows (`truncated` is set).
+    With `approximate`, aggregates are estimated from a row sample of
+    revenue: the result carries per-row `bounds` and, under `approximate`,
+    the sample size, confidence and the SQL to re-run for an exact answer.
     """
+    fmt = _resolve_format(format, accept)
     try:
-        result = sql_service.generate_and_execute(request.query)
+        result = await run_until_disconnected(
+            http_request,
+            lambda _cancellation: sql_service.generate_and_execute_shared(request.query, request.approximate)
+        )
         
         if result["status"] == "error":
             raise HTTPException(
@@ -67,12 +204,267 @@ async def generate_sql(request: GenerateSQLRequest):
                 detail=result
             )
         
-        return result
+        return _render(result, fmt, ["status", "sql", "row_count", "message"])
 
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except QueryCancelledError as e:
+        raise HTTPException(status_code=HTTP_499_CLIENT_CLOSED_REQUEST, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Unexpected error: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+@router.post("/api/v1/generate-sql/batch", tags=["nl2sql"])
+async def generate_sql_batch(request: GenerateSQLBatchRequest, http_request: Request):
+    """
+    **Direct-to-SQL Pipeline (batch)**
+
+    Answers a list of questions concurrently: duplicates are answered
+    once, SQL is generated in parallel (`NL_BATCH_CONCURRENCY`),
+    validated, and executed in parallel on pooled connections
+    (`NL_BATCH_EXECUTION_CONCURRENCY`). Returns one result per question,
+    in request order, with per-question timings; a failed question does
+    not fail the batch.
+    """
+    if len(request.queries) > sql_service.BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {sql_service.BATCH_MAX_QUESTIONS} questions per batch"
+        )
+    try:
+        result = await run_until_disconnected(
+            http_request,
+            lambda _cancellation: sql_service.generate_and_execute_batch(request.queries, request.approximate)
+        )
+        return _json_response(result)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except QueryCancelledError as e:
+        raise HTTPException(status_code=HTTP_499_CLIENT_CLOSED_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Unexpected error: {str(e)}"
+        )
+
+
+@router.post("/api/v1/generate-sql/stream", tags=["nl2sql"])
+async def stream_generate_sql(request: GenerateSQLRequest):
+    """
+    **Direct-to-SQL Pipeline (Server-Sent Events)**
+
+    Same pipeline as `/api/v1/generate-sql`, reported as it runs:
+    `stage`, `token` (SQL as Gemini writes it), `sql`, `validated`,
+    `executing`, `columns`, `rows` (one event per batch) and `done`,
+    or `error` at any point. Disconnecting cancels the Gemini call or
+    the running query.
+    """
+    events = (
+        result_formats.sse_event(event, data)
+        async for event, data in sql_service.stream_events(request.query, request.approximate)
+    )
+    return StreamingResponse(
+        events,
+        media_type=result_formats.SSE_MEDIA_TYPE,
+        # Proxies must not buffer or cache the event stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/api/v1/dashboard", tags=["dashboard"])
+async def get_dashboard():
+    """
+    **Dashboard Rollups (all panels)**
+
+    Computes the client, skill, designation, manager and time rollups
+    in PostgreSQL with a single GROUPING SETS round trip.
+    """
+    result = await dashboard_engine.get_dashboard_async()
+
+    if not result.get("success", False):
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=result.get("error", "Dashboard aggregation failed")
+        )
+    return result
+
+
+@router.get("/api/v1/dashboard/{panel}", tags=["dashboard"])
+async def get_dashboard_panel(panel: str):
+    """
+    **Dashboard Rollup (single panel)**
+
+    Panel is one of: client, skill, designation, manager, time.
+    """
+    result = await dashboard_engine.get_panel_async(panel)
+
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown dashboard panel '{panel}'. Available: {', '.join(dashboard_engine.PANELS)}"
+        )
+    if not result.get("success", False):
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=result.get("error", "Dashboard aggregation failed")
+        )
+    return result
+
+
+@router.get("/api/v1/cache/stats", tags=["cache"])
+async def get_cache_stats():
+    """
+    Hit/miss statistics for the NL-to-SQL cache (exact and similarity tiers)
+    and the SQL result cache, plus prepared statement reuse and rollup rewrites.
+    """
+    nl_cache = sql_service.nl_cache
+    return {
+        "nl_sql": nl_cache.stats() if nl_cache is not None else {"enabled": False},
+        "results": result_cache.stats() if result_cache is not None else {"enabled": False},
+        "prepared_statements": prepared_statements.stats() if prepared_statements is not None else {"enabled": False},
+        "rollups": rollup_manager.stats()
+    }
+
+
+@router.get("/api/v1/generate-sql/stats", tags=["nl2sql"])
+async def get_generate_sql_stats():
+    """
+    Load on the NL-to-SQL pipeline: coalesced (shared) requests, admission
+    control (running, queued and rejected requests) and prompt sizes
+    (tokens sent per Gemini call vs the full-schema prompt, LLM latency).
+    """
+    admission = sql_service.admission
+    return {
+        "coalescing": sql_service.inflight.stats(),
+        "admission": admission.stats() if admission is not None else {"enabled": False},
+        "prompts": sql_service.prompts.stats()
+    }
+
+
+@router.get("/api/v1/db/pool", tags=["database"])
+async def get_pool_stats():
+    """
+    Live connection pool statistics: connections in use and idle, queued
+    requests, timeouts, recycled connections and a wait-time histogram.
+    """
+    return db.pool_stats()
+
+
+@router.get("/api/v1/replica", tags=["database"])
+async def get_replica_stats():
+    """
+    In-memory revenue replica: size, age, load timings and how many queries
+    it answered.
+    """
+    if columnar_replica is None:
+        return {"enabled": False}
+    return columnar_replica.stats()
+
+
+@router.post("/api/v1/replica/reload", tags=["database"])
+async def reload_replica():
+    """Reload the in-memory revenue replica from PostgreSQL"""
+    if columnar_replica is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Columnar replica is disabled")
+    try:
+        return await run_in_threadpool(columnar_replica.load)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Replica reload failed: {str(e)}"
+        )
+
+
+@router.get("/api/v1/replica/sample", tags=["database"])
+async def get_sample_stats():
+    """
+    Row sample of revenue behind approximate answers: sample size,
+    population, confidence level, age and how many queries it estimated.
+    """
+    if sampled_replica is None:
+        return {"enabled": False}
+    return sampled_replica.stats()
+
+
+@router.get("/metrics", tags=["monitoring"])
+async def get_metrics():
+    """
+    Prometheus metrics: per-stage latency histograms (prompt build, Gemini,
+    validation, pool wait, execution, conversion, serialization), request
+    latency by route, Gemini calls and tokens, and gauges for the
+    connection pools, caches, replica and NL pipeline load.
+    """
+    pools = db.pool_stats()
+    sync_pool = pools["sync"]
+    if sync_pool is not None:
+        # Pool waits are exported as the "pool_wait" stage histogram
+        sync_pool = {k: v for k, v in sync_pool.items() if k != "wait_ms_histogram"}
+    nl_cache = sql_service.nl_cache
+    admission = sql_service.admission
+    gauges = {
+        "db_pool": sync_pool,
+        "db_async_pool": pools["async"],
+        "nl_cache": nl_cache.stats() if nl_cache is not None else None,
+        "result_cache": result_cache.stats() if result_cache is not None else None,
+        "prepared_statements": prepared_statements.stats() if prepared_statements is not None else None,
+        "rollups": rollup_manager.stats(),
+        "replica": columnar_replica.stats() if columnar_replica is not None else None,
+        "sample": sampled_replica.stats() if sampled_replica is not None else None,
+        "nl_coalescing": sql_service.inflight.stats(),
+        "nl_admission": admission.stats() if admission is not None else None,
+        "prompts": sql_service.prompts.stats(),
+        "warmup": warmup_state.snapshot(),
+    }
+    return Response(content=metrics.registry.render(gauges), media_type=metrics.CONTENT_TYPE)
+
+
+@router.get("/health", tags=["monitoring"])
+async def liveness():
+    """
+    Liveness probe: the process is up and its event loop responds.
+    """
+    return {"status": "alive", "uptime_seconds": round(warmup_state.live_seconds, 3)}
+
+
+@router.get("/health/ready", tags=["monitoring"])
+async def readiness(response: Response):
+    """
+    Readiness probe: 200 once the database pools are open and the startup
+    warm-up (schema snapshot, replica, Gemini client, NL cache index) has
+    finished; 503 before that or when the database could not be opened.
+    Warm-up steps that failed are listed under `degraded`.
+    """
+    state = warmup_state.snapshot()
+    if not state["ready"]:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return state
+
+
+@router.get("/api/schema", tags=["schema"])
+async def get_schema():
+    """
+    Database schema metadata (tables, columns, keys, indexes).
+    
+    Served from the cached pg_catalog snapshot; the catalog is only
+    re-read when its fingerprint changes.
+    """
+    try:
+        return await run_in_threadpool(db.get_schema_metadata)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
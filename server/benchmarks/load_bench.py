@@ -0,0 +1,585 @@
+"""
+Benchmark: end-to-end API throughput and latency with local stand-ins
+
+Starts the FastAPI app (uvicorn, in a subprocess) against a local
+PostgreSQL, with benchmarks.stub_gemini in place of the Gemini model, and
+drives a weighted mix of /api/query/sql, /api/v1/generate-sql and
+dashboard requests at a fixed concurrency. Reports throughput and
+p50/p95/p99 latency per endpoint and per pipeline stage (from the
+Server-Timing header), and saves or compares a JSON baseline: a run
+compared against a baseline exits with status 1 when a latency percentile,
+the throughput or the error rate regressed past --max-regression.
+
+The repository ships no revenue extract, only the employee cost sheet
+(Degree.csv: emp_id, emp_name, salary, support, cost). ``seed`` derives
+the revenue table from it: one row per employee and month of Jan-Nov 2025
+(the period of the Degree sheet), with assignments, hours and rates drawn
+from a seeded generator so a given --seed always produces the same data.
+It loads through the ingestion engine and builds the dashboard rollups.
+
+Database: DATABASE_URL (set DB_SSLMODE=disable for a local server), or
+--pgdata DIR to run a local server with the optional pgserver package
+(pip install pgserver; the server keeps running between runs).
+
+Usage (from the server directory):
+    python -m benchmarks.load_bench [--pgdata DIR] [--seed 7] seed
+    python -m benchmarks.load_bench [--pgdata DIR] run [--concurrency 16] [--duration 30] [--mix sql=5,nl=2,dashboard=3]
+        [--llm-ms 300] [--save-baseline FILE | --baseline FILE [--max-regression 0.2]]
+"""
+import argparse
+import asyncio
+import csv
+import datetime
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEGREE_CSV = os.path.join(SERVER_DIR, "Degree.csv")
+
+# Mirrors GeminiSQLService.FALLBACK_DDL
+REVENUE_DDL = (
+    "CREATE TABLE IF NOT EXISTS revenue (key text NOT NULL, emp_id text, emp_name text, ee_group text, "
+    "region text, service_line_code text, designation text, skill text, location text, "
+    "customer text, project_name text, start_date date, end_date date, allocation_pct real, "
+    "billable_pct real, project_manager text, operations_head text, resource_type text, "
+    "project_type text, actual_hrs bigint, actual_revenue real, sow_start_date date, "
+    "sow_end_date date, month date, salary bigint, support_expense bigint, cost bigint, "
+    "PRIMARY KEY (key));"
+)
+REVENUE_COLUMNS = [
+    "key", "emp_id", "emp_name", "ee_group", "region", "service_line_code", "designation", "skill",
+    "location", "customer", "project_name", "start_date", "end_date", "allocation_pct", "billable_pct",
+    "project_manager", "operations_head", "resource_type", "project_type", "actual_hrs", "actual_revenue",
+    "sow_start_date", "sow_end_date", "month", "salary", "support_expense", "cost",
+]
+
+MONTHS = [datetime.date(2025, month, 1) for month in range(1, 12)]
+
+# Region -> (locations, operations head)
+REGIONS = {
+    "APAC": (["Bengaluru", "Pune", "Singapore"], "Meera Iyer"),
+    "EMEA": (["Amsterdam", "London", "Warsaw"], "Jan de Vries"),
+    "Americas": (["Toronto", "Austin", "Sao Paulo"], "Laura Chen"),
+}
+# Customer -> [(project, project manager, project type)]
+CUSTOMERS = {
+    "Acme Corp": [("Atlas Migration", "Priya Raman", "T&M"), ("Acme Data Lake", "Tom Becker", "Fixed Price")],
+    "Globex": [("Globex Payments", "Ana Souza", "T&M")],
+    "Initech": [("TPS Modernisation", "Tom Becker", "Fixed Price"), ("Initech Cloud", "Ravi Kumar", "T&M")],
+    "Umbrella Health": [("Claims Platform", "Sofia Rossi", "T&M"), ("Umbrella Analytics", "Priya Raman", "T&M")],
+    "Stark Industries": [("Arc Telemetry", "Ravi Kumar", "Fixed Price")],
+    "Wayne Enterprises": [("Wayne Retail", "Ana Souza", "T&M"), ("Wayne Security", "Sofia Rossi", "T&M")],
+    "Hooli": [("Hooli Search", "David Kim", "T&M")],
+    "Soylent": [("Supply Chain Insights", "David Kim", "Fixed Price")],
+}
+# Designation -> hourly rate
+DESIGNATIONS = {
+    "Associate Engineer": 28.0, "Engineer": 38.0, "Senior Engineer": 52.0,
+    "Lead Engineer": 64.0, "Architect": 85.0, "Delivery Manager": 95.0,
+}
+SKILLS = [
+    "Python", "Java", "Scala", "Kotlin", "SQL", "Spark", "Kafka", "AWS", "Azure", "GCP",
+    "React", "Angular", "Node.js", "Go", "Terraform", "Kubernetes", "Data Science", "Power BI",
+    "Testing", "DevOps",
+]
+SERVICE_LINES = ["DE", "CL", "AI", "QA", "AD"]
+
+SQL_QUERIES: List[Tuple[str, Optional[Dict[str, Any]]]] = [
+    ("SELECT customer, SUM(actual_revenue) AS revenue FROM revenue GROUP BY customer", None),
+    ("SELECT month, SUM(actual_revenue) AS revenue, SUM(cost) AS cost FROM revenue "
+     "WHERE month >= '2025-06-01' GROUP BY month ORDER BY month", None),
+    ("SELECT region, designation, COUNT(*) AS row_count, AVG(billable_pct) AS billable_pct FROM revenue "
+     "GROUP BY region, designation", None),
+    ("SELECT emp_id, emp_name, month, actual_hrs, actual_revenue FROM revenue WHERE emp_id = %(emp_id)s "
+     "ORDER BY month", {"emp_id": "E42"}),
+    ("SELECT emp_name, customer, actual_revenue FROM revenue WHERE customer ILIKE %(customer)s "
+     "ORDER BY actual_revenue DESC LIMIT 100", {"customer": "%acme%"}),
+    ("SELECT project_manager, COUNT(DISTINCT emp_id) AS people FROM revenue GROUP BY project_manager "
+     "ORDER BY people DESC", None),
+    ("SELECT * FROM revenue WHERE month = '2025-03-01' AND region = 'EMEA'", None),
+]
+DASHBOARD_PATHS = ["/api/v1/dashboard"] + [
+    f"/api/v1/dashboard/{panel}" for panel in ("client", "designation", "manager", "time", "skill")
+]
+MIX_KINDS = ("sql", "nl", "dashboard")
+LATENCY_PERCENTILES = ("p50", "p95", "p99")
+
+
+# --- Seeding ---
+
+def _revenue_rows(seed: int) -> Iterator[List[Any]]:
+    """Synthetic revenue rows for every Degree.csv employee and month"""
+    rng = random.Random(seed)
+    projects = [(customer,) + project for customer, entries in CUSTOMERS.items() for project in entries]
+    with open(DEGREE_CSV, newline="", encoding="utf-8") as handle:
+        employees = list(csv.DictReader(handle))
+
+    for employee in employees:
+        region = rng.choice(list(REGIONS))
+        locations, operations_head = REGIONS[region]
+        designation = rng.choices(list(DESIGNATIONS), weights=[4, 6, 5, 3, 1, 1])[0]
+        profile = {
+            "ee_group": rng.choices(["Employee", "Contractor"], weights=[5, 1])[0],
+            "service_line_code": rng.choice(SERVICE_LINES),
+            "skill": ", ".join(rng.sample(SKILLS, rng.randint(1, 3))),
+            "location": rng.choice(locations),
+        }
+        project = rng.choice(projects)
+        sow_start = datetime.date(2024, rng.randint(1, 12), 1)
+        costs = [round(float(employee[column] or 0) / len(MONTHS)) for column in ("salary", "support", "cost")]
+
+        for month in MONTHS:
+            if rng.random() < 0.08:
+                # Occasional move to another project
+                project = rng.choice(projects)
+            customer, project_name, project_manager, project_type = project
+            allocation = rng.choice([50.0, 75.0, 100.0, 100.0])
+            billable = rng.choice([0.0, 50.0, 80.0, 100.0, 100.0])
+            hours = round(168 * allocation / 100 * billable / 100 * rng.uniform(0.85, 1.05))
+            yield [
+                f"{employee['emp_id']}-{month:%Y-%m}", employee["emp_id"], employee["emp_name"],
+                profile["ee_group"], region, profile["service_line_code"], designation, profile["skill"],
+                profile["location"], customer, project_name, month, datetime.date(2025, 12, 31),
+                allocation, billable, project_manager, operations_head,
+                "Billable" if billable else "Shadow", project_type, hours,
+                round(hours * DESIGNATIONS[designation], 2), sow_start, datetime.date(2026, 3, 31), month,
+                *costs,
+            ]
+
+
+def seed(seed_value: int) -> Dict[str, Any]:
+    """Create and (re)load the revenue table, then build the rollups if they are missing"""
+    from db.connection import db
+    from services.ingestion_engine import ingestion_engine
+    from services.rollups import rollup_manager
+
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(REVENUE_DDL)
+        conn.commit()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "revenue.csv")
+        with open(path, "w", newline="", encoding="utf-8") as handle:
+            writer = csv.writer(handle)
+            writer.writerow(REVENUE_COLUMNS)
+            writer.writerows(_revenue_rows(seed_value))
+        result = ingestion_engine.ingest_file(path, "revenue", mode="replace")
+    if not result["success"]:
+        raise Exception(f"Seeding revenue failed: {result['error']}")
+
+    rollup_manager.load()
+    summary = {"rows": result["rows"], "seconds": result["seconds"]}
+    if not rollup_manager.available:
+        summary["rollups"] = rollup_manager.build()["tables"]
+    return summary
+
+
+def _revenue_rows_loaded() -> int:
+    from db.connection import db
+
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('revenue') IS NOT NULL")
+            if not cur.fetchone()[0]:
+                conn.rollback()
+                return 0
+            cur.execute("SELECT count(*) FROM revenue")
+            count = cur.fetchone()[0]
+        conn.rollback()
+    return count
+
+
+# --- Server ---
+
+def serve(host: str, port: int, llm_ms: float) -> None:
+    """Run the app with the stub model (the subprocess started by ``run``)"""
+    import uvicorn
+    from benchmarks.stub_gemini import StubGeminiModel
+    from services.gemini_sql import sql_service
+
+    sql_service.model = StubGeminiModel(latency_ms=llm_ms)
+    from main import app
+    uvicorn.run(app, host=host, port=port, log_level="warning")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _server_env(args) -> Dict[str, str]:
+    env = dict(os.environ)
+    # Question embeddings would call Gemini; only the exact NL cache tier can run locally
+    env["NL_CACHE_SEMANTIC"] = "false"
+    if not args.nl_cache:
+        # Every question goes through prompt building and the model
+        env["NL_CACHE_ENABLED"] = "false"
+    for assignment in args.env:
+        key, _, value = assignment.partition("=")
+        env[key] = value
+    env["PYTHONPATH"] = SERVER_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+@contextmanager
+def _server(args):
+    """Start the app in a subprocess and yield its base URL once it is ready"""
+    import httpx
+
+    port = args.port or _free_port()
+    url = f"http://127.0.0.1:{port}"
+    command = [sys.executable, "-m", "benchmarks.load_bench", "serve", "--port", str(port), "--llm-ms", str(args.llm_ms)]
+    with tempfile.TemporaryFile() as log:
+        process = subprocess.Popen(command, cwd=SERVER_DIR, env=_server_env(args), stdout=log, stderr=subprocess.STDOUT)
+        try:
+            deadline = time.monotonic() + args.startup_timeout
+            while True:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    log.seek(0)
+                    output = log.read().decode(errors="replace")[-4000:]
+                    raise Exception(f"Benchmark server did not start:\n{output}")
+                try:
+                    # Measure the warm service: wait for the startup warm-up to finish
+                    if httpx.get(f"{url}/health/ready", timeout=1.0).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                time.sleep(0.2)
+            yield url
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+
+# --- Load generation ---
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """Parse "sql=5,nl=2,dashboard=3" into request kind -> weight"""
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in MIX_KINDS:
+            raise argparse.ArgumentTypeError(f"unknown request kind '{kind}' (expected {', '.join(MIX_KINDS)})")
+        mix[kind] = float(weight or 1)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("the mix needs at least one positive weight")
+    return mix
+
+
+def _schedule(mix: Dict[str, float], seed_value: int) -> Iterator[Tuple[str, str, str, Optional[Dict[str, Any]]]]:
+    """Endless deterministic request sequence: (endpoint label, method, path, JSON body)"""
+    from benchmarks.stub_gemini import QUESTION_SQL
+
+    rng = random.Random(seed_value)
+    sql_cycle = itertools.cycle(SQL_QUERIES)
+    question_cycle = itertools.cycle(QUESTION_SQL)
+    dashboard_cycle = itertools.cycle(DASHBOARD_PATHS)
+    kinds = [kind for kind in mix if mix[kind] > 0]
+    weights = [mix[kind] for kind in kinds]
+    while True:
+        kind = rng.choices(kinds, weights=weights)[0]
+        if kind == "sql":
+            query, parameters = next(sql_cycle)
+            yield "POST /api/query/sql", "POST", "/api/query/sql", {"query": query, "parameters": parameters}
+        elif kind == "nl":
+            yield "POST /api/v1/generate-sql", "POST", "/api/v1/generate-sql", {"query": next(question_cycle)}
+        else:
+            path = next(dashboard_cycle)
+            label = "GET /api/v1/dashboard" if path == DASHBOARD_PATHS[0] else "GET /api/v1/dashboard/{panel}"
+            yield label, "GET", path, None
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """Stage -> milliseconds from a Server-Timing header"""
+    stages = {}
+    for entry in (header or "").split(","):
+        name, *params = [part.strip() for part in entry.split(";")]
+        for param in params:
+            if param.startswith("dur="):
+                stages[name] = float(param[4:])
+    return stages
+
+
+async def _drive(url: str, schedule, concurrency: int, duration: Optional[float],
+                 requests: Optional[int], timeout: float) -> Tuple[List[tuple], float]:
+    """
+    Send requests from ``schedule`` with ``concurrency`` workers
+
+    Returns:
+        Tuple of (samples as (label, status, milliseconds, stages), elapsed seconds)
+    """
+    import httpx
+
+    samples: List[tuple] = []
+    remaining = [requests]
+    started = time.perf_counter()
+    deadline = started + duration if duration else None
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def worker(client):
+        while True:
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            if remaining[0] is not None:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            label, method, path, body = next(schedule)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                status, stages = response.status_code, parse_server_timing(response.headers.get("server-timing"))
+            except httpx.HTTPError:
+                status, stages = 0, {}
+            samples.append((label, status, (time.perf_counter() - start) * 1000, stages))
+
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return samples, time.perf_counter() - started
+
+
+# --- Reporting ---
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    """Linearly interpolated percentile of a sorted list"""
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _distribution(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+        "p50": round(_percentile(ordered, 0.50), 3),
+        "p95": round(_percentile(ordered, 0.95), 3),
+        "p99": round(_percentile(ordered, 0.99), 3),
+        "max": round(ordered[-1], 3) if ordered else 0.0,
+    }
+
+
+def summarize(samples: List[tuple], elapsed: float) -> Dict[str, Any]:
+    """Per-endpoint (and overall) throughput, status counts, latency and stage distributions"""
+    groups: Dict[str, List[tuple]] = {}
+    for sample in samples:
+        groups.setdefault(sample[0], []).append(sample)
+
+    def summary(group: List[tuple]) -> Dict[str, Any]:
+        statuses: Dict[str, int] = {}
+        stages: Dict[str, List[float]] = {}
+        for _, status, _, timings in group:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            for stage, ms in timings.items():
+                stages.setdefault(stage, []).append(ms)
+        errors = sum(count for status, count in statuses.items() if not 200 <= int(status) < 400)
+        return {
+            "requests": len(group),
+            "errors": errors,
+            "error_rate": round(errors / len(group), 6) if group else 0.0,
+            "statuses": statuses,
+            "throughput_rps": round(len(group) / elapsed, 3) if elapsed else 0.0,
+            "latency_ms": _distribution([sample[2] for sample in group]),
+            "stages_ms": {stage: _distribution(values) for stage, values in sorted(stages.items())},
+        }
+
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "total": summary(samples),
+        "endpoints": {label: summary(group) for label, group in sorted(groups.items())},
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\n{'endpoint / stage':<40} {'requests':>8} {'errors':>6} {'req/s':>8} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = list(report["endpoints"].items()) + [("total", report["total"])]
+    for label, entry in rows:
+        latency = entry["latency_ms"]
+        print(f"{label:<40} {entry['requests']:8d} {entry['errors']:6d} {entry['throughput_rps']:8.1f} "
+              f"{latency['p50']:9.1f} {latency['p95']:9.1f} {latency['p99']:9.1f}")
+        if label == "total":
+            continue
+        for stage, distribution in entry["stages_ms"].items():
+            print(f"  {stage:<38} {distribution['count']:8d} {'':>6} {'':>8} "
+                  f"{distribution['p50']:9.1f} {distribution['p95']:9.1f} {distribution['p99']:9.1f}")
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], max_regression: float,
+            min_delta_ms: float) -> List[str]:
+    """
+    Regressions of a report against a baseline
+
+    A latency percentile regresses when it grew by more than
+    ``max_regression`` (a fraction) and by more than ``min_delta_ms``;
+    throughput when it fell by more than ``max_regression``; the error
+    rate when it rose by more than one percentage point.
+
+    Returns:
+        One message per regression (empty when none)
+    """
+    regressions = []
+    for label, base in baseline["endpoints"].items():
+        current = report["endpoints"].get(label)
+        if current is None:
+            continue
+        for percentile in LATENCY_PERCENTILES:
+            before, after = base["latency_ms"][percentile], current["latency_ms"][percentile]
+            if after > before * (1 + max_regression) and after - before > min_delta_ms:
+                regressions.append(f"{label} {percentile}: {before:.1f} -> {after:.1f} ms")
+        before, after = base["throughput_rps"], current["throughput_rps"]
+        if after < before * (1 - max_regression):
+            regressions.append(f"{label} throughput: {before:.1f} -> {after:.1f} req/s")
+        before, after = base["error_rate"], current["error_rate"]
+        if after > before + 0.01:
+            regressions.append(f"{label} error rate: {before:.1%} -> {after:.1%}")
+    return regressions
+
+
+# --- Commands ---
+
+def _use_pgdata(pgdata: Optional[str]) -> None:
+    """Point DATABASE_URL at a local pgserver instance"""
+    if not pgdata:
+        return
+    try:
+        import pgserver
+    except ImportError:
+        raise SystemExit("--pgdata needs the pgserver package (pip install pgserver)")
+    os.environ["DATABASE_URL"] = pgserver.get_server(pgdata, cleanup_mode=None).get_uri()
+    os.environ.setdefault("DB_SSLMODE", "disable")
+
+
+def _seed_command(args) -> None:
+    from db.connection import db
+
+    db.initialize()
+    try:
+        print(seed(args.seed))
+    finally:
+        db.close()
+
+
+def _run_command(args) -> None:
+    from db.connection import db
+
+    db.initialize()
+    try:
+        if args.reseed or not _revenue_rows_loaded():
+            print(f"seeding revenue: {seed(args.seed)}")
+    finally:
+        db.close()
+
+    config = {
+        "concurrency": args.concurrency,
+        "duration_s": None if args.requests else args.duration,
+        "requests": args.requests,
+        "mix": args.mix,
+        "llm_ms": args.llm_ms,
+        "seed": args.seed,
+        "nl_cache": args.nl_cache,
+        "env": args.env,
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        differing = {key: (value, config[key]) for key, value in baseline["config"].items()
+                     if config.get(key) != value}
+        if differing:
+            print(f"WARNING: configuration differs from the baseline (baseline, now): {differing}")
+
+    with _server(args) as url:
+        schedule = _schedule(args.mix, args.seed)
+        if args.warmup:
+            asyncio.run(_drive(url, schedule, args.concurrency, args.warmup, None, args.timeout))
+        samples, elapsed = asyncio.run(
+            _drive(url, schedule, args.concurrency, None if args.requests else args.duration,
+                   args.requests, args.timeout)
+        )
+
+    report = summarize(samples, elapsed)
+    report = {"created_at": datetime.datetime.now().isoformat(timespec="seconds"), "config": config, **report}
+    print_report(report)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+        print(f"\nbaseline saved to {args.save_baseline}")
+
+    if baseline is not None:
+        regressions = compare(report, baseline, args.max_regression, args.min_delta_ms)
+        if regressions:
+            print(f"\nREGRESSIONS against {args.baseline} (created {baseline.get('created_at')}):")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print(f"\nno regressions against {args.baseline}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pgdata", help="run a local PostgreSQL in DIR with pgserver instead of DATABASE_URL")
+    parser.add_argument("--seed", type=int, default=7, help="random seed for the data and the request sequence")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("seed", help="(re)load the synthetic revenue table")
+
+    serve_parser = commands.add_parser("serve", help="run the app with the stub model")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument("--llm-ms", type=float, default=300.0, help="simulated Gemini latency")
+
+    run_parser = commands.add_parser("run", help="start the app and drive the request mix")
+    run_parser.add_argument("--concurrency", type=int, default=16, help="requests in flight")
+    run_parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    run_parser.add_argument("--requests", type=int, help="measured requests (instead of --duration)")
+    run_parser.add_argument("--warmup", type=float, default=3.0, help="unmeasured seconds first")
+    run_parser.add_argument("--mix", type=parse_mix, default=parse_mix("sql=5,nl=2,dashboard=3"),
+                            help="request kind weights (sql, nl, dashboard)")
+    run_parser.add_argument("--llm-ms", type=float, default=300.0, help="simulated Gemini latency")
+    run_parser.add_argument("--nl-cache", action="store_true", help="keep the exact NL-to-SQL cache on")
+    run_parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                            help="extra server environment (repeatable), e.g. DB_POOL_MAX_SIZE=20")
+    run_parser.add_argument("--port", type=int, help="server port (default: a free port)")
+    run_parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout (seconds)")
+    run_parser.add_argument("--startup-timeout", type=float, default=120.0, help="seconds to wait for the server")
+    run_parser.add_argument("--reseed", action="store_true", help="reload revenue even if it has rows")
+    run_parser.add_argument("--save-baseline", metavar="FILE", help="write the report as a JSON baseline")
+    run_parser.add_argument("--baseline", metavar="FILE", help="compare against a saved baseline")
+    run_parser.add_argument("--max-regression", type=float, default=0.2,
+                            help="allowed relative latency growth / throughput drop")
+    run_parser.add_argument("--min-delta-ms", type=float, default=5.0,
+                            help="latency growth always tolerated (noise floor)")
+    args = parser.parse_args()
+
+    _use_pgdata(args.pgdata)
+    if args.command == "seed":
+        _seed_command(args)
+    elif args.command == "serve":
+        serve(args.host, args.port, args.llm_ms)
+    else:
+        _run_command(args)
+
+
+if __name__ == "__main__":
+    main()
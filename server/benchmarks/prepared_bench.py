@@ -0,0 +1,112 @@
+"""
+Benchmark: plain execution vs prepared statements on the revenue dashboard rollups
+
+Reports the server-side planning time (from EXPLAIN ANALYZE) and the
+end-to-end latency of each rollup query with and without a prepared
+statement. Needs DATABASE_URL pointing at a database with the revenue table.
+
+Usage (from the server directory):
+    python -m benchmarks.prepared_bench [--runs 200]
+"""
+import argparse
+import re
+import statistics
+import time
+from typing import Dict, List
+
+from db.connection import db
+from services.dashboard_engine import DashboardEngine
+from services.prepared_statements import PreparedStatementCache
+
+_TIMING_RE = re.compile(r"(Planning|Execution) Time: ([0-9.]+) ms")
+
+
+def _explain_times(cur, statement: str) -> Dict[str, float]:
+    """Planning and execution time (ms) of one EXPLAIN ANALYZE run"""
+    cur.execute(f"EXPLAIN (ANALYZE, SUMMARY, TIMING OFF) {statement}")
+    times = {}
+    for (line,) in cur.fetchall():
+        match = _TIMING_RE.search(line)
+        if match:
+            times[match.group(1).lower()] = float(match.group(2))
+    return times
+
+
+def _latencies(variants, runs: int) -> List[List[float]]:
+    """Time the variants interleaved so drift affects them equally"""
+    samples: List[List[float]] = [[] for _ in variants]
+    for _ in range(runs):
+        for execute, bucket in zip(variants, samples):
+            start = time.perf_counter()
+            execute()
+            bucket.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _bench_query(conn, name: str, query: str, runs: int) -> Dict[str, float]:
+    prepared = PreparedStatementCache()
+    with conn.cursor() as cur:
+        # Warm the buffer cache so both variants read from memory
+        cur.execute(query)
+        cur.fetchall()
+
+        plain_plan = statistics.median(
+            _explain_times(cur, query)["planning"] for _ in range(min(runs, 50))
+        )
+        cur.execute(f"PREPARE bench_{name} AS {query}")
+        # Let the server settle on the generic plan before measuring
+        for _ in range(6):
+            cur.execute(f"EXECUTE bench_{name}")
+            cur.fetchall()
+        prepared_plan = statistics.median(
+            _explain_times(cur, f"EXECUTE bench_{name}")["planning"] for _ in range(min(runs, 50))
+        )
+        cur.execute(f"DEALLOCATE bench_{name}")
+
+        def plain():
+            cur.execute(query)
+            cur.fetchall()
+
+        def through_cache():
+            prepared.execute(cur, query)
+            cur.fetchall()
+
+        plain_ms, prepared_ms = _latencies([plain, through_cache], runs)
+        cur.execute("DEALLOCATE ALL")
+    conn.rollback()
+
+    return {
+        "plan_plain": plain_plan,
+        "plan_prepared": prepared_plan,
+        "p50_plain": statistics.median(plain_ms),
+        "p50_prepared": statistics.median(prepared_ms),
+        "hit_rate": prepared.stats()["hit_rate"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=200, help="executions per query and variant")
+    args = parser.parse_args()
+
+    engine = DashboardEngine()
+    queries = {"rollup": engine.ROLLUP_QUERY}
+    queries.update({panel: engine._panel_query(panel) for panel in engine.PANELS})
+
+    db.initialize()
+    try:
+        with db.get_connection() as conn:
+            print(f"{'query':<12} {'plan ms':>8} {'prep plan':>10} {'p50 ms':>8} {'prep p50':>9} {'saved':>7} {'hit rate':>9}")
+            for name, query in queries.items():
+                r = _bench_query(conn, name, query, args.runs)
+                saved = (r["p50_plain"] - r["p50_prepared"]) / r["p50_plain"] * 100 if r["p50_plain"] else 0.0
+                print(
+                    f"{name:<12} {r['plan_plain']:8.3f} {r['plan_prepared']:10.3f} "
+                    f"{r['p50_plain']:8.3f} {r['p50_prepared']:9.3f} {saved:6.1f}% {r['hit_rate']:9.3f}"
+                )
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
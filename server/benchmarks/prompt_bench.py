@@ -0,0 +1,129 @@
+"""
+Benchmark: Gemini prompt size (and optionally latency) before and after prompt compaction
+
+For a set of sample questions, compares the previous prompt (verbose
+system instruction plus the full DDL) with the question-specific compact
+prompt built by services.prompt_builder. Token counts are estimated
+locally; with --live, Gemini's count_tokens is used instead and both
+prompts are sent to the model to compare p50 latency (needs
+GEMINI_API_KEY). Needs DATABASE_URL pointing at a database with the
+revenue table.
+
+Usage (from the server directory):
+    python -m benchmarks.prompt_bench [--live] [--runs 5]
+"""
+import argparse
+import statistics
+import time
+from typing import Callable, List
+
+from db.connection import db
+from db.schema import render_ddl, schema_catalog
+from services.prompt_builder import PromptBuilder, estimate_tokens
+from services.prompts import get_system_prompt
+
+QUESTIONS = [
+    "Total revenue by client in 2024",
+    "Top 5 employees by actual hours",
+    "Revenue for Acme last quarter",
+    "How many engineers report to Alice?",
+    "Average billable percentage by region",
+    "Monthly cost and revenue trend for the Umbrella account",
+    "Which skills bring in the most revenue?",
+    "Show the salary of Emp 10",
+]
+
+# The prompt as it was sent before compaction
+LEGACY_SYSTEM_PROMPT = """
+    You are a PostgreSQL expert and a strict SQL code generator.
+
+    YOUR JOB:
+    1. Receive a natural language question and a database schema.
+    2. Output ONLY valid, executable PostgreSQL code.
+    3. Do NOT output markdown code blocks (```sql), explanations, or notes.
+    4. If the question cannot be answered with the schema, return: SELECT 'ERROR: Irrelevant question' as error_msg;
+
+    RULES:
+    - Use ILIKE for text matching to be case-insensitive.
+    - Use standard aggregations (SUM, AVG, COUNT) where appropriate.
+    - Return plain text SQL only. No formatting.
+    """
+
+
+def legacy_prompt(question: str, ddl: str) -> str:
+    return f"""
+    ### SCHEMA:
+    {ddl}
+
+    ### QUESTION:
+    {question}
+
+    ### SQL:
+    """
+
+
+def _p50_ms(fn: Callable[[], object], runs: int) -> float:
+    samples: List[float] = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", action="store_true", help="count tokens with Gemini and time real calls")
+    parser.add_argument("--runs", type=int, default=5, help="Gemini calls per question and variant (--live)")
+    args = parser.parse_args()
+
+    db.initialize()
+    try:
+        snapshot = schema_catalog.get_snapshot()
+        ddl = render_ddl(snapshot)
+        builder = PromptBuilder(db)
+        print(f"sampled columns: {builder.load_values()}")
+
+        legacy_model = compact_model = None
+        if args.live:
+            import google.generativeai as genai
+            from services.gemini_sql import sql_service
+
+            compact_model = sql_service.model
+            legacy_model = genai.GenerativeModel(
+                model_name=compact_model.model_name,
+                system_instruction=LEGACY_SYSTEM_PROMPT,
+                generation_config=sql_service.generation_config,
+            )
+
+        def tokens(model, system: str, prompt: str) -> int:
+            if model is not None:
+                return model.count_tokens(prompt).total_tokens
+            return estimate_tokens(system) + estimate_tokens(prompt)
+
+        print(f"{'question':<56} {'mode':<9} {'legacy tok':>10} {'compact tok':>11} {'saved':>6}", end="")
+        print(f" {'legacy ms':>10} {'compact ms':>10}" if args.live else "")
+        totals = [0, 0]
+        for question in QUESTIONS:
+            plan = builder.build(question, snapshot)
+            old, new = legacy_prompt(question, ddl), plan["prompt"]
+            old_tokens = tokens(legacy_model, LEGACY_SYSTEM_PROMPT, old)
+            new_tokens = tokens(compact_model, get_system_prompt(), new)
+            totals[0] += old_tokens
+            totals[1] += new_tokens
+            line = (
+                f"{question[:56]:<56} {plan['mode']:<9} {old_tokens:10d} {new_tokens:11d} "
+                f"{1 - new_tokens / old_tokens:6.1%}"
+            )
+            if args.live:
+                legacy_ms = _p50_ms(lambda: legacy_model.generate_content(old), args.runs)
+                compact_ms = _p50_ms(lambda: compact_model.generate_content(new), args.runs)
+                line += f" {legacy_ms:10.1f} {compact_ms:10.1f}"
+            print(line)
+        print(f"{'total':<56} {'':<9} {totals[0]:10d} {totals[1]:11d} {1 - totals[1] / totals[0]:6.1%}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
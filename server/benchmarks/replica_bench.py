@@ -0,0 +1,118 @@
+"""
+Benchmark: dashboard and aggregate queries from the in-memory replica vs PostgreSQL
+
+Loads the columnar replica, checks that its answers match PostgreSQL
+(floats within a relative tolerance: real columns are summed in double
+precision in memory) and reports the p50 latency of both. Needs
+DATABASE_URL pointing at a database with the revenue table.
+
+Usage (from the server directory):
+    python -m benchmarks.replica_bench [--runs 200]
+"""
+import argparse
+import statistics
+import time
+from decimal import Decimal
+from typing import Callable, List
+
+from db.connection import db
+from services.columnar import ColumnarReplica
+from services.dashboard_engine import DashboardEngine
+
+QUERIES = {
+    "total_rows": "SELECT COUNT(*) FROM revenue",
+    "customer_revenue": (
+        "SELECT customer, SUM(actual_revenue) AS revenue, COUNT(*) AS row_count "
+        "FROM revenue GROUP BY customer ORDER BY revenue DESC"
+    ),
+    "monthly_cost": "SELECT month, SUM(cost), AVG(cost), MAX(actual_hrs) FROM revenue GROUP BY month ORDER BY month",
+    "filtered": (
+        "SELECT region, designation, COUNT(*) AS n, AVG(actual_revenue) FROM revenue "
+        "WHERE month BETWEEN '2024-03-01' AND '2024-06-01' AND actual_revenue > 0 "
+        "GROUP BY region, designation ORDER BY n DESC, 1, 2"
+    ),
+}
+
+RELATIVE_TOLERANCE = 1e-5
+
+
+def _same_value(a, b) -> bool:
+    if isinstance(a, (float, Decimal)) and isinstance(b, (float, Decimal)):
+        a, b = float(a), float(b)
+        return abs(a - b) <= RELATIVE_TOLERANCE * max(abs(a), abs(b), 1.0)
+    return a == b
+
+
+def _p50_ms(fn: Callable[[], object], runs: int) -> float:
+    samples: List[float] = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=200, help="executions per query and variant")
+    args = parser.parse_args()
+
+    db.initialize()
+    try:
+        replica = ColumnarReplica(db)
+        print(f"replica loaded: {replica.load()}")
+
+        print(f"{'query':<18} {'equal':>6} {'postgres ms':>12} {'memory ms':>10} {'speedup':>8}")
+        with db.get_connection() as conn:
+            with conn.cursor() as cur:
+                for name, query in QUERIES.items():
+                    result = replica.execute(query)
+                    if result is None:
+                        print(f"{name:<18} {'-':>6} {'-':>12} {'-':>10} {'-':>8}  (not supported)")
+                        continue
+                    cur.execute(query)
+                    expected = cur.fetchall()
+                    actual = [tuple(row[column] for column in result["columns"]) for row in result["data"]]
+                    equal = len(expected) == len(actual) and all(
+                        _same_value(a, b) for x, y in zip(expected, actual) for a, b in zip(x, y)
+                    )
+
+                    def postgres():
+                        cur.execute(query)
+                        cur.fetchall()
+
+                    pg_ms = _p50_ms(postgres, args.runs)
+                    memory_ms = _p50_ms(lambda: replica.execute(query), args.runs)
+                    print(f"{name:<18} {str(equal):>6} {pg_ms:12.3f} {memory_ms:10.3f} {pg_ms / memory_ms:7.1f}x")
+            conn.rollback()
+
+        # Dashboard: GROUPING SETS round trip vs the in-memory panels
+        engine = DashboardEngine()
+        engine.replica = replica
+        # Measure the database round trip, not the result cache
+        engine.sql_engine.result_cache = None
+        database = engine._run(engine.ROLLUP_QUERY)
+        memory = engine._run_replica(engine.PANELS, include_total=True)
+        equal = all(
+            [entry["label"] for entry in memory["panels"][panel]] == [entry["label"] for entry in database["panels"][panel]]
+            and all(_same_value(a["revenue"], b["revenue"]) and a["row_count"] == b["row_count"]
+                    for a, b in zip(memory["panels"][panel], database["panels"][panel]))
+            for panel in engine.PANELS
+        )
+        pg_ms = _p50_ms(lambda: engine._run(engine.ROLLUP_QUERY), args.runs)
+        memory_ms = _p50_ms(lambda: engine._run_replica(engine.PANELS, include_total=True), args.runs)
+        print(f"{'dashboard':<18} {str(equal):>6} {pg_ms:12.3f} {memory_ms:10.3f} {pg_ms / memory_ms:7.1f}x")
+
+        def cold_dashboard():
+            # Recompute the panel aggregates instead of reusing the snapshot memo
+            replica._snapshot.memo.clear()
+            engine._run_replica(engine.PANELS, include_total=True)
+
+        cold_ms = _p50_ms(cold_dashboard, args.runs)
+        print(f"{'dashboard (cold)':<18} {'':>6} {pg_ms:12.3f} {cold_ms:10.3f} {pg_ms / cold_ms:7.1f}x")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark: aggregates over revenue vs the same queries rewritten onto the rollups
+
+Checks that each rewritten query returns the same rows as the original
+and reports the p50 latency of both. Floats are compared with a relative
+tolerance: SUM over a real column accumulates in single precision on the
+base table but in double precision in the rollups. Needs
+DATABASE_URL pointing at a database with the revenue table; the rollups
+are built first unless --no-build is given.
+
+Usage (from the server directory):
+    python -m benchmarks.rollup_bench [--runs 100] [--no-build]
+"""
+import argparse
+import statistics
+import time
+from decimal import Decimal
+from typing import Dict, List
+
+from db.connection import db
+from services.dashboard_engine import DashboardEngine
+from services.rollups import rollup_manager
+
+QUERIES = {
+    "total_rows": "SELECT COUNT(*) FROM revenue",
+    "monthly": "SELECT month, SUM(actual_revenue) AS revenue, SUM(cost) AS cost FROM revenue GROUP BY month ORDER BY month",
+    "customer_avg": "SELECT customer, AVG(actual_revenue) AS avg_revenue, COUNT(*) AS row_count FROM revenue GROUP BY customer ORDER BY customer",
+    "region_2024": (
+        "SELECT region, SUM(salary) AS salary, MAX(actual_hrs) AS max_hrs FROM revenue "
+        "WHERE month BETWEEN '2024-01-01' AND '2024-06-30' GROUP BY region ORDER BY region"
+    ),
+    "quarterly_skill": (
+        "SELECT date_trunc('quarter', month) AS quarter, skill, SUM(actual_revenue) AS revenue "
+        "FROM revenue GROUP BY 1, 2 ORDER BY 1, 2"
+    ),
+}
+
+# A few float4 ulps: single-precision SUM drifts ~1e-6 relative over 20k rows
+RELATIVE_TOLERANCE = 1e-5
+
+
+def _same_value(a, b) -> bool:
+    if isinstance(a, (float, Decimal)) and isinstance(b, (float, Decimal)):
+        a, b = float(a), float(b)
+        return abs(a - b) <= RELATIVE_TOLERANCE * max(abs(a), abs(b), 1.0)
+    return a == b
+
+
+def _group_key(row: tuple) -> tuple:
+    return tuple(str(value) for value in row if not isinstance(value, (float, Decimal)))
+
+
+def _same_rows(a: List[tuple], b: List[tuple]) -> bool:
+    # Queries without ORDER BY may return groups in any order
+    a, b = sorted(a, key=_group_key), sorted(b, key=_group_key)
+    return len(a) == len(b) and all(
+        len(x) == len(y) and all(_same_value(u, v) for u, v in zip(x, y)) for x, y in zip(a, b)
+    )
+
+
+def _run(cur, query: str):
+    cur.execute(query)
+    return [desc[0] for desc in cur.description], cur.fetchall()
+
+
+def _bench_query(conn, query: str, rewritten: str, runs: int) -> Dict[str, float]:
+    with conn.cursor() as cur:
+        base_columns, base_rows = _run(cur, query)
+        rollup_columns, rollup_rows = _run(cur, rewritten)
+        equal = base_columns == rollup_columns and _same_rows(base_rows, rollup_rows)
+
+        # Interleave the variants so drift affects both equally
+        samples: Dict[str, List[float]] = {"base": [], "rollup": []}
+        for _ in range(runs):
+            for name, statement in (("base", query), ("rollup", rewritten)):
+                start = time.perf_counter()
+                _run(cur, statement)
+                samples[name].append((time.perf_counter() - start) * 1000)
+    conn.rollback()
+
+    return {
+        "equal": equal,
+        "rows": len(base_rows),
+        "p50_base": statistics.median(samples["base"]),
+        "p50_rollup": statistics.median(samples["rollup"]),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=100, help="executions per query and variant")
+    parser.add_argument("--no-build", action="store_true", help="use the existing rollup tables")
+    args = parser.parse_args()
+
+    engine = DashboardEngine()
+    queries = dict(QUERIES)
+    queries.update({f"panel_{panel}": engine._panel_query(panel) for panel in engine.PANELS})
+
+    db.initialize()
+    try:
+        if not args.no_build:
+            print(f"built rollups: {rollup_manager.build()}")
+        rollup_manager.ensure_loaded()
+
+        with db.get_connection() as conn:
+            print(f"{'query':<22} {'rows':>5} {'equal':>6} {'base ms':>9} {'rollup ms':>10} {'speedup':>8}  table")
+            for name, query in queries.items():
+                rewritten = rollup_manager.rewrite(query)
+                if rewritten is None:
+                    print(f"{name:<22} {'-':>5} {'-':>6} {'-':>9} {'-':>10} {'-':>8}  (not eligible)")
+                    continue
+                r = _bench_query(conn, query, rewritten[0], args.runs)
+                speedup = r["p50_base"] / r["p50_rollup"] if r["p50_rollup"] else 0.0
+                print(
+                    f"{name:<22} {r['rows']:5d} {str(r['equal']):>6} {r['p50_base']:9.3f} "
+                    f"{r['p50_rollup']:10.3f} {speedup:7.1f}x  {rewritten[1]}"
+                )
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
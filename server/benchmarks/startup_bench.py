@@ -0,0 +1,151 @@
+"""
+Benchmark: import time of the app and time until it is live and ready
+
+Runs ``python -X importtime -c "import main"`` in fresh interpreters and
+reports the total import time plus the top-level packages that cost the
+most (own time of all their modules), so an eager import of a heavy
+dependency (pandas, google.generativeai, chromadb, pyarrow) on the module
+path shows up immediately. With --boot it also starts the app (``load_bench serve``,
+stub Gemini model) and times how long until /health answers (liveness)
+and until /health/ready returns 200 (pools open, warm-up finished), with
+the duration of each warm-up step. Exits with status 1 when the median
+import time exceeds --max-import-ms.
+
+Database (--boot): DATABASE_URL, or --pgdata DIR as in benchmarks.load_bench.
+
+Usage (from the server directory):
+    python -m benchmarks.startup_bench [--runs 5] [--top 15] [--max-import-ms N] [--boot [--pgdata DIR]]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.load_bench import SERVER_DIR, _free_port, _use_pgdata
+
+
+def _child_env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = SERVER_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    # Bytecode is written on the first run; later runs measure a warm cache
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def parse_importtime(stderr: str) -> Tuple[float, Dict[str, float]]:
+    """
+    Parse ``-X importtime`` output
+
+    Returns:
+        (cumulative seconds of ``import main``, top-level package -> own
+        import seconds of all its modules)
+    """
+    packages: Dict[str, float] = {}
+    total = 0.0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|", 2)
+        name = name.strip()
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0.0) + int(own) / 1e6
+        if name == "main":
+            total = int(cumulative) / 1e6
+    return total, packages
+
+
+def measure_imports(runs: int) -> Tuple[List[float], Dict[str, float]]:
+    """Import main ``runs`` times; returns per-run totals and the median per package"""
+    totals: List[float] = []
+    samples: Dict[str, List[float]] = {}
+    for _ in range(runs):
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import main"],
+            cwd=SERVER_DIR, env=_child_env(), capture_output=True, text=True,
+        )
+        if process.returncode != 0:
+            raise SystemExit(f"import main failed:\n{process.stderr[-4000:]}")
+        total, packages = parse_importtime(process.stderr)
+        totals.append(total)
+        for package, seconds in packages.items():
+            samples.setdefault(package, []).append(seconds)
+    return totals, {package: statistics.median(values) for package, values in samples.items()}
+
+
+def measure_boot(timeout: float, llm_ms: float) -> Dict[str, object]:
+    """Start the app; seconds until /health answers and until /health/ready is 200"""
+    import httpx
+
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    command = [sys.executable, "-m", "benchmarks.load_bench", "serve", "--port", str(port), "--llm-ms", str(llm_ms)]
+    live: Optional[float] = None
+    with tempfile.TemporaryFile() as log:
+        started = time.perf_counter()
+        process = subprocess.Popen(command, cwd=SERVER_DIR, env=_child_env(), stdout=log, stderr=subprocess.STDOUT)
+        try:
+            while True:
+                if process.poll() is not None or time.perf_counter() - started > timeout:
+                    log.seek(0)
+                    output = log.read().decode(errors="replace")[-4000:]
+                    raise SystemExit(f"Server did not become ready:\n{output}")
+                try:
+                    if live is None and httpx.get(f"{url}/health", timeout=1.0).status_code == 200:
+                        live = time.perf_counter() - started
+                    response = httpx.get(f"{url}/health/ready", timeout=1.0)
+                    if response.status_code == 200:
+                        return {"live": live, "ready": time.perf_counter() - started, "state": response.json()}
+                except httpx.HTTPError:
+                    pass
+                time.sleep(0.05)
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters importing main")
+    parser.add_argument("--top", type=int, default=15, help="packages listed")
+    parser.add_argument("--max-import-ms", type=float, help="fail when the median import time exceeds this")
+    parser.add_argument("--boot", action="store_true", help="also time server start until live and ready")
+    parser.add_argument("--pgdata", help="run a local PostgreSQL in DIR with pgserver instead of DATABASE_URL")
+    parser.add_argument("--llm-ms", type=float, default=300.0, help="simulated Gemini latency (--boot)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds to wait for readiness (--boot)")
+    args = parser.parse_args()
+
+    # First run compiles bytecode; it is not measured
+    measure_imports(1)
+    totals, packages = measure_imports(args.runs)
+    median = statistics.median(totals)
+    print(f"import main: median {median * 1000:.0f} ms, min {min(totals) * 1000:.0f} ms, "
+          f"max {max(totals) * 1000:.0f} ms over {len(totals)} runs")
+    print(f"\n{'package':<28}{'import ms':>14}")
+    for package, seconds in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{package:<28}{seconds * 1000:>14.1f}")
+
+    if args.boot:
+        _use_pgdata(args.pgdata)
+        boot = measure_boot(args.timeout, args.llm_ms)
+        state = boot["state"]
+        print(f"\nlive after {boot['live']:.2f}s, ready after {boot['ready']:.2f}s "
+              f"(warm-up {state['warmup_seconds']}s, degraded: {', '.join(state['degraded']) or 'none'})")
+        for step, outcome in state["steps"].items():
+            seconds = "-" if outcome["seconds"] is None else f"{outcome['seconds']:.3f}s"
+            print(f"  {step:<16}{outcome['status']:<10}{seconds:>10}")
+
+    if args.max_import_ms is not None and median * 1000 > args.max_import_ms:
+        print(f"\nREGRESSION: median import time {median * 1000:.0f} ms > {args.max_import_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Deterministic stand-in for the Gemini model used by the load benchmark
+
+Answers every prompt from a fixed question -> SQL table after a fixed,
+configurable latency, reports token usage the way Gemini's
+usage_metadata does and supports streamed responses, so the NL-to-SQL
+pipeline runs end to end (prompt, cache, validation, execution) without
+network calls or model variance. Questions outside the table get the
+"irrelevant question" answer the system prompt asks for.
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from services.prompt_builder import estimate_tokens
+
+IRRELEVANT_SQL = "SELECT 'ERROR: Irrelevant question' as error_msg;"
+
+# Benchmark questions and the SQL the stub answers them with
+QUESTION_SQL: Dict[str, str] = {
+    "Total revenue by client":
+        "SELECT customer, SUM(actual_revenue) AS revenue FROM revenue GROUP BY customer ORDER BY revenue DESC;",
+    "Monthly revenue and cost trend":
+        "SELECT month, SUM(actual_revenue) AS revenue, SUM(cost) AS cost FROM revenue GROUP BY month ORDER BY month;",
+    "Top 10 employees by actual hours":
+        "SELECT emp_name, SUM(actual_hrs) AS hours FROM revenue GROUP BY emp_name ORDER BY hours DESC LIMIT 10;",
+    "Average billable percentage by region":
+        "SELECT region, AVG(billable_pct) AS billable_pct FROM revenue GROUP BY region ORDER BY region;",
+    "Which skills bring in the most revenue in APAC?":
+        "SELECT skill, SUM(actual_revenue) AS revenue FROM revenue WHERE region ILIKE 'apac' "
+        "GROUP BY skill ORDER BY revenue DESC;",
+    "How many people does each project manager have per project?":
+        "SELECT project_manager, project_name, COUNT(DISTINCT emp_id) AS people FROM revenue "
+        "GROUP BY project_manager, project_name ORDER BY people DESC;",
+    "List the salary, support expense and cost of every employee":
+        "SELECT emp_id, emp_name, month, salary, support_expense, cost FROM revenue ORDER BY emp_id, month;",
+    "Which customers had more than 1 million in revenue?":
+        "SELECT customer, SUM(actual_revenue) AS revenue FROM revenue GROUP BY customer "
+        "HAVING SUM(actual_revenue) > 1000000 ORDER BY revenue DESC;",
+}
+
+_QUESTION_MARKER = "### QUESTION:\n"
+_SQL_MARKER = "\n### SQL:"
+
+
+def question_of(prompt: str) -> str:
+    """Question embedded in a prompt built by services.prompts.get_full_prompt"""
+    start = prompt.find(_QUESTION_MARKER)
+    if start < 0:
+        return prompt.strip()
+    start += len(_QUESTION_MARKER)
+    end = prompt.find(_SQL_MARKER, start)
+    return prompt[start:end if end >= 0 else None].strip()
+
+
+class _StubResponse:
+    """Response (or streamed chunk) with the attributes the service reads"""
+
+    def __init__(self, text: str, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class _StubStream:
+    """Async iterator over streamed chunks; usage_metadata is set once exhausted"""
+
+    def __init__(self, chunks: List[str], usage, first_delay: float, chunk_delay: float):
+        self._chunks = chunks
+        self._usage = usage
+        self._first_delay = first_delay
+        self._chunk_delay = chunk_delay
+        self.usage_metadata = None
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for index, chunk in enumerate(self._chunks):
+            await asyncio.sleep(self._first_delay if index == 0 else self._chunk_delay)
+            yield _StubResponse(chunk)
+        self.usage_metadata = self._usage
+
+
+class StubGeminiModel:
+    """Drop-in for genai.GenerativeModel on the calls GeminiSQLService makes"""
+
+    def __init__(self, answers: Optional[Dict[str, str]] = None, latency_ms: float = 300.0,
+                 stream_chunks: int = 4, model_name: str = "stub-gemini"):
+        """
+        Args:
+            answers: Question -> SQL (default QUESTION_SQL)
+            latency_ms: Simulated time per generate call
+            stream_chunks: Chunks a streamed answer is split into
+            model_name: Reported model name
+        """
+        self.answers = dict(QUESTION_SQL if answers is None else answers)
+        self.latency = latency_ms / 1000
+        self.stream_chunks = max(stream_chunks, 1)
+        self.model_name = model_name
+        self.calls = 0
+
+    def _answer(self, prompt: str):
+        self.calls += 1
+        text = self.answers.get(question_of(prompt), IRRELEVANT_SQL)
+        usage = SimpleNamespace(
+            prompt_token_count=estimate_tokens(prompt),
+            candidates_token_count=estimate_tokens(text),
+        )
+        return text, usage
+
+    def generate_content(self, prompt: str) -> _StubResponse:
+        text, usage = self._answer(prompt)
+        time.sleep(self.latency)
+        return _StubResponse(text, usage)
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        text, usage = self._answer(prompt)
+        if not stream:
+            await asyncio.sleep(self.latency)
+            return _StubResponse(text, usage)
+
+        size = -(-len(text) // self.stream_chunks)
+        chunks = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+        # Most of a generate call is time to first token
+        first_delay = self.latency * 0.6
+        chunk_delay = (self.latency - first_delay) / max(len(chunks) - 1, 1)
+        return _StubStream(chunks, usage, first_delay, chunk_delay)
+
+    def count_tokens(self, prompt: str):
+        return SimpleNamespace(total_tokens=estimate_tokens(prompt))
@@ -0,0 +1,165 @@
+"""
+Micro-benchmark: legacy regex SQLValidator vs the single-pass tokenizer
+
+Usage (from the server directory):
+    python -m benchmarks.validator_bench [--queries 5000] [--repeat 5] [--hot 256]
+"""
+import argparse
+import random
+import re
+import time
+from typing import List, Tuple
+
+from services.sql_validator import SQLValidator
+
+
+class LegacySQLValidator:
+    """The previous regex-per-keyword validator, kept as the benchmark baseline"""
+
+    DANGEROUS_KEYWORDS = SQLValidator.DANGEROUS_KEYWORDS
+
+    @staticmethod
+    def validate_query(query: str) -> Tuple[bool, str]:
+        if not query or not query.strip():
+            return False, "Query cannot be empty"
+
+        normalized = LegacySQLValidator._normalize_query(query)
+
+        for keyword in LegacySQLValidator.DANGEROUS_KEYWORDS:
+            pattern = r'\b' + re.escape(keyword) + r'\b'
+            if re.search(pattern, normalized, re.IGNORECASE):
+                return False, f"Dangerous SQL keyword '{keyword}' is not allowed. Only SELECT queries are permitted."
+
+        if not re.match(r'^\s*SELECT\s+', normalized, re.IGNORECASE):
+            return False, "Only SELECT queries are allowed"
+
+        if normalized.count('(') != normalized.count(')'):
+            return False, "Unbalanced parentheses in query"
+
+        sql_injection_patterns = [
+            r';\s*(DROP|DELETE|INSERT|UPDATE|ALTER|CREATE)',
+            r'--',
+            r'/\*',
+            r'UNION\s+SELECT',
+        ]
+        for pattern in sql_injection_patterns:
+            if re.search(pattern, normalized, re.IGNORECASE):
+                return False, "Potentially malicious SQL pattern detected"
+
+        return True, ""
+
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        query = re.sub(r'--.*$', '', query, flags=re.MULTILINE)
+        query = re.sub(r'/\*.*?\*/', '', query, flags=re.DOTALL)
+        return ' '.join(query.split())
+
+
+COLUMNS = [
+    "emp_name", "customer", "skill", "designation", "region", "project_manager",
+    "month", "actual_revenue", "actual_hrs", "cost", "salary", "billable_pct",
+]
+NAMES = ["Javi Pacheco", "Francis Poku", "Update Labs", "Drop Zone Ltd", "Acme", "Globex"]
+
+
+def generate_corpus(size: int, seed: int = 42) -> List[str]:
+    """
+    Generate a deterministic corpus of dashboard- and LLM-style queries
+
+    Includes aggregates, filters on string literals (some containing SQL
+    keywords), comments, subqueries and a share of malicious statements.
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        dim = rng.choice(COLUMNS[:7])
+        metric = rng.choice(COLUMNS[7:])
+        name = rng.choice(NAMES)
+        kind = rng.random()
+        if kind < 0.35:
+            query = (
+                f"SELECT {dim}, SUM({metric}) AS total FROM revenue "
+                f"GROUP BY {dim} ORDER BY total DESC LIMIT {rng.randint(5, 50)}"
+            )
+        elif kind < 0.6:
+            query = (
+                f"SELECT {dim}, AVG({metric}) FROM revenue "
+                f"WHERE customer ILIKE '%{name}%' AND month >= '2024-0{rng.randint(1, 9)}-01' "
+                f"GROUP BY {dim}"
+            )
+        elif kind < 0.75:
+            query = (
+                f"-- generated\nSELECT * FROM revenue WHERE {dim} IN "
+                f"(SELECT {dim} FROM revenue /* top */ GROUP BY {dim} "
+                f"HAVING SUM({metric}) > {rng.randint(1000, 90000)})"
+            )
+        elif kind < 0.9:
+            query = (
+                f"SELECT COUNT(*) FROM revenue WHERE emp_name = '{name}' "
+                f"UNION ALL SELECT COUNT(*) FROM revenue WHERE region = 'EU'"
+            )
+        else:
+            query = rng.choice([
+                "SELECT 1; DROP TABLE revenue",
+                f"DELETE FROM revenue WHERE emp_name = '{name}'",
+                "SELECT * FROM revenue UNION SELECT * FROM pg_user",
+                "UPDATE revenue SET cost = 0",
+            ])
+        corpus.append(query)
+    return corpus
+
+
+def _time(validate, corpus: List[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for query in corpus:
+            validate(query)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=5000, help="corpus size")
+    parser.add_argument("--repeat", type=int, default=5, help="timing repetitions (best is reported)")
+    parser.add_argument("--hot", type=int, default=256, help="distinct queries in the recurring workload")
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.queries)
+    unique = len(set(corpus))
+
+    legacy = _time(LegacySQLValidator.validate_query, corpus, args.repeat)
+    # Cold: every query scanned (memo bypassed)
+    cold = _time(SQLValidator._scan, corpus, args.repeat)
+    SQLValidator._scan_memoized.cache_clear()
+    warm = _time(SQLValidator.validate_query, corpus, args.repeat)
+
+    # Recurring workload: a hot set of distinct statements sent over and over
+    hot_set = sorted(set(corpus))[:args.hot]
+    rng = random.Random(7)
+    hot_corpus = [rng.choice(hot_set) for _ in range(len(corpus))]
+    hot_legacy = _time(LegacySQLValidator.validate_query, hot_corpus, args.repeat)
+    SQLValidator._scan_memoized.cache_clear()
+    hot_memo = _time(SQLValidator.validate_query, hot_corpus, args.repeat)
+
+    disagreements = [
+        q for q in corpus
+        if LegacySQLValidator.validate_query(q)[0] != SQLValidator.validate_query(q)[0]
+    ]
+
+    per_query = lambda seconds: seconds / len(corpus) * 1e6
+    print(f"corpus: {len(corpus)} queries ({unique} unique)")
+    print(f"legacy regex validator : {per_query(legacy):8.2f} us/query")
+    print(f"single-pass scan (cold): {per_query(cold):8.2f} us/query  ({legacy / cold:5.1f}x)")
+    print(f"validate_query (LRU)   : {per_query(warm):8.2f} us/query  ({legacy / warm:5.1f}x)")
+    print(f"hot set of {len(hot_set)} queries:")
+    print(f"  legacy regex validator : {per_query(hot_legacy):8.2f} us/query")
+    print(f"  validate_query + memo  : {per_query(hot_memo):8.2f} us/query  ({hot_legacy / hot_memo:5.1f}x)")
+    print(f"verdict differences    : {len(disagreements)} (keywords inside string literals)")
+    for query in sorted(set(disagreements))[:5]:
+        print(f"  legacy={LegacySQLValidator.validate_query(query)[0]} new={SQLValidator.validate_query(query)[0]}: {query}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,54 +1,147 @@
 """PostgreSQL database connection management using psycopg2"""
 import psycopg2
-import psycopg2.pool
-from psycopg2.extras import RealDictCursor
-from contextlib import contextmanager
-from typing import Optional, Dict, Any
+from psycopg2 import sql
+from contextlib import contextmanager, asynccontextmanager
+from datetime import date, datetime, timedelta
+from typing import Optional, Dict, Any, Callable, Iterable, List, Sequence, Tuple
+import csv
+import io
 import os
-from urllib.parse import urlparse
+import time
+from urllib.parse import parse_qs, urlparse
 from dotenv import load_dotenv
 
+from db.pool import ManagedConnectionPool, pool_settings_from_env
+from services.metrics import observe_stage
+
+try:
+    # psycopg 3 provides the asyncio connection pool
+    from psycopg_pool import AsyncConnectionPool
+except ImportError:
+    AsyncConnectionPool = None
+
 load_dotenv()
 
+# Bulk load modes: replace the table contents, append rows, upsert on the primary key,
+# or apply only the rows that changed since the last load of the full extract
+BULK_LOAD_MODES = ("replace", "append", "merge", "incremental")
+
+# Day zero of Excel serial dates (1900 date system)
+EXCEL_EPOCH = datetime(1899, 12, 30)
+
+TARGET_COLUMNS_QUERY = """
+    SELECT a.attname AS name, format_type(a.atttypid, a.atttypmod) AS type
+    FROM pg_attribute a
+    WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+    ORDER BY a.attnum
+"""
+
+# Port of Supabase's transaction-mode pooler (PgBouncer/Supavisor)
+TRANSACTION_POOLER_PORT = 6543
+
+PRIMARY_KEY_QUERY = """
+    SELECT a.attname
+    FROM pg_index ix
+    JOIN pg_attribute a ON a.attrelid = ix.indrelid AND a.attnum = ANY(ix.indkey)
+    WHERE ix.indrelid = %s::regclass AND ix.indisprimary
+"""
+
+
+def _copy_value(value: Any, pg_type: str) -> Any:
+    """
+    Convert a spreadsheet cell to COPY text input for a target column type
+
+    Spreadsheet numbers arrive as floats and .xlsb dates as serial numbers,
+    neither of which PostgreSQL accepts for integer/date columns as-is.
+    """
+    if value is None:
+        return None
+    if isinstance(value, float):
+        if pg_type in ("integer", "bigint", "smallint") and value.is_integer():
+            return int(value)
+        if pg_type == "date":
+            return (EXCEL_EPOCH + timedelta(days=value)).date().isoformat()
+        if pg_type.startswith("timestamp"):
+            return (EXCEL_EPOCH + timedelta(days=value)).isoformat(sep=" ")
+    if isinstance(value, datetime) and pg_type == "date":
+        return value.date().isoformat()
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def behind_transaction_pooler() -> bool:
+    """
+    Whether DATABASE_URL goes through a transaction-mode pooler
+
+    Consecutive transactions of one client connection may then run on
+    different server sessions, so session state such as prepared
+    statements does not carry over. Detected by the pooler port (6543);
+    DB_TRANSACTION_POOLER=true/false overrides the detection.
+    """
+    override = os.getenv("DB_TRANSACTION_POOLER")
+    if override:
+        return override.lower() == "true"
+    try:
+        return urlparse(os.getenv("DATABASE_URL", "")).port == TRANSACTION_POOLER_PORT
+    except ValueError:
+        return False
+
 
 class DatabaseConnection:
     """Manages PostgreSQL database connections using psycopg2 with SSL support for Supabase"""
     
     def __init__(self):
-        self._pool: Optional[psycopg2.pool.ThreadedConnectionPool] = None
-        self._min_conn = 1
-        self._max_conn = 10
+        self._pool: Optional[ManagedConnectionPool] = None
+        self._async_pool = None
+        self._pool_settings = pool_settings_from_env()
     
-    def initialize(self) -> None:
-        """Initialize database connection pool with SSL for Supabase"""
+    @staticmethod
+    def _get_connection_params() -> Dict[str, Any]:
+        """
+        Build connection parameters from DATABASE_URL
+        
+        Returns:
+            Dictionary of libpq connection parameters (with SSL for Supabase)
+        """
         database_url = os.getenv("DATABASE_URL")
         
         if not database_url:
             raise Exception("DATABASE_URL not found in environment variables")
         
+        # Parse database URL
+        parsed = urlparse(database_url)
+        
+        # Extract connection parameters (a "host" query parameter, e.g. a
+        # Unix socket directory, stands in for an empty host)
+        query = parse_qs(parsed.query)
+        db_params = {
+            "host": parsed.hostname or query.get("host", [None])[0],
+            "port": parsed.port or 5432,
+            "database": parsed.path.lstrip("/"),
+            "user": parsed.username,
+            "password": parsed.password,
+        }
+        
+        # Add SSL mode for Supabase (require SSL)
+        # This ensures secure connection to Supabase PostgreSQL; DB_SSLMODE
+        # overrides it for local databases (benchmarks, development)
+        db_params["sslmode"] = os.getenv("DB_SSLMODE", "require")
+        
+        # TCP keepalives detect silently dropped sessions on idle connections
+        db_params["keepalives"] = 1
+        db_params["keepalives_idle"] = 60
+        
+        return db_params
+    
+    def initialize(self) -> None:
+        """Initialize and pre-warm the database connection pool with SSL for Supabase"""
+        db_params = self._get_connection_params()
+        
         try:
-            # Parse database URL
-            parsed = urlparse(database_url)
-            
-            # Extract connection parameters
-            db_params = {
-                "host": parsed.hostname,
-                "port": parsed.port or 5432,
-                "database": parsed.path.lstrip("/"),
-                "user": parsed.username,
-                "password": parsed.password,
-            }
-            
-            # Add SSL mode for Supabase (require SSL)
-            # This ensures secure connection to Supabase PostgreSQL
-            db_params["sslmode"] = "require"
-            
             # Create connection pool
-            self._pool = psycopg2.pool.ThreadedConnectionPool(
-                self._min_conn,
-                self._max_conn,
-                **db_params
-            )
+            self._pool = ManagedConnectionPool(**self._pool_settings, **db_params)
+            self._pool.prewarm()
             
             # Test connection
             with self.get_connection() as conn:
@@ -59,20 +152,102 @@ class DatabaseConnection:
             raise Exception(f"Failed to initialize database: {str(e)}")
     
     @contextmanager
-    def get_connection(self):
-        """Get a database connection from the pool"""
+    def get_connection(self, timeout: Optional[float] = None):
+        """
+        Get a database connection from the pool
+        
+        Waits up to ``timeout`` seconds (DB_POOL_TIMEOUT by default) when
+        every connection is in use. Connections that fail with a connection
+        level error are discarded instead of returned to the pool; a
+        cancelled statement (statement_timeout, pg_cancel_backend) leaves
+        the connection usable, so it is rolled back and kept.
+        """
         if not self._pool:
             raise Exception("Database not initialized. Call initialize() first.")
         
-        conn = self._pool.getconn()
+        start = time.perf_counter()
+        conn = self._pool.getconn(timeout)
+        observe_stage("pool_wait", time.perf_counter() - start)
+        broken = False
         try:
             yield conn
+        except psycopg2.extensions.QueryCanceledError:
+            # Subclass of OperationalError, but only the statement failed
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+            raise
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
         finally:
-            self._pool.putconn(conn)
+            self._pool.putconn(conn, close=broken)
+    
+    async def initialize_async(self) -> None:
+        """
+        Initialize the asyncio connection pool (psycopg 3)
+        
+        The async pool runs alongside the psycopg2 pool with the same sizing,
+        wait timeout and recycling settings, and serves the async request
+        paths without blocking the event loop.
+        """
+        if AsyncConnectionPool is None:
+            raise Exception("psycopg 3 (psycopg_pool) is not installed; async pool unavailable")
+        
+        db_params = self._get_connection_params()
+        # psycopg 3 uses libpq's "dbname" keyword
+        db_params["dbname"] = db_params.pop("database")
+        # No automatic prepared statements: only the prepared statement cache
+        # asks for them, and never behind a transaction-mode pooler
+        db_params["prepare_threshold"] = None
+        settings = self._pool_settings
+        
+        try:
+            pool = AsyncConnectionPool(
+                kwargs=db_params,
+                min_size=settings["min_size"],
+                max_size=settings["max_size"],
+                timeout=settings["timeout"],
+                max_waiting=settings["max_waiters"],
+                # psycopg_pool has no "never": an infinite lifetime disables recycling
+                max_lifetime=settings["max_lifetime"] or float("inf"),
+                check=getattr(AsyncConnectionPool, "check_connection", None),
+                open=False
+            )
+            await pool.open(wait=True)
+            
+            # Test connection
+            async with pool.connection() as conn:
+                await conn.execute("SELECT 1")
+            
+            self._async_pool = pool
+        
+        except Exception as e:
+            raise Exception(f"Failed to initialize async database pool: {str(e)}")
+    
+    @property
+    def async_available(self) -> bool:
+        """Whether the asyncio connection pool is initialized"""
+        return self._async_pool is not None
+    
+    @asynccontextmanager
+    async def get_async_connection(self):
+        """Get an asyncio (psycopg 3) connection from the async pool"""
+        if not self._async_pool:
+            raise Exception("Async database pool not initialized. Call initialize_async() first.")
+        
+        start = time.perf_counter()
+        async with self._async_pool.connection() as conn:
+            observe_stage("pool_wait", time.perf_counter() - start)
+            yield conn
     
     def get_schema_metadata(self) -> Dict[str, Any]:
         """
-        Get database schema metadata using direct PostgreSQL queries
+        Get database schema metadata from the cached pg_catalog snapshot
+        
+        The snapshot is built with two batched catalog queries and reloaded
+        only when the catalog fingerprint changes (see db/schema.py).
         
         Returns:
             Dictionary containing tables, columns, and their types
@@ -80,119 +255,304 @@ class DatabaseConnection:
         if not self._pool:
             raise Exception("Database not initialized")
         
-        schema_info = {"tables": {}}
+        # Import here to avoid circular dependency
+        from db.schema import schema_catalog
         
         try:
-            with self.get_connection() as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    # Get all tables in public schema
-                    cur.execute("""
-                        SELECT table_name 
-                        FROM information_schema.tables 
-                        WHERE table_schema = 'public' 
-                        AND table_type = 'BASE TABLE'
-                        ORDER BY table_name
-                    """)
-                    tables = [row["table_name"] for row in cur.fetchall()]
+            return schema_catalog.get_snapshot()
+        except Exception as e:
+            raise Exception(f"Failed to retrieve schema metadata: {str(e)}")
+    
+    def bulk_load(
+        self,
+        table_name: str,
+        chunks: Iterable[Tuple[Sequence[str], Sequence[Sequence[Any]]]],
+        mode: str = "replace",
+        track_columns: Sequence[str] = (),
+        on_applied: Optional[Callable[[Any, Dict[str, Optional[List[Any]]]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Bulk load rows into a table with COPY FROM STDIN
+        
+        Chunks are streamed one at a time into a temporary staging table, so
+        memory is bounded by the chunk size. The staging table is then applied
+        to the target in the same transaction, so readers see either the old
+        or the new contents, never a partial load.
+        
+        In incremental mode the source is the full extract: each staged row
+        is hashed and compared with the stored hash of its primary key (see
+        _stage_changes), and only new, changed and vanished keys are written.
+        
+        Args:
+            table_name: Target table
+            chunks: Iterable of (column names, rows); columns missing from the
+                target table are ignored
+            mode: "replace" (swap in the new contents), "append", "merge"
+                (upsert on the primary key) or "incremental" (upsert changed
+                rows, delete keys missing from the source)
+            track_columns: Columns whose affected values are reported (e.g.
+                "month"); None for a column means every value (replace mode)
+            on_applied: Callback(cursor, affected) run in the load transaction
+                after the rows are applied, e.g. to refresh derived tables
+        
+        Returns:
+            Dictionary with rows loaded, chunks, ignored columns, affected
+            values, delta (inserted/updated/deleted/unchanged rows, incremental
+            mode only), seconds and rows_per_sec
+        """
+        if mode not in BULK_LOAD_MODES:
+            raise ValueError(f"Unsupported bulk load mode '{mode}'. Supported: {', '.join(BULK_LOAD_MODES)}")
+        
+        start_time = time.time()
+        # Import here to avoid circular dependency
+        from db.schema import INTERNAL_TABLE_PREFIX
+        target = sql.Identifier(table_name)
+        stage = sql.Identifier(f"{INTERNAL_TABLE_PREFIX}stage_{table_name}")
+        hashes = sql.Identifier(f"{INTERNAL_TABLE_PREFIX}row_hashes_{table_name}")
+        
+        with self.get_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(TARGET_COLUMNS_QUERY, (table_name,))
+                    target_types = dict(cur.fetchall())
                     
-                    for table_name in tables:
-                        # Get columns
-                        cur.execute("""
-                            SELECT 
-                                column_name,
-                                data_type,
-                                is_nullable,
-                                column_default
-                            FROM information_schema.columns
-                            WHERE table_schema = 'public' 
-                            AND table_name = %s
-                            ORDER BY ordinal_position
-                        """, (table_name,))
-                        columns = [
-                            {
-                                "name": col["column_name"],
-                                "type": col["data_type"],
-                                "nullable": col["is_nullable"] == "YES",
-                                "default": str(col["column_default"]) if col["column_default"] else ""
-                            }
-                            for col in cur.fetchall()
-                        ]
-                        
-                        # Get primary keys
-                        cur.execute("""
-                            SELECT column_name
-                            FROM information_schema.table_constraints tc
-                            JOIN information_schema.key_column_usage kcu
-                                ON tc.constraint_name = kcu.constraint_name
-                            WHERE tc.table_schema = 'public'
-                            AND tc.table_name = %s
-                            AND tc.constraint_type = 'PRIMARY KEY'
-                            ORDER BY kcu.ordinal_position
-                        """, (table_name,))
-                        primary_keys = [row["column_name"] for row in cur.fetchall()]
-                        
-                        # Get foreign keys
-                        cur.execute("""
-                            SELECT
-                                kcu.constraint_name,
-                                kcu.column_name,
-                                ccu.table_name AS foreign_table_name,
-                                ccu.column_name AS foreign_column_name
-                            FROM information_schema.table_constraints AS tc
-                            JOIN information_schema.key_column_usage AS kcu
-                                ON tc.constraint_name = kcu.constraint_name
-                            JOIN information_schema.constraint_column_usage AS ccu
-                                ON ccu.constraint_name = tc.constraint_name
-                            WHERE tc.constraint_type = 'FOREIGN KEY'
-                            AND tc.table_schema = 'public'
-                            AND tc.table_name = %s
-                        """, (table_name,))
-                        foreign_keys = [
-                            {
-                                "name": fk["constraint_name"],
-                                "constrained_columns": [fk["column_name"]],
-                                "referred_table": fk["foreign_table_name"],
-                                "referred_columns": [fk["foreign_column_name"]]
-                            }
-                            for fk in cur.fetchall()
-                        ]
-                        
-                        # Get indexes
-                        cur.execute("""
-                            SELECT
-                                indexname,
-                                indexdef
-                            FROM pg_indexes
-                            WHERE schemaname = 'public'
-                            AND tablename = %s
-                        """, (table_name,))
-                        indexes = []
-                        for idx in cur.fetchall():
-                            # Parse index definition to extract columns
-                            idx_def = idx["indexdef"]
-                            # Extract column names from index definition
-                            # This is a simple parser - may need refinement
-                            import re
-                            col_match = re.search(r'\(([^)]+)\)', idx_def)
-                            columns_list = [col.strip().strip('"') for col in col_match.group(1).split(",")] if col_match else []
-                            
-                            indexes.append({
-                                "name": idx["indexname"],
-                                "columns": columns_list,
-                                "unique": "UNIQUE" in idx_def.upper()
-                            })
+                    cur.execute(
+                        sql.SQL("CREATE TEMP TABLE {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP").format(stage, target)
+                    )
+                    
+                    rows_loaded = 0
+                    chunk_count = 0
+                    columns: List[str] = []
+                    ignored: List[str] = []
+                    for header, rows in chunks:
+                        if not columns:
+                            positions = [i for i, name in enumerate(header) if name in target_types]
+                            columns = [header[i] for i in positions]
+                            ignored = [name for name in header if name not in target_types]
+                            if not columns:
+                                raise Exception(f"No source columns match table '{table_name}'")
+                            types = [target_types[name] for name in columns]
+                            copy_stmt = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
+                                stage, sql.SQL(", ").join(map(sql.Identifier, columns))
+                            )
                         
-                        schema_info["tables"][table_name] = {
-                            "columns": columns,
-                            "primary_keys": primary_keys,
-                            "foreign_keys": foreign_keys,
-                            "indexes": indexes
-                        }
+                        buffer = io.StringIO()
+                        writer = csv.writer(buffer)
+                        for row in rows:
+                            writer.writerow([_copy_value(row[i], t) for i, t in zip(positions, types)])
+                        buffer.seek(0)
+                        cur.copy_expert(copy_stmt.as_string(cur), buffer)
+                        rows_loaded += len(rows)
+                        chunk_count += 1
+                    
+                    affected: Dict[str, Optional[List[Any]]] = {}
+                    delta: Optional[Dict[str, int]] = None
+                    if columns:
+                        keys = self._primary_key(cur, table_name) if mode in ("merge", "incremental") else []
+                        if mode == "incremental":
+                            delta = self._stage_changes(cur, target, stage, hashes, columns, keys, target_types)
+                        for column in track_columns:
+                            affected[column] = self._affected_values(cur, target, stage, column, mode, keys)
+                        self._apply_stage(cur, table_name, target, stage, columns, mode, keys)
+                        self._sync_row_hashes(cur, hashes, mode, keys)
+                        if on_applied is not None:
+                            on_applied(cur, affected)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
         
-        except Exception as e:
-            raise Exception(f"Failed to retrieve schema metadata: {str(e)}")
+        seconds = time.time() - start_time
+        return {
+            "rows": rows_loaded,
+            "chunks": chunk_count,
+            "mode": mode,
+            "columns": columns,
+            "ignored_columns": ignored,
+            "affected": affected,
+            "delta": delta,
+            "seconds": round(seconds, 3),
+            "rows_per_sec": round(rows_loaded / seconds, 1) if seconds > 0 else None,
+        }
+    
+    @staticmethod
+    def _primary_key(cur, table_name: str) -> List[str]:
+        cur.execute(PRIMARY_KEY_QUERY, (table_name,))
+        keys = [row[0] for row in cur.fetchall()]
+        if not keys:
+            raise Exception(f"Table '{table_name}' has no primary key to merge on")
+        return keys
+    
+    @staticmethod
+    def _key_match(left: str, right: str, keys: List[str]) -> sql.Composed:
+        """Join condition on the primary key columns of two aliased relations"""
+        return sql.SQL(" AND ").join(
+            sql.SQL("{0}.{2} = {1}.{2}").format(sql.Identifier(left), sql.Identifier(right), sql.Identifier(name))
+            for name in keys
+        )
+    
+    @classmethod
+    def _stage_changes(cls, cur, target, stage, hashes, columns: List[str], keys: List[str],
+                       target_types: Dict[str, str]) -> Dict[str, int]:
+        """
+        Classify the staged extract against the target for an incremental load
+        
+        Rows are hashed in SQL (md5 of the typed row text over the loaded
+        columns), so a value reads the same whether it came from a .csv
+        string or an .xlsb float. Current rows are compared through the
+        hashes stored by the previous incremental load, keyed on the
+        primary key; rows without a stored hash (first load, or after a
+        load in another mode) are hashed from the target instead. Leaves
+        two temporary tables for the rest of the load:
+        
+            xdive_incoming  key, new row_hash, stored_hash, old_hash
+            xdive_changes   key, change ("insert", "update" or "delete")
+        
+        Returns:
+            Row counts: inserted, updated, deleted, unchanged
+        """
+        missing = [name for name in keys if name not in columns]
+        if missing:
+            raise Exception(f"Incremental load requires primary key column(s) {', '.join(missing)} in the source")
+        
+        key_list = sql.SQL(", ").join(map(sql.Identifier, keys))
+        
+        def row_hash(alias: str) -> sql.Composed:
+            return sql.SQL("md5(ROW({})::text)").format(sql.SQL(", ").join(
+                sql.SQL("{}.{}").format(sql.Identifier(alias), sql.Identifier(name)) for name in columns
+            ))
+        
+        cur.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} ({}, row_hash text NOT NULL, PRIMARY KEY ({}))").format(
+            hashes,
+            sql.SQL(", ").join(
+                sql.SQL("{} {} NOT NULL").format(sql.Identifier(name), sql.SQL(target_types[name])) for name in keys
+            ),
+            key_list,
+        ))
+        # The last staged row wins when a key repeats within the file
+        cur.execute(sql.SQL("DELETE FROM {} s USING {} d WHERE {} AND s.ctid < d.ctid").format(
+            stage, stage, cls._key_match("s", "d", keys)
+        ))
+        cur.execute(sql.SQL(
+            "CREATE TEMP TABLE xdive_incoming ON COMMIT DROP AS "
+            "SELECT {}, {} AS row_hash, h.row_hash AS stored_hash, "
+            "CASE WHEN t.{} IS NULL THEN NULL ELSE COALESCE(h.row_hash, {}) END AS old_hash "
+            "FROM {} s LEFT JOIN {} t ON {} LEFT JOIN {} h ON {}"
+        ).format(
+            sql.SQL(", ").join(sql.SQL("s.{}").format(sql.Identifier(name)) for name in keys),
+            row_hash("s"), sql.Identifier(keys[0]), row_hash("t"),
+            stage, target, cls._key_match("t", "s", keys), hashes, cls._key_match("h", "s", keys),
+        ))
+        cur.execute(sql.SQL(
+            "CREATE TEMP TABLE xdive_changes ON COMMIT DROP AS "
+            "SELECT {0}, CASE WHEN old_hash IS NULL THEN 'insert' ELSE 'update' END AS change "
+            "FROM xdive_incoming WHERE old_hash IS DISTINCT FROM row_hash "
+            "UNION ALL "
+            "SELECT {1}, 'delete' FROM {2} t WHERE NOT EXISTS (SELECT 1 FROM {3} s WHERE {4})"
+        ).format(
+            key_list,
+            sql.SQL(", ").join(sql.SQL("t.{}").format(sql.Identifier(name)) for name in keys),
+            target, stage, cls._key_match("s", "t", keys),
+        ))
+        
+        cur.execute("SELECT change, count(*) FROM xdive_changes GROUP BY change")
+        counts = dict(cur.fetchall())
+        delta = {"inserted": counts.get("insert", 0), "updated": counts.get("update", 0),
+                 "deleted": counts.get("delete", 0)}
+        cur.execute("SELECT count(*) FROM xdive_incoming")
+        delta["unchanged"] = cur.fetchone()[0] - delta["inserted"] - delta["updated"]
+        return delta
+    
+    @classmethod
+    def _sync_row_hashes(cls, cur, hashes, mode: str, keys: List[str]) -> None:
+        """Keep the stored row hashes in step with the target after a load"""
+        if mode == "incremental":
+            cur.execute(sql.SQL(
+                "DELETE FROM {} h USING xdive_changes c WHERE c.change = 'delete' AND {}"
+            ).format(hashes, cls._key_match("h", "c", keys)))
+            key_list = sql.SQL(", ").join(map(sql.Identifier, keys))
+            cur.execute(sql.SQL(
+                "INSERT INTO {0} ({1}, row_hash) SELECT {1}, row_hash FROM xdive_incoming "
+                "WHERE stored_hash IS DISTINCT FROM row_hash "
+                "ON CONFLICT ({1}) DO UPDATE SET row_hash = EXCLUDED.row_hash"
+            ).format(hashes, key_list))
+        elif mode != "append":
+            # Rows were replaced or overwritten: the next incremental load hashes the target itself
+            cur.execute("SELECT to_regclass(%s)", (hashes.string,))
+            if cur.fetchone()[0] is not None:
+                cur.execute(sql.SQL("TRUNCATE {}").format(hashes))
+    
+    @classmethod
+    def _affected_values(cls, cur, target, stage, column: str, mode: str, keys: List[str]) -> Optional[List[Any]]:
+        """Distinct values of a column touched by the load (None: all of them)"""
+        if mode == "replace":
+            return None
+        if mode == "incremental":
+            # New values of inserted/updated rows and old values of updated/deleted rows
+            query = sql.SQL(
+                "SELECT s.{0} FROM {1} s JOIN xdive_changes c ON {3} WHERE c.change <> 'delete' "
+                "UNION SELECT t.{0} FROM {2} t JOIN xdive_changes c ON {4} WHERE c.change <> 'insert'"
+            ).format(
+                sql.Identifier(column), stage, target,
+                cls._key_match("s", "c", keys), cls._key_match("t", "c", keys),
+            )
+            cur.execute(query)
+            return [row[0] for row in cur.fetchall()]
+        query = sql.SQL("SELECT DISTINCT {} FROM {}").format(sql.Identifier(column), stage)
+        if mode == "merge":
+            # Rows being overwritten may move out of their old value
+            query = query + sql.SQL(" UNION SELECT t.{} FROM {} t JOIN {} s USING ({})").format(
+                sql.Identifier(column), target, stage, sql.SQL(", ").join(map(sql.Identifier, keys))
+            )
+        cur.execute(query)
+        return [row[0] for row in cur.fetchall()]
+    
+    @classmethod
+    def _apply_stage(cls, cur, table_name: str, target, stage, columns: List[str], mode: str, keys: List[str]) -> None:
+        """Move the staged rows into the target table"""
+        column_list = sql.SQL(", ").join(map(sql.Identifier, columns))
+        insert = sql.SQL("INSERT INTO {} ({}) SELECT {} FROM {}").format(target, column_list, column_list, stage)
         
-        return schema_info
+        if mode == "replace":
+            cur.execute(sql.SQL("TRUNCATE {}").format(target))
+            cur.execute(insert)
+        elif mode == "append":
+            cur.execute(insert)
+        elif mode == "incremental":
+            # Staged keys are unique here (see _stage_changes); unchanged rows are not written
+            cur.execute(sql.SQL(
+                "DELETE FROM {} t USING xdive_changes c WHERE c.change = 'delete' AND {}"
+            ).format(target, cls._key_match("t", "c", keys)))
+            updates = [name for name in columns if name not in keys]
+            action = sql.SQL("DO UPDATE SET {}").format(sql.SQL(", ").join(
+                sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(name)) for name in updates
+            )) if updates else sql.SQL("DO NOTHING")
+            cur.execute(sql.SQL(
+                "INSERT INTO {} ({}) SELECT {} FROM {} s JOIN xdive_changes c ON {} "
+                "WHERE c.change <> 'delete' ON CONFLICT ({}) "
+            ).format(
+                target, column_list,
+                sql.SQL(", ").join(sql.SQL("s.{}").format(sql.Identifier(name)) for name in columns),
+                stage, cls._key_match("s", "c", keys), sql.SQL(", ").join(map(sql.Identifier, keys)),
+            ) + action)
+        else:
+            missing = [name for name in keys if name not in columns]
+            if missing:
+                raise Exception(f"Merge requires primary key column(s) {', '.join(missing)} in the source")
+            updates = [name for name in columns if name not in keys]
+            key_list = sql.SQL(", ").join(map(sql.Identifier, keys))
+            # The last staged row wins when a key repeats within the file
+            insert = sql.SQL(
+                "INSERT INTO {} ({}) SELECT DISTINCT ON ({}) {} FROM {} ORDER BY {}, ctid DESC"
+            ).format(target, column_list, key_list, column_list, stage, key_list)
+            conflict = sql.SQL(" ON CONFLICT ({}) ").format(key_list)
+            if updates:
+                action = sql.SQL("DO UPDATE SET {}").format(sql.SQL(", ").join(
+                    sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(name)) for name in updates
+                ))
+            else:
+                action = sql.SQL("DO NOTHING")
+            cur.execute(insert + conflict + action)
     
     def test_connection(self) -> bool:
         """Test database connection"""
@@ -207,11 +567,44 @@ class DatabaseConnection:
         except Exception:
             return False
     
+    def pool_stats(self) -> Dict[str, Any]:
+        """
+        Live statistics of the sync and async connection pools
+        
+        Returns:
+            Dictionary with "sync" and "async" pool statistics
+        """
+        async_stats = None
+        if self._async_pool is not None:
+            raw = self._async_pool.get_stats()
+            async_stats = {
+                "min_size": self._async_pool.min_size,
+                "max_size": self._async_pool.max_size,
+                "size": raw.get("pool_size", 0),
+                "idle": raw.get("pool_available", 0),
+                "in_use": raw.get("pool_size", 0) - raw.get("pool_available", 0),
+                "waiters": raw.get("requests_waiting", 0),
+                "acquired": raw.get("requests_num", 0),
+                "timeouts": raw.get("requests_errors", 0),
+                "wait_ms_total": raw.get("requests_wait_ms", 0),
+                "connections_lost": raw.get("connections_lost", 0),
+            }
+        return {
+            "sync": self._pool.stats() if self._pool else None,
+            "async": async_stats,
+        }
+    
     def close(self) -> None:
         """Close database connection pool"""
         if self._pool:
             self._pool.closeall()
             self._pool = None
+    
+    async def close_async(self) -> None:
+        """Close the asyncio connection pool"""
+        if self._async_pool:
+            await self._async_pool.close()
+            self._async_pool = None
 
 
 # Global database connection instance
@@ -0,0 +1,367 @@
+"""Thread-safe psycopg2 connection pool with a bounded wait queue, health checks and statistics"""
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import os
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+
+
+# Upper bounds (milliseconds) of the wait-time histogram buckets; the last bucket is +Inf
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class PoolTimeout(psycopg2.pool.PoolError):
+    """No connection became available within the wait timeout"""
+
+
+class PoolExhausted(psycopg2.pool.PoolError):
+    """The wait queue is full"""
+
+
+class _PooledConnection:
+    """Bookkeeping for one physical connection"""
+    __slots__ = ("conn", "created_at", "returned_at")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.returned_at = self.created_at
+
+
+class ManagedConnectionPool:
+    """
+    psycopg2 connection pool for production load
+
+    Unlike ThreadedConnectionPool, callers wait (up to ``timeout`` seconds)
+    for a connection instead of failing as soon as the pool is exhausted.
+    Connections older than ``max_lifetime`` are recycled, and connections
+    idle for longer than ``ping_interval`` are pinged before being handed
+    out, so a dropped SSL session is replaced instead of surfacing as an error.
+    """
+
+    def __init__(
+        self,
+        min_size: int = 1,
+        max_size: int = 10,
+        timeout: float = 30.0,
+        max_waiters: int = 100,
+        max_lifetime: Optional[float] = 1800.0,
+        ping_interval: Optional[float] = 30.0,
+        **connect_kwargs: Any
+    ):
+        """
+        Args:
+            min_size: Connections opened at pre-warm and kept open
+            max_size: Maximum number of open connections
+            timeout: Seconds a caller waits for a free connection
+            max_waiters: Maximum queued callers (0 for unbounded)
+            max_lifetime: Seconds before a connection is recycled (None disables)
+            ping_interval: Idle seconds after which a connection is pinged
+                before reuse (0 pings every checkout, None disables)
+            **connect_kwargs: libpq parameters for psycopg2.connect
+        """
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_waiters = max_waiters
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+        self._connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition()
+        self._idle: Deque[_PooledConnection] = deque()
+        self._in_use: Dict[int, _PooledConnection] = {}
+        self._opening = 0
+        self._waiters = 0
+        self._closed = False
+
+        self._wait_buckets: List[int] = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self._wait_total = 0.0
+        self.acquired = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.opened = 0
+        self.recycled = 0
+        self.failed_pings = 0
+        self.discarded = 0
+
+    # --- Connection lifecycle ---
+
+    def _size(self) -> int:
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def _connect(self) -> _PooledConnection:
+        conn = psycopg2.connect(**self._connect_kwargs)
+        self.opened += 1
+        return _PooledConnection(conn)
+
+    @staticmethod
+    def _close(entry: _PooledConnection) -> None:
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+
+    def _expired(self, entry: _PooledConnection, now: float) -> bool:
+        return self.max_lifetime is not None and now - entry.created_at > self.max_lifetime
+
+    def _healthy(self, entry: _PooledConnection) -> bool:
+        """Check a connection leaving the idle queue"""
+        now = time.monotonic()
+        if entry.conn.closed:
+            return False
+        if self._expired(entry, now):
+            self.recycled += 1
+            return False
+        if self.ping_interval is not None and now - entry.returned_at >= self.ping_interval:
+            try:
+                with entry.conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                entry.conn.rollback()
+            except Exception:
+                self.failed_pings += 1
+                return False
+        return True
+
+    def prewarm(self) -> int:
+        """
+        Open connections until the pool holds ``min_size``
+
+        Returns:
+            Number of connections opened
+        """
+        opened = 0
+        while True:
+            with self._cond:
+                if self._closed or self._size() >= self.min_size:
+                    return opened
+                self._opening += 1
+            try:
+                entry = self._connect()
+            except Exception:
+                with self._cond:
+                    self._opening -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._opening -= 1
+                self._idle.append(entry)
+                self._cond.notify()
+            opened += 1
+
+    def _record_wait(self, seconds: float) -> None:
+        self._wait_total += seconds
+        self._wait_buckets[bisect_left(WAIT_BUCKETS_MS, seconds * 1000)] += 1
+
+    def getconn(self, timeout: Optional[float] = None):
+        """
+        Check out a connection, waiting for one to be returned if the pool is full
+
+        Args:
+            timeout: Seconds to wait (defaults to the pool timeout)
+
+        Returns:
+            psycopg2 connection
+
+        Raises:
+            PoolTimeout: No connection became available in time
+            PoolExhausted: Too many callers are already waiting
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        while True:
+            entry = None
+            with self._cond:
+                if self._closed:
+                    raise psycopg2.pool.PoolError("connection pool is closed")
+
+                if not self._idle and self._size() >= self.max_size:
+                    if self.max_waiters and self._waiters >= self.max_waiters:
+                        self.rejected += 1
+                        raise PoolExhausted(
+                            f"connection pool exhausted ({self._waiters} requests already waiting)"
+                        )
+                    self._waiters += 1
+                    try:
+                        while not self._idle and self._size() >= self.max_size and not self._closed:
+                            remaining = deadline - time.monotonic()
+                            if remaining <= 0:
+                                self.timeouts += 1
+                                raise PoolTimeout(
+                                    f"no database connection available after {timeout:.1f}s "
+                                    f"({self.max_size} in use)"
+                                )
+                            self._cond.wait(remaining)
+                    finally:
+                        self._waiters -= 1
+                    continue
+
+                if self._idle:
+                    # LIFO keeps the warmest connections busy and lets the rest expire
+                    entry = self._idle.pop()
+                    self._in_use[id(entry.conn)] = entry
+                else:
+                    self._opening += 1
+
+            if entry is not None:
+                if self._healthy(entry):
+                    break
+                with self._cond:
+                    self._in_use.pop(id(entry.conn), None)
+                    self._cond.notify()
+                self._close(entry)
+                continue
+
+            try:
+                entry = self._connect()
+            except Exception:
+                with self._cond:
+                    self._opening -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._opening -= 1
+                self._in_use[id(entry.conn)] = entry
+            break
+
+        with self._cond:
+            self.acquired += 1
+            self._record_wait(time.monotonic() - start)
+        return entry.conn
+
+    def putconn(self, conn, close: bool = False) -> None:
+        """
+        Return a connection to the pool
+
+        Open transactions are rolled back. Broken or expired connections
+        (and any passed with ``close=True``) are closed instead of reused.
+        """
+        with self._cond:
+            entry = self._in_use.pop(id(conn), None)
+        if entry is None:
+            raise psycopg2.pool.PoolError("trying to put unkeyed connection")
+
+        keep = not close and not self._closed and not conn.closed
+        if keep:
+            status = conn.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                keep = False
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except Exception:
+                    keep = False
+        if keep and self._expired(entry, time.monotonic()):
+            self.recycled += 1
+            keep = False
+
+        if keep:
+            entry.returned_at = time.monotonic()
+            with self._cond:
+                self._idle.append(entry)
+                self._cond.notify()
+            return
+
+        self.discarded += 1
+        self._close(entry)
+        with self._cond:
+            self._cond.notify()
+
+    def closeall(self) -> None:
+        """Close every idle connection and refuse further checkouts"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            in_use = list(self._in_use.values())
+            self._in_use.clear()
+            self._cond.notify_all()
+        for entry in idle + in_use:
+            self._close(entry)
+
+    # --- Statistics ---
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Live pool statistics
+
+        Returns:
+            Sizes, current usage, waiters, lifetime counters and a
+            cumulative wait-time histogram (milliseconds)
+        """
+        with self._cond:
+            buckets = list(self._wait_buckets)
+            snapshot = {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size(),
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "opening": self._opening,
+                "waiters": self._waiters,
+                "max_waiters": self.max_waiters,
+                "timeout_seconds": self.timeout,
+            }
+
+        histogram: List[Tuple[str, int]] = []
+        cumulative = 0
+        for bound, count in zip(list(WAIT_BUCKETS_MS) + ["+Inf"], buckets):
+            cumulative += count
+            histogram.append((str(bound), cumulative))
+
+        snapshot.update({
+            "acquired": self.acquired,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "connections_opened": self.opened,
+            "connections_recycled": self.recycled,
+            "connections_discarded": self.discarded,
+            "failed_pings": self.failed_pings,
+            "wait_ms_avg": round(1000 * self._wait_total / self.acquired, 3) if self.acquired else 0.0,
+            "wait_ms_histogram": dict(histogram),
+        })
+        return snapshot
+
+
+def _optional_seconds(name: str, default: str) -> Optional[float]:
+    """Read a duration in seconds from the environment; 0 or less disables it (None)"""
+    value = float(os.getenv(name, default))
+    return value if value > 0 else None
+
+
+def pool_settings_from_env() -> Dict[str, Any]:
+    """
+    Read pool sizing from the environment
+
+    Environment:
+        DB_POOL_MIN_SIZE: Connections pre-warmed and kept open (default 2)
+        DB_POOL_MAX_SIZE: Maximum open connections (default 10)
+        DB_POOL_TIMEOUT: Seconds to wait for a free connection (default 30)
+        DB_POOL_MAX_WAITERS: Maximum queued requests, 0 for unbounded (default 100)
+        DB_POOL_MAX_LIFETIME: Seconds before a connection is recycled, 0 or
+            less to never recycle (default 1800)
+        DB_POOL_PING_INTERVAL: Idle seconds before a pre-ping, 0 or less to
+            never ping (default 30)
+
+    Returns:
+        Keyword arguments for ManagedConnectionPool; max_lifetime and
+        ping_interval are None when disabled
+    """
+    return {
+        "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+        "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+        "timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "max_waiters": int(os.getenv("DB_POOL_MAX_WAITERS", "100")),
+        "max_lifetime": _optional_seconds("DB_POOL_MAX_LIFETIME", "1800"),
+        "ping_interval": _optional_seconds("DB_POOL_PING_INTERVAL", "30"),
+    }
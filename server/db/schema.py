@@ -0,0 +1,319 @@
+"""Batched, cached schema introspection from pg_catalog"""
+from typing import Any, Callable, Dict, List, Optional
+import os
+import threading
+import time
+
+from psycopg2.extras import RealDictCursor
+
+
+# Internal tables (staging, rollups, ...) use this prefix and are hidden from the LLM
+INTERNAL_TABLE_PREFIX = "xdive_"
+
+# Every column of every base table in one round trip
+COLUMNS_QUERY = """
+    SELECT
+        c.relname AS table_name,
+        a.attname AS column_name,
+        format_type(a.atttypid, a.atttypmod) AS data_type,
+        NOT a.attnotnull AS nullable,
+        pg_get_expr(d.adbin, d.adrelid) AS column_default
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    LEFT JOIN pg_attrdef d ON d.adrelid = c.oid AND d.adnum = a.attnum
+    WHERE n.nspname = 'public'
+    AND c.relkind IN ('r', 'p')
+    ORDER BY c.relname, a.attnum
+"""
+
+# Primary keys, foreign keys and indexes of every base table in one round trip
+CONSTRAINTS_QUERY = """
+    SELECT
+        CASE con.contype WHEN 'p' THEN 'primary_key' ELSE 'foreign_key' END AS kind,
+        c.relname AS table_name,
+        con.conname AS name,
+        ARRAY(
+            SELECT a.attname::text
+            FROM unnest(con.conkey) WITH ORDINALITY AS k(attnum, ord)
+            JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+            ORDER BY k.ord
+        ) AS columns,
+        fc.relname::text AS referred_table,
+        ARRAY(
+            SELECT a.attname::text
+            FROM unnest(con.confkey) WITH ORDINALITY AS k(attnum, ord)
+            JOIN pg_attribute a ON a.attrelid = con.confrelid AND a.attnum = k.attnum
+            ORDER BY k.ord
+        ) AS referred_columns,
+        NULL::boolean AS is_unique
+    FROM pg_constraint con
+    JOIN pg_class c ON c.oid = con.conrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_class fc ON fc.oid = con.confrelid
+    WHERE n.nspname = 'public'
+    AND con.contype IN ('p', 'f')
+    UNION ALL
+    SELECT
+        'index' AS kind,
+        t.relname AS table_name,
+        i.relname AS name,
+        ARRAY(
+            SELECT a.attname::text
+            FROM unnest(ix.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+            JOIN pg_attribute a ON a.attrelid = ix.indrelid AND a.attnum = k.attnum
+            ORDER BY k.ord
+        ) AS columns,
+        NULL AS referred_table,
+        NULL AS referred_columns,
+        ix.indisunique AS is_unique
+    FROM pg_index ix
+    JOIN pg_class t ON t.oid = ix.indrelid
+    JOIN pg_class i ON i.oid = ix.indexrelid
+    JOIN pg_namespace n ON n.oid = t.relnamespace
+    WHERE n.nspname = 'public'
+    AND t.relkind IN ('r', 'p')
+"""
+
+# Cheap change detector: a hash over the catalog rows the snapshot is built from
+FINGERPRINT_QUERY = """
+    SELECT md5(coalesce(string_agg(entry, '|' ORDER BY entry), '')) AS fingerprint
+    FROM (
+        SELECT c.relname || '.' || a.attname || ':' || format_type(a.atttypid, a.atttypmod)
+               || ':' || a.attnotnull::text AS entry
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+        WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p')
+        UNION ALL
+        SELECT c.relname || '#' || con.conname || ':' || con.contype::text
+        FROM pg_constraint con
+        JOIN pg_class c ON c.oid = con.conrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public'
+        UNION ALL
+        SELECT t.relname || '@' || i.relname
+        FROM pg_index ix
+        JOIN pg_class t ON t.oid = ix.indrelid
+        JOIN pg_class i ON i.oid = ix.indexrelid
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        WHERE n.nspname = 'public'
+    ) entries
+"""
+
+
+def render_ddl(schema_info: Dict[str, Any], include_internal: bool = False) -> str:
+    """
+    Render a schema snapshot as compact CREATE TABLE statements
+
+    One statement per table, columns on a single line, e.g.
+    ``CREATE TABLE revenue (key text NOT NULL, emp_id text, ..., PRIMARY KEY (key));``
+
+    Args:
+        schema_info: Snapshot in the get_schema_metadata shape
+        include_internal: Also render INTERNAL_TABLE_PREFIX tables
+
+    Returns:
+        DDL string
+    """
+    statements = []
+    for table_name, table in schema_info["tables"].items():
+        if not include_internal and table_name.startswith(INTERNAL_TABLE_PREFIX):
+            continue
+
+        parts = [
+            f"{col['name']} {col['type']}" + ("" if col["nullable"] else " NOT NULL")
+            for col in table["columns"]
+        ]
+        if table["primary_keys"]:
+            parts.append(f"PRIMARY KEY ({', '.join(table['primary_keys'])})")
+        for fk in table["foreign_keys"]:
+            parts.append(
+                f"FOREIGN KEY ({', '.join(fk['constrained_columns'])}) "
+                f"REFERENCES {fk['referred_table']} ({', '.join(fk['referred_columns'])})"
+            )
+        statements.append(f"CREATE TABLE {table_name} ({', '.join(parts)});")
+
+    return "\n".join(statements)
+
+
+class SchemaCatalog:
+    """
+    Cached schema snapshot refreshed only when the catalog fingerprint changes
+
+    The fingerprint is re-checked at most every ``check_interval`` seconds,
+    so looking up the schema is O(1) for almost every request.
+    """
+
+    def __init__(self, database, check_interval: float = 60.0):
+        """
+        Args:
+            database: DatabaseConnection providing pooled connections
+            check_interval: Seconds between fingerprint checks
+        """
+        self.db = database
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._ddl: Optional[str] = None
+        self._fingerprint: Optional[str] = None
+        self._checked_at = 0.0
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self.loads = 0
+        self.checks = 0
+
+    def on_change(self, callback: Callable[[Dict[str, Any]], None]) -> None:
+        """
+        Register a callback invoked with the new snapshot after a schema change
+
+        Not called for the initial load.
+        """
+        self._listeners.append(callback)
+
+    def _load(self, cur) -> Dict[str, Any]:
+        """Build the snapshot with the two batched catalog queries"""
+        schema_info: Dict[str, Any] = {"tables": {}}
+
+        cur.execute(COLUMNS_QUERY)
+        for col in cur.fetchall():
+            table = schema_info["tables"].setdefault(col["table_name"], {
+                "columns": [],
+                "primary_keys": [],
+                "foreign_keys": [],
+                "indexes": [],
+            })
+            table["columns"].append({
+                "name": col["column_name"],
+                "type": col["data_type"],
+                "nullable": col["nullable"],
+                "default": str(col["column_default"]) if col["column_default"] else ""
+            })
+
+        cur.execute(CONSTRAINTS_QUERY)
+        for row in cur.fetchall():
+            table = schema_info["tables"].get(row["table_name"])
+            if table is None:
+                continue
+            if row["kind"] == "primary_key":
+                table["primary_keys"] = list(row["columns"])
+            elif row["kind"] == "foreign_key":
+                table["foreign_keys"].append({
+                    "name": row["name"],
+                    "constrained_columns": list(row["columns"]),
+                    "referred_table": row["referred_table"],
+                    "referred_columns": list(row["referred_columns"])
+                })
+            else:
+                table["indexes"].append({
+                    "name": row["name"],
+                    "columns": list(row["columns"]),
+                    "unique": bool(row["is_unique"])
+                })
+
+        return schema_info
+
+    def _refresh(self, force: bool = False) -> None:
+        """Re-check the fingerprint and reload the snapshot if it changed"""
+        with self.db.get_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(FINGERPRINT_QUERY)
+                fingerprint = cur.fetchone()["fingerprint"]
+                self.checks += 1
+
+                changed = fingerprint != self._fingerprint
+                if changed or force or self._snapshot is None:
+                    snapshot = self._load(cur)
+                    self.loads += 1
+                else:
+                    snapshot = None
+            conn.rollback()
+
+        self._checked_at = time.time()
+        if snapshot is None:
+            return
+
+        had_snapshot = self._snapshot is not None
+        self._snapshot = snapshot
+        self._ddl = render_ddl(snapshot)
+        self._fingerprint = fingerprint
+
+        if had_snapshot and changed:
+            for callback in self._listeners:
+                try:
+                    callback(snapshot)
+                except Exception as e:
+                    print(f"WARNING: schema change listener failed: {e}")
+
+    def _ensure_fresh(self) -> None:
+        if self._snapshot is not None and time.time() - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            if self._snapshot is None or time.time() - self._checked_at >= self.check_interval:
+                self._refresh()
+
+    def get_snapshot(self) -> Dict[str, Any]:
+        """
+        Get the cached schema snapshot, refreshing it if the catalog changed
+
+        Returns:
+            Dictionary containing tables, columns, keys and indexes
+        """
+        self._ensure_fresh()
+        return self._snapshot
+
+    def get_ddl(self) -> str:
+        """
+        Get the compact DDL rendering of the cached snapshot
+
+        Returns:
+            DDL string for every public, non-internal table
+        """
+        self._ensure_fresh()
+        return self._ddl
+
+    def peek_ddl(self) -> Optional[str]:
+        """
+        Get the cached DDL without touching the database
+
+        Returns:
+            DDL string, or None if the snapshot is missing or due for a check
+        """
+        if self._ddl is not None and time.time() - self._checked_at < self.check_interval:
+            return self._ddl
+        return None
+
+    def peek_snapshot(self) -> Optional[Dict[str, Any]]:
+        """
+        Get the cached snapshot without touching the database
+
+        Returns:
+            Snapshot, or None if it is missing or due for a check
+        """
+        if self._snapshot is not None and time.time() - self._checked_at < self.check_interval:
+            return self._snapshot
+        return None
+
+    def invalidate(self) -> None:
+        """Force a fingerprint check on the next lookup"""
+        self._checked_at = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot state and refresh counters"""
+        return {
+            "fingerprint": self._fingerprint,
+            "tables": len(self._snapshot["tables"]) if self._snapshot else 0,
+            "checked_at": self._checked_at or None,
+            "check_interval": self.check_interval,
+            "fingerprint_checks": self.checks,
+            "snapshot_loads": self.loads,
+        }
+
+
+def _build_catalog() -> SchemaCatalog:
+    from db.connection import db
+    return SchemaCatalog(db, check_interval=float(os.getenv("SCHEMA_CHECK_INTERVAL_SECONDS", "60")))
+
+
+# Global schema catalog instance
+schema_catalog = _build_catalog()
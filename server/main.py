@@ -1,28 +1,34 @@
 """FastAPI application entry point"""
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
 from api.routes import router
 from db.connection import db
+from services import warmup
+from services.metrics import ServerTimingMiddleware
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
-    Simplified Lifespan: Only handles Database Connection
+    Lifespan: database pools before serving, then a background warm-up of the lazily built services
+
+    Liveness (/health) answers as soon as the server is up; readiness
+    (/health/ready) once the warm-up has finished (see services/warmup.py).
     """
     # Startup
-    try:
-        db.initialize()
-        print("Database connection initialized successfully")
-        print("Gemini SQL Service ready (Stateless)")
-    except Exception as e:
-        print(f"CRITICAL: Database initialization failed: {e}")
+    await warmup.open_database()
+    warm_up = asyncio.create_task(warmup.warm_up())
     
     yield
     
     # Shutdown
+    warm_up.cancel()
+    with suppress(asyncio.CancelledError):
+        await warm_up
+    await db.close_async()
     db.close()
     print("Database connections closed")
 
@@ -40,8 +46,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the browser client read per-stage timings
+    expose_headers=["Server-Timing"],
 )
 
+# Per-stage timings: Server-Timing header and /metrics histograms
+app.add_middleware(ServerTimingMiddleware)
+
 app.include_router(router)
 
 if __name__ == "__main__":
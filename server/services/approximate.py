@@ -0,0 +1,289 @@
+"""
+Approximate answers from a row sample of revenue, and row budgets
+
+Exploratory questions ("which skills bring the most revenue") rarely need
+exact totals. ``SampledReplica`` keeps a BERNOULLI row sample of revenue
+in the columnar engine and answers the same aggregate subset as the
+replica from it: SUM and COUNT are scaled by population / sample size,
+and each estimate gets a normal-approximation confidence interval
+(finite-population corrected). AVG is a ratio estimate with its own
+interval; MIN and MAX are reported as seen in the sample, without bounds.
+
+``apply_row_budget`` caps raw-row queries (no top-level aggregate) at a row budget
+so generated ``SELECT *`` cannot return the whole table.
+"""
+from typing import Any, Dict, Optional, Tuple
+import os
+import re
+import time
+
+import numpy as np
+from psycopg2 import sql
+
+from services.columnar import ColumnarReplica, SOURCE_TABLE, _Snapshot
+from services.sql_validator import SQLValidator
+
+
+# Two-sided normal quantiles for the supported confidence levels
+_Z_SCORES = {0.8: 1.2816, 0.9: 1.6449, 0.95: 1.9600, 0.98: 2.3263, 0.99: 2.5758}
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+# Applied to the top level only (parenthesized text blanked): GROUP BY, or an
+# aggregate call that is not a window function (no OVER after it)
+_AGGREGATE_RE = re.compile(
+    r"\bGROUP\s+BY\b"
+    r"|\b(?:COUNT|SUM|AVG|MIN|MAX|STRING_AGG|ARRAY_AGG)\s*\(\s*\)(?!\s*(?:FILTER\s*\(\s*\)\s*)?OVER\b)",
+    re.IGNORECASE,
+)
+_LIMIT_RE = re.compile(r"\bLIMIT\s+(\d+)(?:\s+OFFSET\s+\d+)?\s*;?\s*$", re.IGNORECASE)
+
+
+def _top_level(query: str) -> str:
+    """Query with everything inside parentheses blanked (the parentheses are kept)"""
+    depth = 0
+    chars = []
+    for char in query:
+        if char == ")":
+            depth = max(depth - 1, 0)
+        chars.append(char if depth == 0 or char in "()" else " ")
+        if char == "(":
+            depth += 1
+    return "".join(chars)
+
+
+def apply_row_budget(query: str, budget: Optional[int]) -> Tuple[str, Optional[int]]:
+    """
+    Cap a raw-row query at ``budget`` rows
+
+    Queries that aggregate or GROUP BY at the top level (not in a
+    subquery, not as a window function) and queries with a LIMIT within
+    the budget are left alone. Others are wrapped so at most ``budget + 1`` rows come back;
+    the extra row tells the caller the result was truncated.
+
+    Args:
+        query: Validated SELECT query
+        budget: Maximum rows to return (None or 0: no budget)
+
+    Returns:
+        Tuple of (query to execute, budget applied or None)
+    """
+    if not budget:
+        return query, None
+    normalized = _STRING_RE.sub("''", SQLValidator._normalize_query(query))
+    if _AGGREGATE_RE.search(_top_level(normalized)):
+        return query, None
+    limit = _LIMIT_RE.search(normalized)
+    if limit is not None and int(limit.group(1)) <= budget:
+        return query, None
+    body = query.strip().rstrip(";")
+    # The newline keeps a trailing -- comment from swallowing the parenthesis
+    return f"SELECT * FROM ({body}\n) AS xdive_row_budget LIMIT {budget + 1}", budget
+
+
+class SampledReplica(ColumnarReplica):
+    """
+    Columnar replica over a BERNOULLI sample of revenue
+
+    Loaded on first use (the first approximate query runs exactly), then
+    refreshed like the replica: after ingestion and in the background once
+    older than ``refresh_seconds``. Tables no larger than ``sample_rows``
+    are held in full, so their "estimates" are exact.
+    """
+
+    def __init__(self, database, sample_rows: int = 100_000, confidence: float = 0.95,
+                 refresh_seconds: float = 900.0):
+        """
+        Args:
+            database: DatabaseConnection providing pooled connections
+            sample_rows: Target sample size
+            confidence: Confidence level of the reported bounds (0.8 - 0.99)
+            refresh_seconds: Age after which a background resample starts
+        """
+        if confidence not in _Z_SCORES:
+            raise ValueError(f"confidence must be one of {sorted(_Z_SCORES)}")
+        # A Bernoulli sample overshoots its target a little; never reject it for size
+        super().__init__(database, max_rows=sample_rows * 2 + 1000, refresh_seconds=refresh_seconds)
+        self.sample_rows = sample_rows
+        self.confidence = confidence
+        self.z = _Z_SCORES[confidence]
+
+    def _source(self, conn):
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("SELECT count(*) FROM {}").format(sql.Identifier(SOURCE_TABLE)))
+            population = cur.fetchone()[0]
+        if population <= self.sample_rows:
+            return sql.Identifier(SOURCE_TABLE), population
+        percent = 100.0 * self.sample_rows / population
+        return sql.SQL("{} TABLESAMPLE BERNOULLI ({})").format(
+            sql.Identifier(SOURCE_TABLE), sql.Literal(percent)
+        ), population
+
+    def _current(self) -> Optional[_Snapshot]:
+        if self._snapshot is None:
+            # Sample lazily: callers fall back to exact execution meanwhile
+            self._reload_in_background()
+        return super()._current()
+
+    def _item_columns(self, snapshot, plan, group_ids, group_count, codes_per_group, selection):
+        """Select items with SUM/COUNT scaled to the population, plus (low, high) per aggregate"""
+        columns = super()._item_columns(snapshot, plan, group_ids, group_count, codes_per_group, selection)
+        n, population = snapshot.row_count, snapshot.population
+        scale = population / n if n else 0.0
+        # Finite population correction: no uncertainty when the whole table is held
+        fpc = max(0.0, 1.0 - n / population) if population else 0.0
+
+        bounds = []
+        for index, item in enumerate(plan.items):
+            if item.kind != "aggregate":
+                continue
+            sample = columns[index]
+            if item.function in ("MIN", "MAX"):
+                bounds += [[None] * group_count, [None] * group_count]
+                continue
+
+            if item.function == "COUNT":
+                counts = np.array(sample, dtype=np.float64)
+                share = counts / n if n else counts
+                half = population * self.z * np.sqrt(fpc * share * (1 - share) / max(n - 1, 1))
+                estimates = np.rint(counts * scale)
+                columns[index] = [int(value) for value in estimates.tolist()]
+            else:
+                squares, present = self._moments(snapshot.columns[item.column], group_ids, group_count, selection)
+                if item.function == "SUM":
+                    sums = np.array([0.0 if value is None else float(value) for value in sample])
+                    variance = np.maximum(squares - sums * sums / n, 0.0) / max(n - 1, 1)
+                    half = population * self.z * np.sqrt(fpc * variance / n)
+                    estimates = sums * scale
+                    columns[index] = [None if value is None else estimate
+                                      for value, estimate in zip(sample, estimates.tolist())]
+                else:
+                    # AVG is a ratio estimate (group sum / group count): no scaling
+                    estimates = np.array([0.0 if value is None else value for value in sample])
+                    residual = np.maximum(squares - estimates * estimates * present, 0.0)
+                    with np.errstate(divide="ignore", invalid="ignore"):
+                        half = self.z * np.sqrt(fpc * residual / max(n - 1, 1) / n) / (present / n)
+
+            low = [None if value is None else float(e - h)
+                   for value, e, h in zip(columns[index], estimates.tolist(), half.tolist())]
+            high = [None if value is None else float(e + h)
+                    for value, e, h in zip(columns[index], estimates.tolist(), half.tolist())]
+            bounds += [low, high]
+        return columns + bounds
+
+    @staticmethod
+    def _moments(column, group_ids: np.ndarray, group_count: int, selection: Optional[np.ndarray]):
+        """Per-group sum of squares and count of the selected non-null values"""
+        values = column.values if selection is None else column.values[selection]
+        present = column.not_null() if selection is None else column.not_null()[selection]
+        values = np.where(present, values.astype(np.float64), 0.0)
+        squares = np.bincount(group_ids, weights=values * values, minlength=group_count)
+        counts = np.bincount(group_ids, weights=present.astype(np.float64), minlength=group_count)
+        return squares, counts
+
+    def execute(self, query: str, parameters: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Estimate an aggregate query over revenue from the sample
+
+        Args:
+            query: Validated SELECT query
+            parameters: Query parameters (parameterized queries are not handled)
+
+        Returns:
+            Result in the SQLEngine success shape plus "bounds" (per row,
+            aggregate column -> [low, high]) and "approximate" (sample
+            size, population, confidence, worst relative error and the
+            query to run for an exact answer), or None to run exactly
+        """
+        snapshot = self._current()
+        if snapshot is None or parameters:
+            return None
+
+        start_time = time.time()
+        plan = self._plan(snapshot, query)
+        if plan is None:
+            return None
+
+        rows = self._run(snapshot, plan)
+        columns = [item.name for item in plan.items]
+        estimated = [index for index, item in enumerate(plan.items) if item.kind == "aggregate"]
+        width = len(plan.items)
+
+        data, bounds, worst = [], [], 0.0
+        for row in rows:
+            data.append(dict(zip(columns, row[:width])))
+            row_bounds = {}
+            for position, index in enumerate(estimated):
+                low, high = row[width + 2 * position], row[width + 2 * position + 1]
+                if low is None:
+                    continue
+                row_bounds[columns[index]] = [low, high]
+                value = row[index]
+                if value:
+                    worst = max(worst, (high - low) / 2 / abs(value))
+            bounds.append(row_bounds)
+
+        self.answered += 1
+        return {
+            "success": True,
+            "data": data,
+            "columns": columns,
+            "column_types": [item.logical_type for item in plan.items],
+            "row_count": len(data),
+            "execution_time_ms": (time.time() - start_time) * 1000,
+            "cached": False,
+            "bounds": bounds,
+            "approximate": self._summary(snapshot, query, worst),
+            "error": None,
+        }
+
+    def _summary(self, snapshot: _Snapshot, query: str, worst: float) -> Dict[str, Any]:
+        return {
+            "sample_rows": snapshot.row_count,
+            "population": snapshot.population,
+            "confidence": self.confidence,
+            "max_relative_error": round(worst, 6),
+            "exact": snapshot.row_count >= snapshot.population,
+            # Run this with approximate mode off for the exact answer
+            "exact_query": query,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Replica statistics plus the sample size and population"""
+        stats = super().stats()
+        snapshot = self._snapshot
+        stats.update({
+            "sample_rows_target": self.sample_rows,
+            "population": snapshot.population if snapshot else None,
+            "sample_fraction": round(snapshot.row_count / snapshot.population, 6) if snapshot and snapshot.population else None,
+            "confidence": self.confidence,
+        })
+        return stats
+
+
+def build_sampled_replica() -> Optional[SampledReplica]:
+    """
+    Build the approximate-answer sample from environment configuration
+
+    Environment:
+        APPROX_ENABLED: "false" disables approximate mode
+        APPROX_SAMPLE_ROWS: Target sample size (default 100000)
+        APPROX_CONFIDENCE: Confidence level of the bounds (default 0.95)
+        APPROX_REFRESH_SECONDS: Background resample age (default 900, 0 disables)
+
+    Returns:
+        Configured sample (loaded on first use), or None when disabled
+    """
+    if os.getenv("APPROX_ENABLED", "true").lower() == "false":
+        return None
+
+    from db.connection import db
+    return SampledReplica(
+        db,
+        sample_rows=int(os.getenv("APPROX_SAMPLE_ROWS", "100000")),
+        confidence=float(os.getenv("APPROX_CONFIDENCE", "0.95")),
+        refresh_seconds=float(os.getenv("APPROX_REFRESH_SECONDS", "900")),
+    )
+
+
+# Global approximate-answer sample (None when disabled)
+sampled_replica = build_sampled_replica()
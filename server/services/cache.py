@@ -0,0 +1,132 @@
+"""In-process LRU cache with TTL expiry, byte-size accounting and hit/miss statistics"""
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+import threading
+import time
+
+
+class LRUCache:
+    """Thread-safe LRU cache with per-entry TTL, optional byte budget and hit/miss counters"""
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl_seconds: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        sizeof: Optional[Callable[[Any], int]] = None
+    ):
+        """
+        Args:
+            max_entries: Maximum number of entries before LRU eviction
+            ttl_seconds: Entry lifetime in seconds (None disables expiry)
+            max_bytes: Total size budget in bytes (None disables byte accounting)
+            sizeof: Function estimating the size of a value in bytes
+                (required when max_bytes is set)
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.rejected = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _expired(self, stored_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - stored_at > self.ttl_seconds
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Look up a key, refreshing its LRU position
+
+        Returns:
+            Cached value, or None on a miss or an expired entry
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, stored_at, size = entry
+            if self._expired(stored_at, now):
+                del self._entries[key]
+                self.current_bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> bool:
+        """
+        Store a value, evicting the least recently used entries if full
+
+        Returns:
+            False if the value alone exceeds the byte budget and was not stored
+        """
+        size = self.sizeof(value) if self.max_bytes is not None and self.sizeof else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            self.rejected += 1
+            return False
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous[2]
+
+            self._entries[key] = (value, time.time(), size)
+            self.current_bytes += size
+
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self.current_bytes > self.max_bytes
+            ):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+        return True
+
+    def delete(self, key: Hashable) -> None:
+        """Remove a key if present"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.current_bytes -= entry[2]
+
+    def clear(self) -> None:
+        """Remove every entry (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics
+
+        Returns:
+            Dictionary with size, limits, hit/miss/eviction counters and hit rate
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "rejected_oversize": self.rejected,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,1040 @@
+"""
+In-process columnar replica of the revenue table
+
+The table is held as NumPy arrays: integer and float columns as typed
+arrays with a NULL mask, text/date/boolean columns dictionary-encoded
+(int32 codes into a sorted dictionary, -1 for NULL). A small vectorized
+engine answers simple aggregate queries (filter, group by, SUM / COUNT /
+AVG / MIN / MAX, order by, limit) from memory; anything else returns None
+so the caller falls back to PostgreSQL.
+
+The replica is loaded at startup, after each ingestion into revenue and
+in the background when it is older than REPLICA_REFRESH_SECONDS.
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from datetime import date, datetime
+import operator
+import os
+import re
+import threading
+import time
+
+import numpy as np
+from psycopg2 import sql
+
+from services.cache import LRUCache
+from services.sql_validator import SQLValidator
+
+
+SOURCE_TABLE = "revenue"
+
+# Integer sums above this lose precision in a float64 bincount
+_EXACT_FLOAT_LIMIT = 2 ** 53
+
+# Group-key spaces up to this size are counted with bincount; larger ones use np.unique
+_DENSE_GROUP_LIMIT = 1_000_000
+
+INTEGER_TYPES = {"smallint", "integer", "bigint"}
+FLOAT_TYPES = {"real", "double precision"}
+DICTIONARY_TYPES = {"text", "date", "boolean", "timestamp without time zone"}
+
+# Logical type names as reported by result_formats.pg_type_name
+_LOGICAL_TYPES = {
+    "smallint": "integer", "integer": "integer", "bigint": "integer",
+    "real": "float", "double precision": "float",
+    "text": "text", "date": "date", "boolean": "boolean",
+    "timestamp without time zone": "timestamp",
+}
+
+AGGREGATES = {"SUM", "COUNT", "AVG", "MIN", "MAX"}
+
+_COMPARISONS = {
+    "=": np.equal, "<>": np.not_equal, "!=": np.not_equal,
+    "<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal,
+}
+
+_SCALAR_COMPARISONS = {
+    "=": operator.eq, "<>": operator.ne, "!=": operator.ne,
+    "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+}
+
+_TOKEN_RE = re.compile(
+    r"""
+      (?P<string>'(?:[^']|'')*')
+    | (?P<unsupported>[EeBbXxUu]&?'|"|\$)
+    | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    | (?P<word>[A-Za-z_][A-Za-z0-9_]*)
+    | (?P<space>\s+)
+    | (?P<op>::|<>|!=|<=|>=|.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+
+def _base_type(pg_type: str) -> str:
+    """Strip length modifiers: character varying(50) -> text, numeric(12,2) -> numeric"""
+    name = pg_type.split("(")[0].strip()
+    if name in ("character varying", "character", "varchar", "char", "name"):
+        return "text"
+    return name
+
+
+class _Unsupported(Exception):
+    """The query is outside the in-memory subset; PostgreSQL answers it"""
+
+
+class _Column:
+    """One column: typed values (or dictionary codes) and an optional NULL mask"""
+    __slots__ = ("name", "pg_type", "values", "valid", "dictionary")
+
+    def __init__(self, name: str, pg_type: str, values: np.ndarray,
+                 valid: Optional[np.ndarray] = None, dictionary: Optional[List[Any]] = None):
+        self.name = name
+        self.pg_type = pg_type
+        self.values = values
+        self.valid = valid
+        self.dictionary = dictionary
+
+    @property
+    def encoded(self) -> bool:
+        return self.dictionary is not None
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + (self.valid.nbytes if self.valid is not None else 0)
+
+    def not_null(self) -> np.ndarray:
+        if self.encoded:
+            return self.values >= 0
+        return self.valid if self.valid is not None else np.ones(len(self.values), dtype=bool)
+
+    def value(self, code: int) -> Any:
+        """Python value of a dictionary code"""
+        return self.dictionary[code] if code >= 0 else None
+
+
+class _ColumnBuilder:
+    """Accumulates one column batch by batch as NumPy arrays (no per-row Python objects kept)"""
+
+    def __init__(self, name: str, pg_type: str):
+        self.name = name
+        self.pg_type = pg_type
+        self.parts: List[np.ndarray] = []
+        self.valid: List[np.ndarray] = []
+        # Dictionary values in first-seen order; codes are remapped to sorted order in finish()
+        self.codes: Optional[Dict[Any, int]] = {} if pg_type in DICTIONARY_TYPES else None
+
+    def extend(self, raw: Sequence[Any]) -> None:
+        if self.codes is not None:
+            codes = self.codes
+            for value in raw:
+                if value is not None and value not in codes:
+                    codes[value] = len(codes)
+            self.parts.append(np.fromiter((-1 if value is None else codes[value] for value in raw),
+                                          dtype=np.int32, count=len(raw)))
+            return
+        dtype = np.int64 if self.pg_type in INTEGER_TYPES else np.float64
+        self.valid.append(np.fromiter((value is not None for value in raw), dtype=bool, count=len(raw)))
+        self.parts.append(np.fromiter((0 if value is None else value for value in raw), dtype=dtype, count=len(raw)))
+
+    def finish(self) -> _Column:
+        if self.codes is not None:
+            dictionary = sorted(self.codes)
+            values = np.concatenate(self.parts) if self.parts else np.zeros(0, dtype=np.int32)
+            if dictionary:
+                # First-seen code -> sorted code, with a trailing slot keeping NULL (-1) at -1
+                remap = np.empty(len(dictionary) + 1, dtype=np.int32)
+                remap[[self.codes[value] for value in dictionary]] = np.arange(len(dictionary), dtype=np.int32)
+                remap[-1] = -1
+                values = remap[values]
+            return _Column(self.name, self.pg_type, values, dictionary=dictionary)
+
+        dtype = np.int64 if self.pg_type in INTEGER_TYPES else np.float64
+        values = np.concatenate(self.parts) if self.parts else np.zeros(0, dtype=dtype)
+        valid = np.concatenate(self.valid) if self.valid else np.ones(0, dtype=bool)
+        return _Column(self.name, self.pg_type, values, valid=None if valid.all() else valid)
+
+
+class _Snapshot:
+    """Immutable set of columns loaded in one read of the source table"""
+
+    def __init__(self, columns: Dict[str, _Column], row_count: int, c_collation: bool, load_seconds: float,
+                 population: Optional[int] = None):
+        self.columns = columns
+        self.row_count = row_count
+        # Rows in the source table (more than row_count when the snapshot is a sample)
+        self.population = row_count if population is None else population
+        self.c_collation = c_collation
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.nbytes = sum(column.nbytes for column in columns.values())
+        # Programmatic aggregate results; valid for the lifetime of the snapshot
+        self.memo: Dict[Any, List[Tuple[Any, Any, int]]] = {}
+
+    def column(self, name: str) -> _Column:
+        column = self.columns.get(name)
+        if column is None:
+            raise _Unsupported(f"column {name} is not in the replica")
+        return column
+
+
+class _Item:
+    """One select-list entry"""
+    __slots__ = ("kind", "name", "column", "function", "value", "logical_type")
+
+    def __init__(self, kind: str, name: str, column: Optional[str] = None,
+                 function: Optional[str] = None, value: Any = None, logical_type: str = "unknown"):
+        self.kind = kind          # "group", "text", "literal" or "aggregate"
+        self.name = name
+        self.column = column
+        self.function = function
+        self.value = value
+        self.logical_type = logical_type
+
+
+class _Plan:
+    """A parsed query compiled against one snapshot"""
+    __slots__ = ("items", "group_by", "filters", "order", "limit", "offset")
+
+    def __init__(self):
+        self.items: List[_Item] = []
+        self.group_by: List[str] = []
+        # (column, ("lookup", table over dictionary codes)) or (column, (operator, operand))
+        self.filters: List[Tuple[str, Any]] = []
+        self.order: List[Tuple[int, bool]] = []
+        self.limit: Optional[int] = None
+        self.offset = 0
+
+
+class _Parser:
+    """Recursive-descent parser for the aggregate subset of SELECT"""
+
+    def __init__(self, text: str, snapshot: _Snapshot):
+        self.snapshot = snapshot
+        self.tokens: List[Tuple[str, str]] = []
+        for match in _TOKEN_RE.finditer(text):
+            kind = match.lastgroup
+            if kind == "unsupported":
+                raise _Unsupported("quoted identifier or special literal")
+            if kind != "space":
+                self.tokens.append((kind, match.group()))
+        self.pos = 0
+        self.qualifiers = {SOURCE_TABLE}
+
+    # --- token helpers ---
+
+    def peek(self, offset: int = 0) -> Tuple[str, str]:
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else ("end", "")
+
+    def peek_word(self, offset: int = 0) -> str:
+        kind, text = self.peek(offset)
+        return text.upper() if kind == "word" else ""
+
+    def take(self) -> Tuple[str, str]:
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def accept(self, text: str) -> bool:
+        kind, token = self.peek()
+        if (kind == "word" and token.upper() == text) or (kind == "op" and token == text):
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, text: str) -> None:
+        if not self.accept(text):
+            raise _Unsupported(f"expected {text}")
+
+    def identifier(self) -> str:
+        kind, text = self.take()
+        if kind != "word":
+            raise _Unsupported("expected identifier")
+        return text.lower()
+
+    def column_ref(self) -> str:
+        name = self.identifier()
+        if self.peek()[1] == "." and name in self.qualifiers:
+            self.take()
+            name = self.identifier()
+        self.snapshot.column(name)
+        return name
+
+    # --- grammar ---
+
+    def parse(self) -> _Plan:
+        plan = _Plan()
+        self.expect("SELECT")
+        start = self.pos
+        depth = 0
+        # Skip to FROM first: select items may reference the table alias
+        while self.peek()[0] != "end" and not (depth == 0 and self.peek_word() == "FROM"):
+            text = self.take()[1]
+            depth += text == "("
+            depth -= text == ")"
+        items_end = self.pos
+        self.expect("FROM")
+        if self.peek_word() == "PUBLIC" and self.peek(1)[1] == ".":
+            self.pos += 2
+        if self.identifier() != SOURCE_TABLE:
+            raise _Unsupported("not the replicated table")
+        self.accept("AS")
+        if self.peek()[0] == "word" and self.peek_word() not in ("WHERE", "GROUP", "ORDER", "LIMIT", "OFFSET"):
+            self.qualifiers.add(self.identifier())
+        end = self.pos
+
+        self.pos = start
+        plan.items.append(self.item())
+        while self.accept(","):
+            plan.items.append(self.item())
+        if self.pos != items_end:
+            # e.g. SUM(x) OVER (): OVER parsed as an alias, "()" left over
+            raise _Unsupported("unexpected tokens in the select list")
+        self.pos = end
+
+        if self.accept("WHERE"):
+            self.conjunction(plan)
+        if self.accept("GROUP"):
+            self.expect("BY")
+            plan.group_by.append(self.group_key(plan))
+            while self.accept(","):
+                plan.group_by.append(self.group_key(plan))
+        if self.accept("ORDER"):
+            self.expect("BY")
+            plan.order.append(self.order_key(plan))
+            while self.accept(","):
+                plan.order.append(self.order_key(plan))
+        if self.accept("LIMIT"):
+            plan.limit = self.integer()
+        if self.accept("OFFSET"):
+            plan.offset = self.integer()
+        self.accept(";")
+        if self.peek()[0] != "end":
+            raise _Unsupported("unexpected trailing tokens")
+
+        if not any(item.kind == "aggregate" for item in plan.items) and not plan.group_by:
+            raise _Unsupported("not an aggregate query")
+        for item in plan.items:
+            if item.column is not None and item.kind in ("group", "text") and item.column not in plan.group_by:
+                raise _Unsupported(f"column {item.column} must appear in GROUP BY")
+        return plan
+
+    def integer(self) -> int:
+        kind, text = self.take()
+        if kind != "number" or not text.isdigit():
+            raise _Unsupported("expected integer")
+        return int(text)
+
+    def item(self) -> _Item:
+        kind, text = self.peek()
+        word = self.peek_word()
+        if word in AGGREGATES and self.peek(1)[1] == "(":
+            item = self.aggregate()
+        elif kind == "string":
+            self.take()
+            item = _Item("literal", "?column?", value=text[1:-1].replace("''", "'"), logical_type="text")
+        elif kind == "word":
+            column = self.column_ref()
+            logical = _LOGICAL_TYPES.get(self.snapshot.column(column).pg_type, "unknown")
+            item = _Item("group", column, column=column, logical_type=logical)
+            if self.accept("::"):
+                if self.identifier() != "text" or not self.snapshot.column(column).encoded:
+                    raise _Unsupported("unsupported cast")
+                item.kind = "text"
+                item.logical_type = "text"
+        else:
+            raise _Unsupported("unsupported select item")
+
+        if self.accept("AS") or (self.peek()[0] == "word" and self.peek_word() != "FROM"):
+            item.name = self.identifier()
+        return item
+
+    def aggregate(self) -> _Item:
+        function = self.take()[1].upper()
+        self.expect("(")
+        if self.accept("*"):
+            if function != "COUNT":
+                raise _Unsupported("* outside COUNT")
+            column = None
+        else:
+            column = self.column_ref()
+        self.expect(")")
+
+        logical = "integer"
+        if column is not None and function != "COUNT":
+            col = self.snapshot.column(column)
+            logical = _LOGICAL_TYPES.get(col.pg_type, "unknown")
+            if function in ("SUM", "AVG"):
+                if col.encoded:
+                    raise _Unsupported(f"{function} over a non-numeric column")
+                logical = "numeric" if col.pg_type == "bigint" or (function == "AVG" and col.pg_type in INTEGER_TYPES) else logical
+            elif col.encoded and col.pg_type == "text" and not self.snapshot.c_collation:
+                raise _Unsupported("text MIN/MAX depends on the database collation")
+        return _Item("aggregate", function.lower(), column=column, function=function, logical_type=logical)
+
+    def group_key(self, plan: _Plan) -> str:
+        if self.peek()[0] == "number":
+            position = self.integer()
+            if not 1 <= position <= len(plan.items) or plan.items[position - 1].column is None \
+                    or plan.items[position - 1].kind == "aggregate":
+                raise _Unsupported("GROUP BY position must name a column")
+            name = plan.items[position - 1].column
+        else:
+            name = self.column_ref()
+        if not self.snapshot.column(name).encoded:
+            raise _Unsupported("GROUP BY on a numeric column")
+        return name
+
+    def order_key(self, plan: _Plan) -> Tuple[int, bool]:
+        kind, text = self.peek()
+        index = None
+        if kind == "number":
+            index = self.integer() - 1
+        elif self.peek_word() in AGGREGATES and self.peek(1)[1] == "(":
+            wanted = self.aggregate()
+            for i, item in enumerate(plan.items):
+                if item.kind == "aggregate" and (item.function, item.column) == (wanted.function, wanted.column):
+                    index = i
+                    break
+        elif kind == "word":
+            name = self.identifier()
+            if self.peek()[1] == "." and name in self.qualifiers:
+                self.take()
+                name = self.identifier()
+            names = [item.name for item in plan.items]
+            if name in names:
+                index = names.index(name)
+            else:
+                index = next((i for i, item in enumerate(plan.items)
+                              if item.kind == "group" and item.column == name), None)
+        if index is None or not 0 <= index < len(plan.items):
+            raise _Unsupported("ORDER BY must reference a select item")
+
+        descending = False
+        if self.accept("DESC"):
+            descending = True
+        else:
+            self.accept("ASC")
+        if self.peek_word() == "NULLS":
+            raise _Unsupported("explicit NULLS ordering")
+
+        item = plan.items[index]
+        if item.logical_type == "text" and item.kind != "literal" and not self.snapshot.c_collation \
+                and not (item.kind == "text" and self.snapshot.column(item.column).pg_type == "date"):
+            raise _Unsupported("text ordering depends on the database collation")
+        return index, descending
+
+    # --- WHERE ---
+
+    def conjunction(self, plan: _Plan) -> None:
+        self.predicate(plan)
+        while self.accept("AND"):
+            self.predicate(plan)
+        if self.peek_word() == "OR":
+            raise _Unsupported("OR")
+
+    def predicate(self, plan: _Plan) -> None:
+        start = len(plan.filters)
+        self._predicate(plan)
+        for i in range(start, len(plan.filters)):
+            name, test = plan.filters[i]
+            column = self.snapshot.column(name)
+            if column.encoded and test[0] not in ("null", "not_null", "lookup"):
+                # Evaluate once per dictionary entry; execution gathers by code
+                plan.filters[i] = (name, ("lookup", _lookup_table(column, test)))
+
+    def _predicate(self, plan: _Plan) -> None:
+        if self.accept("("):
+            self.conjunction(plan)
+            self.expect(")")
+            return
+
+        name = self.column_ref()
+        column = self.snapshot.column(name)
+
+        if self.accept("IS"):
+            negate = self.accept("NOT")
+            self.expect("NULL")
+            plan.filters.append((name, ("not_null" if negate else "null", None)))
+            return
+
+        negate = self.accept("NOT")
+        word = self.peek_word()
+        if word == "IN":
+            self.take()
+            self.expect("(")
+            values = [self.literal(column)]
+            while self.accept(","):
+                values.append(self.literal(column))
+            self.expect(")")
+            plan.filters.append((name, ("not_in" if negate else "in", values)))
+        elif word == "BETWEEN":
+            self.take()
+            if column.pg_type == "text" and not self.snapshot.c_collation:
+                raise _Unsupported("text range comparison depends on the database collation")
+            low = self.literal(column)
+            self.expect("AND")
+            high = self.literal(column)
+            plan.filters.append((name, ("not_between" if negate else "between", (low, high))))
+        elif word in ("LIKE", "ILIKE"):
+            self.take()
+            if column.pg_type != "text":
+                raise _Unsupported("LIKE on a non-text column")
+            pattern = self.literal(column)
+            plan.filters.append((name, ("not_like" if negate else "like", _like_regex(pattern, word == "ILIKE"))))
+        else:
+            comparison = self.take()[1]
+            if negate or comparison not in _COMPARISONS:
+                raise _Unsupported("unsupported predicate")
+            if comparison not in ("=", "<>", "!=") and column.pg_type == "text" and not self.snapshot.c_collation:
+                raise _Unsupported("text range comparison depends on the database collation")
+            plan.filters.append((name, (comparison, self.literal(column))))
+
+    def literal(self, column: _Column) -> Any:
+        kind, text = self.take()
+        negative = False
+        if kind == "op" and text == "-":
+            negative = True
+            kind, text = self.take()
+        if kind == "word" and text.upper() == "DATE" and self.peek()[0] == "string":
+            kind, text = self.take()
+
+        if kind == "string":
+            value = text[1:-1].replace("''", "'")
+            if self.accept("::"):
+                self.identifier()
+            if column.pg_type == "text":
+                return value
+            try:
+                if column.pg_type == "date":
+                    return date.fromisoformat(value)
+                if column.pg_type == "timestamp without time zone":
+                    return datetime.fromisoformat(value)
+            except ValueError:
+                pass
+            raise _Unsupported("string literal for a non-text column")
+
+        if kind == "number":
+            if column.encoded:
+                raise _Unsupported("numeric literal for a non-numeric column")
+            value = float(text) if any(c in text for c in ".eE") else int(text)
+            return -value if negative else value
+
+        if kind == "word" and text.upper() in ("TRUE", "FALSE") and column.pg_type == "boolean":
+            return text.upper() == "TRUE"
+        raise _Unsupported("unsupported literal")
+
+
+def _group_extreme(function: str, values: np.ndarray, group_ids: np.ndarray, group_count: int, fill) -> np.ndarray:
+    """MIN or MAX of values per group (``fill`` where a group has no values)"""
+    ufunc = np.minimum if function == "MIN" else np.maximum
+    if group_count == 1:
+        return np.array([ufunc.reduce(values, initial=fill)], dtype=values.dtype)
+    extreme = np.full(group_count, fill, dtype=values.dtype)
+    ufunc.at(extreme, group_ids, values)
+    return extreme
+
+
+def _like_regex(pattern: str, case_insensitive: bool):
+    parts = []
+    escaped = False
+    for char in pattern:
+        if escaped:
+            parts.append(re.escape(char))
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == "%":
+            parts.append(".*")
+        elif char == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return re.compile("".join(parts) + r"\Z", re.DOTALL | (re.IGNORECASE if case_insensitive else 0))
+
+
+def _predicate_matches(test: Tuple[str, Any], value: Any) -> bool:
+    """Evaluate a predicate on one non-NULL Python value (dictionary entries)"""
+    kind, operand = test
+    if kind == "in":
+        return value in operand
+    if kind == "not_in":
+        return value not in operand
+    if kind == "between":
+        return operand[0] <= value <= operand[1]
+    if kind == "not_between":
+        return not operand[0] <= value <= operand[1]
+    if kind == "like":
+        return operand.match(value) is not None
+    if kind == "not_like":
+        return operand.match(value) is None
+    return _SCALAR_COMPARISONS[kind](value, operand)
+
+
+def _lookup_table(column: _Column, test: Tuple[str, Any]) -> np.ndarray:
+    """Predicate result per dictionary code, with a trailing False slot for NULL (code -1)"""
+    lookup = np.zeros(len(column.dictionary) + 1, dtype=bool)
+    lookup[:-1] = [_predicate_matches(test, value) for value in column.dictionary]
+    return lookup
+
+
+class ColumnarReplica:
+    """In-memory copy of the revenue table with a vectorized aggregate engine"""
+
+    def __init__(self, database, max_rows: int = 2_000_000, refresh_seconds: float = 300.0,
+                 plan_cache_size: int = 256):
+        """
+        Args:
+            database: DatabaseConnection providing pooled connections
+            max_rows: Tables larger than this are not replicated
+            refresh_seconds: Age after which a background reload starts (0 disables)
+            plan_cache_size: Parsed query plans kept per snapshot
+        """
+        self.db = database
+        self.max_rows = max_rows
+        self.refresh_seconds = refresh_seconds
+        self._snapshot: Optional[_Snapshot] = None
+        self._plans = LRUCache(max_entries=plan_cache_size)
+        self._load_lock = threading.Lock()
+        # Guards _loading so concurrent requests start at most one background reload
+        self._state_lock = threading.Lock()
+        self._loading = False
+        self.loads = 0
+        self.load_errors = 0
+        self.answered = 0
+        # Distinct statements parsed and found outside the in-memory subset
+        self.unsupported = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    # --- Loading ---
+
+    def load(self) -> Dict[str, Any]:
+        """
+        Read the source table into a new snapshot and swap it in
+
+        Returns:
+            Dictionary with rows, columns, bytes and seconds
+
+        Raises:
+            Exception: The table is missing, too large or unreadable
+        """
+        with self._load_lock:
+            start_time = time.time()
+            try:
+                snapshot = self._read(start_time)
+            except Exception as e:
+                self.load_errors += 1
+                self.last_error = str(e)
+                raise
+            self._snapshot = snapshot
+            self._plans.clear()
+            self.loads += 1
+            self.last_error = None
+            return {
+                "rows": snapshot.row_count,
+                "columns": len(snapshot.columns),
+                "bytes": snapshot.nbytes,
+                "seconds": round(snapshot.load_seconds, 3),
+            }
+
+    def _read(self, start_time: float) -> _Snapshot:
+        with self.db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT a.attname, format_type(a.atttypid, a.atttypmod)
+                    FROM pg_attribute a
+                    WHERE a.attrelid = to_regclass(%s) AND a.attnum > 0 AND NOT a.attisdropped
+                    ORDER BY a.attnum
+                    """,
+                    (SOURCE_TABLE,)
+                )
+                types = [(name, _base_type(pg_type)) for name, pg_type in cur.fetchall()]
+                if not types:
+                    raise Exception(f"Table '{SOURCE_TABLE}' does not exist")
+                cur.execute("SELECT datcollate IN ('C', 'POSIX') FROM pg_database WHERE datname = current_database()")
+                c_collation = bool(cur.fetchone()[0])
+
+            # Column types the engine cannot hold (numeric, json, ...) stay in Postgres
+            types = [(name, pg_type) for name, pg_type in types
+                     if pg_type in INTEGER_TYPES or pg_type in FLOAT_TYPES or pg_type in DICTIONARY_TYPES]
+            source, population = self._source(conn)
+            builders = [_ColumnBuilder(name, pg_type) for name, pg_type in types]
+            row_count = 0
+            with conn.cursor(name="xdive_replica_load") as cur:
+                cur.itersize = 10000
+                cur.execute(sql.SQL("SELECT {} FROM {}").format(
+                    sql.SQL(", ").join(sql.Identifier(name) for name, _ in types),
+                    source
+                ))
+                while True:
+                    rows = cur.fetchmany(10000)
+                    if not rows:
+                        break
+                    row_count += len(rows)
+                    if row_count > self.max_rows:
+                        # Checked before the batch is converted: an oversized table is never held in memory
+                        raise Exception(f"Table '{SOURCE_TABLE}' exceeds REPLICA_MAX_ROWS ({self.max_rows})")
+                    # Each batch becomes typed arrays right away; only one batch of row tuples is alive
+                    for builder, values in zip(builders, zip(*rows)):
+                        builder.extend(values)
+            conn.rollback()
+
+        columns = {builder.name: builder.finish() for builder in builders}
+        return _Snapshot(columns, row_count, c_collation, time.time() - start_time, population)
+
+    def _source(self, conn) -> Tuple[sql.Composable, Optional[int]]:
+        """
+        FROM clause to read the snapshot from
+
+        Returns:
+            Tuple of (FROM item, source table row count or None when every row is read)
+        """
+        return sql.Identifier(SOURCE_TABLE), None
+
+    def _reload_in_background(self) -> None:
+        with self._state_lock:
+            if self._loading:
+                return
+            self._loading = True
+
+        def run():
+            try:
+                self.load()
+            except Exception as e:
+                print(f"WARNING: columnar replica reload failed: {e}")
+            finally:
+                with self._state_lock:
+                    self._loading = False
+
+        threading.Thread(target=run, name="xdive-replica-reload", daemon=True).start()
+
+    def invalidate(self, *_args) -> None:
+        """Drop the snapshot and reload it in the background (schema change listener)"""
+        self._snapshot = None
+        self._plans.clear()
+        self._reload_in_background()
+
+    def _current(self) -> Optional[_Snapshot]:
+        snapshot = self._snapshot
+        if snapshot is not None and self.refresh_seconds and time.time() - snapshot.loaded_at > self.refresh_seconds:
+            # Serve the current snapshot while a fresh one loads
+            self._reload_in_background()
+        return snapshot
+
+    # --- SQL subset ---
+
+    def _plan(self, snapshot: _Snapshot, query: str) -> Optional[_Plan]:
+        key = (id(snapshot), SQLValidator._normalize_query(query))
+        plan = self._plans.get(key)
+        if plan is None:
+            try:
+                plan = _Parser(key[1], snapshot).parse()
+            except _Unsupported:
+                self.unsupported += 1
+                plan = False
+            self._plans.set(key, plan)
+        return plan or None
+
+    def execute(self, query: str, parameters: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Answer an aggregate query over revenue from memory
+
+        Args:
+            query: Validated SELECT query
+            parameters: Query parameters (parameterized queries are not handled)
+
+        Returns:
+            Result in the SQLEngine success shape, or None to fall back to PostgreSQL
+        """
+        snapshot = self._current()
+        if snapshot is None or parameters:
+            return None
+
+        start_time = time.time()
+        plan = self._plan(snapshot, query)
+        if plan is None:
+            return None
+
+        rows = self._run(snapshot, plan)
+        columns = [item.name for item in plan.items]
+        self.answered += 1
+        return {
+            "success": True,
+            "data": [dict(zip(columns, row)) for row in rows],
+            "columns": columns,
+            "column_types": [item.logical_type for item in plan.items],
+            "row_count": len(rows),
+            "execution_time_ms": (time.time() - start_time) * 1000,
+            "cached": False,
+            "replica": True,
+            "error": None,
+        }
+
+    def _selection(self, snapshot: _Snapshot, filters: Sequence[Tuple[str, Any]]) -> Optional[np.ndarray]:
+        """Positions of the rows passing every predicate (None: all rows)"""
+        mask = None
+        for name, test in filters:
+            column = snapshot.columns[name]
+            kind, operand = test
+            if kind in ("null", "not_null"):
+                passed = column.not_null()
+                if kind == "null":
+                    passed = ~passed
+            elif kind == "lookup":
+                passed = operand[column.values]
+            elif column.encoded:
+                passed = _lookup_table(column, test)[column.values]
+            else:
+                values = column.values
+                if kind in ("in", "not_in"):
+                    passed = np.isin(values, operand, invert=kind == "not_in")
+                elif kind in ("between", "not_between"):
+                    passed = (values >= operand[0]) & (values <= operand[1])
+                    if kind == "not_between":
+                        passed = ~passed
+                else:
+                    passed = _COMPARISONS[kind](values, operand)
+                if column.valid is not None:
+                    passed &= column.valid
+            mask = passed if mask is None else mask & passed
+        # Gathering by position is much cheaper than repeated boolean indexing
+        return None if mask is None else np.flatnonzero(mask)
+
+    def _groups(self, snapshot: _Snapshot, group_by: Sequence[str], selection: Optional[np.ndarray]):
+        """
+        Assign each selected row (positions in ``selection``, None: all rows) a dense group id
+
+        Returns:
+            Tuple of (group id per selected row, number of groups, list of
+            dictionary code tuples per group)
+        """
+        selected = snapshot.row_count if selection is None else len(selection)
+        if not group_by:
+            return np.zeros(selected, dtype=np.int64), 1, [()]
+
+        keys = None
+        sizes = []
+        for name in group_by:
+            codes = snapshot.columns[name].values
+            if selection is not None:
+                codes = codes[selection]
+            size = len(snapshot.columns[name].dictionary) + 1
+            # Shift codes by one so NULL (-1) gets key 0
+            part = codes.astype(np.int64) + 1
+            keys = part if keys is None else keys * size + part
+            sizes.append(size)
+
+        space = int(np.prod(sizes))
+        if space <= _DENSE_GROUP_LIMIT:
+            present = np.flatnonzero(np.bincount(keys, minlength=space))
+            remap = np.empty(space, dtype=np.int64)
+            remap[present] = np.arange(len(present))
+            group_ids = remap[keys]
+        else:
+            present, group_ids = np.unique(keys, return_inverse=True)
+
+        codes_per_group = []
+        for key in present.tolist():
+            codes = []
+            for size in reversed(sizes):
+                codes.append(key % size - 1)
+                key //= size
+            codes_per_group.append(tuple(reversed(codes)))
+        return group_ids, len(present), codes_per_group
+
+    @staticmethod
+    def _aggregate(column: Optional[_Column], function: str, group_ids: np.ndarray,
+                   group_count: int, selection: Optional[np.ndarray]) -> List[Any]:
+        """One aggregate per group, with SQL NULL semantics"""
+        if column is None:
+            return np.bincount(group_ids, minlength=group_count).tolist()
+
+        values = column.values if selection is None else column.values[selection]
+        present = None
+        if column.encoded or column.valid is not None:
+            present = column.not_null()
+            if selection is not None:
+                present = present[selection]
+        if group_count == 1:
+            counts = np.array([len(values) if present is None else np.count_nonzero(present)])
+        else:
+            counts = np.bincount(group_ids if present is None else group_ids[present], minlength=group_count)
+        if function == "COUNT":
+            return counts.tolist()
+
+        if column.encoded:
+            # MIN / MAX over a sorted dictionary: compare codes
+            fill = np.iinfo(values.dtype).max if function == "MIN" else -1
+            extreme = _group_extreme(function, np.where(present, values, fill), group_ids, group_count, fill)
+            return [column.value(code) if count else None for code, count in zip(extreme.tolist(), counts.tolist())]
+
+        if function in ("SUM", "AVG"):
+            weights = values if present is None else np.where(present, values, 0)
+            sums = np.bincount(group_ids, weights=weights, minlength=group_count)
+            if column.values.dtype == np.int64:
+                if len(sums) and np.abs(sums).max() >= _EXACT_FLOAT_LIMIT:
+                    sums = np.zeros(group_count, dtype=np.int64)
+                    np.add.at(sums, group_ids, weights)
+                sums = sums.astype(np.int64)
+            if function == "AVG":
+                return [total / count if count else None for total, count in zip(sums.tolist(), counts.tolist())]
+            return [total if count else None for total, count in zip(sums.tolist(), counts.tolist())]
+
+        if values.dtype == np.int64:
+            limits = np.iinfo(np.int64)
+            fill = limits.max if function == "MIN" else limits.min
+        else:
+            fill = np.inf if function == "MIN" else -np.inf
+        if present is not None:
+            values = np.where(present, values, fill)
+        extreme = _group_extreme(function, values, group_ids, group_count, fill)
+        return [value if count else None for value, count in zip(extreme.tolist(), counts.tolist())]
+
+    def _run(self, snapshot: _Snapshot, plan: _Plan) -> List[tuple]:
+        selection = self._selection(snapshot, plan.filters)
+        group_ids, group_count, codes_per_group = self._groups(snapshot, plan.group_by, selection)
+        if plan.group_by and group_count == 0:
+            return []
+
+        columns = self._item_columns(snapshot, plan, group_ids, group_count, codes_per_group, selection)
+        rows = list(zip(*columns))
+        for index, descending in reversed(plan.order):
+            # NULLs sort last ascending and first descending, as in PostgreSQL
+            rows.sort(key=lambda row: (row[index] is None, row[index] if row[index] is not None else 0),
+                      reverse=descending)
+        if plan.offset:
+            rows = rows[plan.offset:]
+        if plan.limit is not None:
+            rows = rows[:plan.limit]
+        return rows
+
+    def _item_columns(self, snapshot: _Snapshot, plan: _Plan, group_ids: np.ndarray, group_count: int,
+                      codes_per_group: List[tuple], selection: Optional[np.ndarray]) -> List[List[Any]]:
+        """
+        One value list per select item (in select-list order)
+
+        Subclasses may append extra columns; they are carried through
+        ordering and LIMIT along with the select items.
+        """
+        columns = []
+        for item in plan.items:
+            if item.kind == "aggregate":
+                column = snapshot.columns[item.column] if item.column else None
+                columns.append(self._aggregate(column, item.function, group_ids, group_count, selection))
+            elif item.kind == "literal":
+                columns.append([item.value] * group_count)
+            else:
+                position = plan.group_by.index(item.column)
+                column = snapshot.columns[item.column]
+                values = [column.value(codes[position]) for codes in codes_per_group]
+                if item.kind == "text":
+                    values = [None if value is None else _as_text(value) for value in values]
+                columns.append(values)
+        return columns
+
+    # --- Programmatic aggregates (dashboard) ---
+
+    def aggregate(
+        self,
+        group_by: Optional[str],
+        measure: str,
+        filters: Sequence[Tuple[str, str, Any]] = ()
+    ) -> Optional[List[Tuple[Any, Any, int]]]:
+        """
+        SUM(measure) and COUNT(*) per value of one column
+
+        Args:
+            group_by: Dictionary-encoded column to group on (None: one grand total)
+            measure: Numeric column to sum
+            filters: (column, operator, value) predicates, e.g. ("actual_revenue", ">", 0)
+
+        Returns:
+            List of (group value, sum, row count), or None when the replica
+            is not loaded or cannot answer. Results are memoized per snapshot;
+            callers must not modify them.
+        """
+        snapshot = self._current()
+        if snapshot is None:
+            return None
+        memo_key = (group_by, measure, tuple(filters))
+        cached = snapshot.memo.get(memo_key)
+        if cached is not None:
+            self.answered += 1
+            return cached
+        try:
+            column = snapshot.column(measure)
+            if column.encoded or (group_by is not None and not snapshot.column(group_by).encoded):
+                return None
+            selection = self._selection(snapshot, [(name, (kind, value)) for name, kind, value in filters])
+        except (_Unsupported, KeyError):
+            return None
+
+        keys = [group_by] if group_by else []
+        group_ids, group_count, codes_per_group = self._groups(snapshot, keys, selection)
+        sums = self._aggregate(column, "SUM", group_ids, group_count, selection)
+        counts = self._aggregate(None, "COUNT", group_ids, group_count, selection)
+        labels = [snapshot.columns[group_by].value(codes[0]) if group_by else None for codes in codes_per_group]
+        result = snapshot.memo[memo_key] = list(zip(labels, sums, counts))
+        self.answered += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot size and age, load and query counters"""
+        snapshot = self._snapshot
+        return {
+            "enabled": True,
+            "ready": snapshot is not None,
+            "rows": snapshot.row_count if snapshot else 0,
+            "columns": len(snapshot.columns) if snapshot else 0,
+            "bytes": snapshot.nbytes if snapshot else 0,
+            "age_seconds": round(time.time() - snapshot.loaded_at, 1) if snapshot else None,
+            "load_seconds": round(snapshot.load_seconds, 3) if snapshot else None,
+            "loads": self.loads,
+            "load_errors": self.load_errors,
+            "last_error": self.last_error,
+            "answered": self.answered,
+            "unsupported_statements": self.unsupported,
+            "plans": self._plans.stats(),
+        }
+
+
+def _as_text(value: Any) -> str:
+    """PostgreSQL ::text rendering of a dictionary value"""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return str(value)
+
+
+def build_columnar_replica() -> Optional[ColumnarReplica]:
+    """
+    Build the columnar replica from environment configuration
+
+    Environment:
+        REPLICA_ENABLED: "false" disables the in-memory replica
+        REPLICA_MAX_ROWS: Largest table replicated (default 2000000)
+        REPLICA_REFRESH_SECONDS: Background reload age (default 300, 0 disables)
+
+    Returns:
+        Configured replica (not loaded yet), or None when disabled
+    """
+    if os.getenv("REPLICA_ENABLED", "true").lower() == "false":
+        return None
+
+    from db.connection import db
+    return ColumnarReplica(
+        db,
+        max_rows=int(os.getenv("REPLICA_MAX_ROWS", "2000000")),
+        refresh_seconds=float(os.getenv("REPLICA_REFRESH_SECONDS", "300")),
+    )
+
+
+# Global columnar replica (None when disabled)
+columnar_replica = build_columnar_replica()
@@ -0,0 +1,215 @@
+"""Request coalescing (single-flight) and admission control for expensive async work"""
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+from contextlib import asynccontextmanager
+import asyncio
+import os
+import time
+
+from services.query_control import QueryCancellation
+
+
+T = TypeVar("T")
+
+
+class _Call:
+    """One in-flight execution shared by every caller with the same key"""
+    __slots__ = ("task", "cancellation", "waiters")
+
+    def __init__(self, task: "asyncio.Future", cancellation: QueryCancellation):
+        self.task = task
+        self.cancellation = cancellation
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution
+
+    The first caller (the leader) starts the work; callers arriving while it
+    runs await the same result instead of repeating it. The work is only
+    cancelled once every caller waiting on it has gone away.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(
+        self,
+        key: Hashable,
+        fn: Callable[[QueryCancellation], Awaitable[T]]
+    ) -> Tuple[T, bool]:
+        """
+        Run ``fn`` once per key among concurrent callers
+
+        Args:
+            key: Identity of the work (e.g. the normalized question)
+            fn: Coroutine function taking a QueryCancellation handle
+
+        Returns:
+            Tuple of (result, shared) where shared is True for followers
+        """
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            cancellation = QueryCancellation()
+            call = _Call(asyncio.ensure_future(fn(cancellation)), cancellation)
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _task, key=key, call=call: self._finish(key, call))
+            self.leaders += 1
+        else:
+            self.followers += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                # Last interested caller left: stop the work (and its query).
+                # Forget the key now so a new caller starts fresh work instead
+                # of joining the cancelled task before its done callback runs.
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                call.cancellation.cancel()
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _finish(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.task.cancelled():
+            # Retrieve the outcome so an abandoned failure is not logged
+            call.task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        """In-flight keys and leader/follower counters"""
+        calls = self.leaders + self.followers
+        return {
+            "in_flight": len(self._calls),
+            "waiting": sum(call.waiters for call in self._calls.values()),
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "coalesced_rate": self.followers / calls if calls else 0.0,
+        }
+
+
+class AdmissionRejected(Exception):
+    """The request was not admitted; the caller should retry later"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounded concurrency limiter with a bounded wait queue
+
+    At most ``max_concurrent`` callers run at once and at most ``max_queue``
+    wait for a slot (each for up to ``queue_timeout`` seconds). Anything
+    beyond that is rejected immediately with AdmissionRejected, which the
+    API turns into 429 Too Many Requests.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 8,
+        max_queue: int = 32,
+        queue_timeout: float = 10.0,
+        retry_after: int = 5
+    ):
+        """
+        Args:
+            max_concurrent: Callers allowed to run at the same time
+            max_queue: Callers allowed to wait for a slot
+            queue_timeout: Seconds a caller waits before being rejected
+            retry_after: Retry-After hint (seconds) for rejected callers
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self._wait_total = 0.0
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one concurrency slot for the duration of the block"""
+        start = time.monotonic()
+        if self._semaphore.locked():
+            if self.queued >= self.max_queue:
+                self.rejected_queue_full += 1
+                raise AdmissionRejected(
+                    f"Too many concurrent requests ({self.active} running, {self.queued} queued)",
+                    self.retry_after
+                )
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected_timeout += 1
+                raise AdmissionRejected(
+                    f"No capacity within {self.queue_timeout:.0f}s ({self.active} running)",
+                    self.retry_after
+                )
+            finally:
+                self.queued -= 1
+        else:
+            await self._semaphore.acquire()
+
+        self.active += 1
+        self.admitted += 1
+        self._wait_total += time.monotonic() - start
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Current load, limits and admission counters"""
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "queue_timeout_seconds": self.queue_timeout,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "wait_ms_avg": round(1000 * self._wait_total / self.admitted, 3) if self.admitted else 0.0,
+        }
+
+
+def build_admission_controller(prefix: str, max_concurrent: int = 8) -> Optional[AdmissionController]:
+    """
+    Build an admission controller from environment configuration
+
+    Environment (for prefix "NL"):
+        NL_ADMISSION_ENABLED: "false" disables admission control
+        NL_MAX_CONCURRENCY: Requests running at once (default ``max_concurrent``)
+        NL_MAX_QUEUE: Requests waiting for a slot (default 4x the concurrency)
+        NL_QUEUE_TIMEOUT_SECONDS: Seconds a request may wait (default 10)
+        NL_RETRY_AFTER_SECONDS: Retry-After hint on 429 responses (default 5)
+
+    Returns:
+        Configured controller, or None when disabled
+    """
+    if os.getenv(f"{prefix}_ADMISSION_ENABLED", "true").lower() == "false":
+        return None
+
+    concurrency = int(os.getenv(f"{prefix}_MAX_CONCURRENCY", str(max_concurrent)))
+    return AdmissionController(
+        max_concurrent=concurrency,
+        max_queue=int(os.getenv(f"{prefix}_MAX_QUEUE", str(4 * concurrency))),
+        queue_timeout=float(os.getenv(f"{prefix}_QUEUE_TIMEOUT_SECONDS", "10")),
+        retry_after=int(os.getenv(f"{prefix}_RETRY_AFTER_SECONDS", "5")),
+    )
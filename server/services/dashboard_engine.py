@@ -0,0 +1,300 @@
+"""Dashboard aggregation service - computes dashboard rollups in PostgreSQL"""
+from typing import Dict, Any, List, Optional
+import time
+
+from services.sql_engine import sql_engine
+from services.columnar import columnar_replica
+from services import query_control
+
+
+class DashboardEngine:
+    """Builds the dashboard panels server-side instead of shipping the revenue table"""
+
+    # Panel name -> grouped column on the revenue table
+    PANEL_COLUMNS = {
+        "client": "customer",
+        "designation": "designation",
+        "manager": "project_manager",
+        "time": "month",
+    }
+
+    # Panels computed from the comma-separated skill column
+    SKILL_PANEL = "skill"
+
+    PANELS = list(PANEL_COLUMNS.keys()) + [SKILL_PANEL]
+
+    # Panels that skip rows with zero or negative revenue before summing
+    POSITIVE_PANELS = {"manager", SKILL_PANEL}
+
+    # Revenue per individual skill ("Scala, Kotlin" counts towards both, so
+    # the skill panel sums above the total)
+    SKILL_QUERY = """
+        SELECT
+            'skill' AS panel,
+            btrim(s.skill) AS label,
+            SUM(r.actual_revenue) AS revenue,
+            COUNT(*) AS row_count
+        FROM revenue r
+        CROSS JOIN LATERAL unnest(string_to_array(r.skill, ',')) AS s(skill)
+        WHERE r.actual_revenue > 0 AND btrim(s.skill) <> ''
+        GROUP BY btrim(s.skill)
+    """
+
+    # Single round trip: one GROUPING SETS scan for the plain dimensions plus
+    # an unnested skill rollup appended with UNION ALL. The manager grouping
+    # (GROUPING() = 13) reads the positive-revenue aggregates; managers with
+    # no such rows are dropped, as a WHERE would.
+    ROLLUP_QUERY = """
+        SELECT
+            CASE GROUPING(customer, designation, project_manager, month)
+                WHEN 7 THEN 'client'
+                WHEN 11 THEN 'designation'
+                WHEN 13 THEN 'manager'
+                WHEN 14 THEN 'time'
+                ELSE 'total'
+            END AS panel,
+            COALESCE(customer, designation, project_manager, month::text) AS label,
+            CASE WHEN GROUPING(customer, designation, project_manager, month) = 13
+                THEN SUM(actual_revenue) FILTER (WHERE actual_revenue > 0)
+                ELSE SUM(actual_revenue)
+            END AS revenue,
+            CASE WHEN GROUPING(customer, designation, project_manager, month) = 13
+                THEN COUNT(*) FILTER (WHERE actual_revenue > 0)
+                ELSE COUNT(*)
+            END AS row_count
+        FROM revenue
+        GROUP BY GROUPING SETS (
+            (customer), (designation), (project_manager), (month), ()
+        )
+        HAVING GROUPING(customer, designation, project_manager, month) <> 13
+            OR COUNT(*) FILTER (WHERE actual_revenue > 0) > 0
+        UNION ALL
+    """ + SKILL_QUERY
+
+    # Measure summed by every panel
+    MEASURE = "actual_revenue"
+
+    def __init__(self):
+        self.sql_engine = sql_engine
+        self.replica = columnar_replica
+
+    def _panel_query(self, panel: str) -> str:
+        """
+        Build the single-panel rollup query
+
+        Args:
+            panel: Panel name (one of PANELS)
+
+        Returns:
+            SQL query string producing panel/label/revenue/row_count rows
+        """
+        if panel == self.SKILL_PANEL:
+            return self.SKILL_QUERY
+
+        column = self.PANEL_COLUMNS[panel]
+        label = f"{column}::text" if panel == "time" else column
+        where = "WHERE actual_revenue > 0" if panel in self.POSITIVE_PANELS else ""
+        return f"""
+            SELECT
+                '{panel}' AS panel,
+                {label} AS label,
+                SUM(actual_revenue) AS revenue,
+                COUNT(*) AS row_count
+            FROM revenue
+            {where}
+            GROUP BY {column}
+        """
+
+    @staticmethod
+    def _shape_panels(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Group flat rollup rows into per-panel lists
+
+        Args:
+            rows: Rows with panel, label, revenue and row_count keys
+
+        Returns:
+            Dictionary with a "panels" mapping and the grand "total"
+        """
+        panels: Dict[str, List[Dict[str, Any]]] = {}
+        total = None
+
+        for row in rows:
+            entry = {
+                "label": row["label"],
+                "revenue": float(row["revenue"] or 0),
+                "row_count": int(row["row_count"]),
+            }
+            if row["panel"] == "total":
+                total = entry
+                continue
+            panels.setdefault(row["panel"], []).append(entry)
+
+        for panel, entries in panels.items():
+            if panel == "time":
+                # Chronological order for the time series
+                entries.sort(key=lambda e: e["label"] or "")
+            else:
+                # Largest contributors first (Pareto order)
+                entries.sort(key=lambda e: e["revenue"], reverse=True)
+
+        return {"panels": panels, "total": total}
+
+    def _shape_result(self, result: Dict[str, Any], start_time: float) -> Dict[str, Any]:
+        """Shape an SQLEngine result into the dashboard result"""
+        if not result.get("success", False):
+            return {
+                "success": False,
+                "panels": None,
+                "total": None,
+                "execution_time_ms": (time.time() - start_time) * 1000,
+                "error": result.get("error"),
+            }
+
+        shaped = self._shape_panels(result["data"])
+        return {
+            "success": True,
+            "panels": shaped["panels"],
+            "total": shaped["total"],
+            "execution_time_ms": (time.time() - start_time) * 1000,
+            "error": None,
+        }
+
+    def _run(self, query: str) -> Dict[str, Any]:
+        """Execute a rollup query and shape the result"""
+        start_time = time.time()
+        return self._shape_result(self.sql_engine.execute_query(query, request_class=query_control.DASHBOARD), start_time)
+
+    async def _run_async(self, query: str) -> Dict[str, Any]:
+        """Execute a rollup query without blocking the event loop"""
+        start_time = time.time()
+        result = await self.sql_engine.execute_query_async(query, request_class=query_control.DASHBOARD)
+        return self._shape_result(result, start_time)
+
+    def _replica_rows(self, panels: List[str], include_total: bool) -> Optional[List[Dict[str, Any]]]:
+        """
+        Compute rollup rows from the in-memory replica
+
+        Mirrors ROLLUP_QUERY: one SUM/COUNT per panel value, skills split
+        on commas, and positive revenue only for POSITIVE_PANELS.
+
+        Returns:
+            Rows with panel, label, revenue and row_count keys, or None when
+            the replica is not available
+        """
+        if self.replica is None or not self.replica.ready:
+            return None
+
+        positive = [(self.MEASURE, ">", 0)]
+        rows = []
+        for panel in panels:
+            filters = positive if panel in self.POSITIVE_PANELS else ()
+            if panel == self.SKILL_PANEL:
+                groups = self.replica.aggregate("skill", self.MEASURE, filters)
+                if groups is None:
+                    return None
+                skills: Dict[str, List[Any]] = {}
+                for raw, revenue, row_count in groups:
+                    for skill in (raw or "").split(","):
+                        skill = skill.strip(" ")
+                        if skill:
+                            entry = skills.setdefault(skill, [0.0, 0])
+                            entry[0] += revenue or 0
+                            entry[1] += row_count
+                rows.extend(
+                    {"panel": panel, "label": skill, "revenue": revenue, "row_count": row_count}
+                    for skill, (revenue, row_count) in skills.items()
+                )
+                continue
+
+            groups = self.replica.aggregate(self.PANEL_COLUMNS[panel], self.MEASURE, filters)
+            if groups is None:
+                return None
+            for label, revenue, row_count in groups:
+                if panel == "time" and label is not None:
+                    label = str(label)
+                rows.append({"panel": panel, "label": label, "revenue": revenue, "row_count": row_count})
+
+        if include_total:
+            total = self.replica.aggregate(None, self.MEASURE)
+            if total is None:
+                return None
+            rows.extend({"panel": "total", "label": None, "revenue": revenue, "row_count": row_count}
+                        for _, revenue, row_count in total)
+        return rows
+
+    def _run_replica(self, panels: List[str], include_total: bool = False) -> Optional[Dict[str, Any]]:
+        """Shape a dashboard result from the replica, or None to fall back to PostgreSQL"""
+        start_time = time.time()
+        rows = self._replica_rows(panels, include_total)
+        if rows is None:
+            return None
+        return self._shape_result({"success": True, "data": rows}, start_time)
+
+    def _dashboard_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Make sure every panel key is present on a successful dashboard result"""
+        if result["success"]:
+            # Panels with no rows still appear so the client can rely on the keys
+            for panel in self.PANELS:
+                result["panels"].setdefault(panel, [])
+        return result
+
+    def _panel_result(self, panel: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Reduce a shaped rollup result to a single panel"""
+        if result["success"]:
+            return {
+                "success": True,
+                "panel": panel,
+                "data": result["panels"].get(panel, []),
+                "execution_time_ms": result["execution_time_ms"],
+                "error": None,
+            }
+        return {
+            "success": False,
+            "panel": panel,
+            "data": None,
+            "execution_time_ms": result["execution_time_ms"],
+            "error": result["error"],
+        }
+
+    def get_dashboard(self) -> Dict[str, Any]:
+        """
+        Compute every dashboard panel in one database round trip (or from
+        the in-memory replica when it is loaded)
+
+        Returns:
+            Dictionary with per-panel rollups, the grand total and timing
+        """
+        result = self._run_replica(self.PANELS, include_total=True)
+        return self._dashboard_result(result or self._run(self.ROLLUP_QUERY))
+
+    async def get_dashboard_async(self) -> Dict[str, Any]:
+        """Async variant of get_dashboard"""
+        result = self._run_replica(self.PANELS, include_total=True)
+        return self._dashboard_result(result or await self._run_async(self.ROLLUP_QUERY))
+
+    def get_panel(self, panel: str) -> Optional[Dict[str, Any]]:
+        """
+        Compute a single dashboard panel
+
+        Args:
+            panel: Panel name (one of PANELS)
+
+        Returns:
+            Panel rollup result, or None if the panel name is unknown
+        """
+        if panel not in self.PANELS:
+            return None
+        result = self._run_replica([panel])
+        return self._panel_result(panel, result or self._run(self._panel_query(panel)))
+
+    async def get_panel_async(self, panel: str) -> Optional[Dict[str, Any]]:
+        """Async variant of get_panel"""
+        if panel not in self.PANELS:
+            return None
+        result = self._run_replica([panel])
+        return self._panel_result(panel, result or await self._run_async(self._panel_query(panel)))
+
+
+# Global dashboard engine instance
+dashboard_engine = DashboardEngine()
@@ -1,26 +1,55 @@
-import pandas as pd
-import psycopg2
-
-# Read Excel
-df = pd.read_excel("your_file.xlsx")
-
-# Connect to Supabase PostgreSQL
-conn = psycopg2.connect(
-    host="your-project-ref.supabase.co",
-    database="postgres",
-    user="your-db-user",
-    password="your-db-password",
-    port=5432
-)
-cur = conn.cursor()
-
-# Insert data row by row
-for i, row in df.iterrows():
-    cur.execute(
-        "INSERT INTO your_table_name (col1, col2, col3) VALUES (%s, %s, %s)",
-        (row['col1'], row['col2'], row['col3'])
-    )
-
-conn.commit()
-cur.close()
-conn.close()
+"""
+Load a .csv/.xlsx/.xlsb file into a table with the COPY bulk loader
+
+Usage: python -m services.data_ingetion <file|directory|glob> <table> [replace|append|merge|incremental] [sheet]
+
+A directory or glob (quoted, e.g. "extracts/2025-Q3/*.xlsb") loads all its
+files in one transaction; workbooks are parsed in parallel and staged (see
+services/staging_cache.py), so unchanged workbooks are not parsed again.
+
+incremental treats the file as the full extract: only new, changed and
+missing rows (by primary key) are written. A sheet of "*" loads every
+worksheet of each workbook.
+"""
+import sys
+
+from db.connection import db
+from services.ingestion_engine import ingestion_engine
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+
+    file_path, table_name = sys.argv[1], sys.argv[2]
+    mode = sys.argv[3] if len(sys.argv) > 3 else "replace"
+    sheet_name = sys.argv[4] if len(sys.argv) > 4 else None
+
+    db.initialize()
+    try:
+        result = ingestion_engine.ingest_file(file_path, table_name, mode=mode, sheet_name=sheet_name)
+    finally:
+        db.close()
+
+    if not result["success"]:
+        print(f"Load failed: {result['error']}")
+        sys.exit(1)
+
+    print(f"Loaded {result['rows']} rows into {table_name} ({mode}) "
+          f"in {result['seconds']}s - {result['rows_per_sec']} rows/sec")
+    staged = [entry for entry in result["files"] if entry["staged"]]
+    if len(result["files"]) > 1 or staged:
+        cached = sum(1 for entry in staged if entry["cached"])
+        print(f"Sources: {len(result['files'])} file/sheet(s), {len(staged) - cached} parsed, "
+              f"{cached} from the staging cache")
+    if result["delta"] is not None:
+        delta = result["delta"]
+        print(f"Changes: {delta['inserted']} inserted, {delta['updated']} updated, "
+              f"{delta['deleted']} deleted, {delta['unchanged']} unchanged")
+    for column, values in result["affected"].items():
+        if values:
+            print(f"Affected {column} values ({len(values)}): {', '.join(map(str, values[:20]))}"
+                  f"{' ...' if len(values) > 20 else ''}")
+    if result["ignored_columns"]:
+        print(f"Ignored columns: {', '.join(result['ignored_columns'])}")
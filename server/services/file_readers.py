@@ -0,0 +1,226 @@
+"""Streaming readers for .csv, .xlsx and .xlsb ingestion sources"""
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+import csv
+import glob
+import os
+import re
+
+
+# (header, rows) chunk yielded by the readers
+RecordChunk = Tuple[List[str], List[Tuple[Any, ...]]]
+
+SUPPORTED_EXTENSIONS = (".csv", ".xlsx", ".xlsm", ".xlsb")
+
+# Workbook formats (slow to parse; staged by services.staging_cache)
+WORKBOOK_EXTENSIONS = (".xlsx", ".xlsm", ".xlsb")
+
+# sheet_name value selecting every worksheet of each workbook
+ALL_SHEETS = "*"
+
+
+def normalize_column_name(name: Any) -> str:
+    """
+    Normalize a spreadsheet header to a PostgreSQL column name
+
+    "Support Expense" -> "support_expense", "Emp_ID" -> "emp_id"
+    """
+    name = re.sub(r"[^0-9a-zA-Z]+", "_", str(name).strip()).strip("_").lower()
+    return name or "column"
+
+
+def _chunked(header: List[str], rows: Iterator[Tuple[Any, ...]], chunk_size: int) -> Iterator[RecordChunk]:
+    """Group a row iterator into fixed-size chunks"""
+    chunk: List[Tuple[Any, ...]] = []
+    width = len(header)
+    for row in rows:
+        # Skip fully empty spreadsheet rows
+        if not any(value not in (None, "") for value in row):
+            continue
+        # Pad/trim ragged rows to the header width
+        if len(row) != width:
+            row = tuple(row[:width]) + (None,) * (width - len(row))
+        chunk.append(tuple(row))
+        if len(chunk) >= chunk_size:
+            yield header, chunk
+            chunk = []
+    if chunk:
+        yield header, chunk
+
+
+def _iter_csv(file_path: str) -> Tuple[List[str], Iterator[Tuple[Any, ...]]]:
+    handle = open(file_path, newline="", encoding="utf-8-sig")
+    reader = csv.reader(handle)
+
+    def rows():
+        try:
+            for row in reader:
+                yield tuple(value if value != "" else None for value in row)
+        finally:
+            handle.close()
+
+    header = next(reader, [])
+    return header, rows()
+
+
+def _iter_xlsx(file_path: str, sheet_name: Optional[str]) -> Tuple[List[str], Iterator[Tuple[Any, ...]]]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    sheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+    values = sheet.iter_rows(values_only=True)
+
+    def rows():
+        try:
+            yield from values
+        finally:
+            workbook.close()
+
+    header = list(next(values, ()))
+    return header, rows()
+
+
+def _iter_xlsb(file_path: str, sheet_name: Optional[str]) -> Tuple[List[str], Iterator[Tuple[Any, ...]]]:
+    from pyxlsb import open_workbook
+
+    workbook = open_workbook(file_path)
+    sheet = workbook.get_sheet(sheet_name or 1)
+    sheet_rows = sheet.rows(sparse=False)
+
+    def rows():
+        try:
+            for row in sheet_rows:
+                yield tuple(cell.v for cell in row)
+        finally:
+            sheet.close()
+            workbook.close()
+
+    header = [cell.v for cell in next(sheet_rows, [])]
+    return header, rows()
+
+
+def _open_source(file_path: str, sheet_name: Optional[str]) -> Tuple[List[str], Iterator[Tuple[Any, ...]]]:
+    """Raw header and row iterator of a source file, by extension"""
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == ".csv":
+        return _iter_csv(file_path)
+    if extension in (".xlsx", ".xlsm"):
+        return _iter_xlsx(file_path, sheet_name)
+    if extension == ".xlsb":
+        return _iter_xlsb(file_path, sheet_name)
+    raise ValueError(
+        f"Unsupported file type '{extension}'. Supported: {', '.join(SUPPORTED_EXTENSIONS)}"
+    )
+
+
+def iter_record_chunks(
+    file_path: str,
+    chunk_size: int = 5000,
+    sheet_name: Optional[str] = None
+) -> Iterator[RecordChunk]:
+    """
+    Stream a source file as (header, rows) chunks
+
+    Only one chunk is materialized at a time, so memory is bounded by
+    ``chunk_size`` rather than the file size. Header names are normalized
+    with normalize_column_name.
+
+    Args:
+        file_path: Path to a .csv, .xlsx/.xlsm or .xlsb file
+        chunk_size: Rows per chunk
+        sheet_name: Worksheet to read (first sheet if None; ignored for CSV).
+            ALL_SHEETS is resolved by the caller with sheet_names
+
+    Returns:
+        Iterator of (normalized header, list of row tuples)
+    """
+    header, rows = _open_source(file_path, sheet_name)
+    header = [normalize_column_name(name) for name in header]
+    return _chunked(header, rows, chunk_size)
+
+
+def read_header(file_path: str, sheet_name: Optional[str] = None) -> List[str]:
+    """Normalized header of a source file (or worksheet) without reading its rows"""
+    header, rows = _open_source(file_path, sheet_name)
+    # Start the row generator so that closing it runs its cleanup (closes the file)
+    next(rows, None)
+    rows.close()
+    return [normalize_column_name(name) for name in header]
+
+
+def sheet_names(file_path: str) -> List[str]:
+    """Worksheet names of a workbook, in workbook order"""
+    if os.path.splitext(file_path)[1].lower() == ".xlsb":
+        from pyxlsb import open_workbook
+
+        with open_workbook(file_path) as workbook:
+            return list(workbook.sheets)
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+
+def expand_sources(source: str) -> List[str]:
+    """
+    Resolve an ingestion source to the files it names
+
+    Args:
+        source: A file, a directory (its supported files, not recursive) or
+            a glob pattern such as "extracts/2025-Q3/*.xlsb"
+
+    Returns:
+        Sorted file paths; Excel lock files ("~$...") are skipped
+    """
+    if os.path.isfile(source):
+        return [source]
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)]
+    else:
+        paths = glob.glob(source)
+    files = sorted(
+        path for path in paths
+        if os.path.isfile(path)
+        and os.path.splitext(path)[1].lower() in SUPPORTED_EXTENSIONS
+        and not os.path.basename(path).startswith("~$")
+    )
+    if not files:
+        raise FileNotFoundError(f"No {', '.join(SUPPORTED_EXTENSIONS)} files match '{source}'")
+    return files
+
+
+def union_header(headers: Iterable[List[str]]) -> List[str]:
+    """Columns of several sources, in order of first appearance"""
+    union: List[str] = []
+    seen = set()
+    for header in headers:
+        for name in header:
+            if name not in seen:
+                seen.add(name)
+                union.append(name)
+    return union
+
+
+def concat_chunks(header: List[str], sources: Iterable[Iterable[RecordChunk]]) -> Iterator[RecordChunk]:
+    """
+    Chain the chunks of several sources under one header
+
+    Args:
+        header: Columns of the result, normally union_header of every
+            source, so no source's columns are lost
+        sources: Chunk iterators, consumed one after the other
+
+    Returns:
+        Iterator of chunks whose rows are rearranged by column name into
+        ``header``, with None for columns a source lacks
+    """
+    for chunks in sources:
+        for chunk_header, rows in chunks:
+            if chunk_header != header:
+                positions = {name: i for i, name in enumerate(chunk_header)}
+                picks = [positions.get(name) for name in header]
+                rows = [tuple(None if i is None else row[i] for i in picks) for row in rows]
+            yield header, rows
@@ -1,17 +1,60 @@
 import os
-import google.generativeai as genai
-import pandas as pd
+import asyncio
+import functools
+import itertools
+import threading
+import time
+from contextlib import AsyncExitStack
+from typing import Any, List, NamedTuple
 from dotenv import load_dotenv
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
 from db.connection import db 
+from db.schema import schema_catalog
 from services.prompts import get_system_prompt, get_full_prompt
+from services.prompt_builder import prompt_builder
+from services.nl_cache import build_nl_cache, normalize_question
+from services.concurrency import AdmissionRejected, SingleFlight, build_admission_controller
+from services.sql_validator import SQLValidator, sql_validator
+from services.result_formats import pg_type_name
+from services.prepared_statements import prepared_statements
+from services.rollups import rollup_manager
+from services.approximate import apply_row_budget, sampled_replica
+from services import query_control
+from services.metrics import observe_stage, record_llm_usage, timed
 
 # Load env variables
 load_dotenv()
 
-# Configure Gemini
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+
+@functools.lru_cache(maxsize=None)
+def _genai():
+    """google.generativeai, imported and configured on first use (the import takes most of a second)"""
+    import google.generativeai as genai
+
+    # Configure Gemini
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    return genai
+
+
+class QueryRows(NamedTuple):
+    """Fetched result of generated SQL: column names, logical types and row tuples"""
+    columns: List[str]
+    column_types: List[str]
+    rows: List[Any]
+
 
 class GeminiSQLService:
+    # Rows per "rows" event of the streamed pipeline
+    STREAM_BATCH_SIZE = int(os.getenv("NL_STREAM_BATCH_SIZE", "500"))
+
+    # Batch requests: questions accepted, Gemini calls and queries running at once per batch
+    BATCH_MAX_QUESTIONS = int(os.getenv("NL_BATCH_MAX_QUESTIONS", "100"))
+    BATCH_CONCURRENCY = int(os.getenv("NL_BATCH_CONCURRENCY", "8"))
+    BATCH_EXECUTION_CONCURRENCY = int(os.getenv("NL_BATCH_EXECUTION_CONCURRENCY", "4"))
+
+    # Raw-row answers (no aggregates) are cut to this many rows; 0 disables the budget
+    ROW_BUDGET = int(os.getenv("NL_ROW_BUDGET", "1000"))
+
     def __init__(self):
         # Configuration for the model to be strict (Temperature 0)
         self.generation_config = {
@@ -21,88 +64,668 @@ class GeminiSQLService:
             "response_mime_type": "text/plain",
         }
         
-        self.model = genai.GenerativeModel(
-            model_name="gemini-2.5-flash",
-            system_instruction=get_system_prompt(),
-            generation_config=self.generation_config,
-        )
+        # Built on first use or by the startup warm-up (see the model property)
+        self._model = None
+        self._model_lock = threading.Lock()
 
-        # UPDATED SCHEMA (Source of Truth)
-        self.ddl = """
-        CREATE TABLE revenue (
-            create table public.revenue (
-            key text not,
-            emp_id text,
-            emp_name text,
-            ee_group text,
-            region text,
-            service_line_code text,
-            designation text,
-            skill text,
-            location text,
-            customer text,
-            project_name text,
-            start_date date,
-            end_date date,
-            allocation_pct real,
-            billable_pct real,
-            project_manager text,
-            operations_head text,
-            resource_type text,
-            project_type text,
-            actual_hrs bigint,
-            actual_revenue real,
-            sow_start_date date,
-            sow_end_date date,
-            month date,
-            salary bigint,
-            support_expense bigint,
-            cost bigint,
-        );
-        """
-
-    def generate_and_execute(self, user_query: str):
-        raw_sql = "N/A"
+        # Question embeddings for the similarity tier of the NL-to-SQL cache
+        self.embedding_model = os.getenv("GEMINI_EMBEDDING_MODEL", "models/text-embedding-004")
+        self.nl_cache = build_nl_cache(self._embed_question)
+
+        # Schema comes from the cached pg_catalog snapshot; cached SQL written
+        # against an older schema must not be reused
+        self.schema = schema_catalog
+        if self.nl_cache is not None:
+            self.schema.on_change(lambda snapshot: self.nl_cache.clear())
+
+        # Prompts carry only the schema relevant to the question; sampled
+        # column values are reloaded when the schema changes
+        self.prompts = prompt_builder
+        self.schema.on_change(self.prompts.invalidate)
+
+        # Identical concurrent questions share one Gemini call and one query,
+        # and at most NL_MAX_CONCURRENCY pipelines run at once
+        self.inflight = SingleFlight()
+        self.admission = build_admission_controller("NL", max_concurrent=8)
+        self._cursor_ids = itertools.count(1)
+
+    # Used when the live schema snapshot cannot be loaded
+    FALLBACK_DDL = (
+        "CREATE TABLE revenue (key text NOT NULL, emp_id text, emp_name text, ee_group text, "
+        "region text, service_line_code text, designation text, skill text, location text, "
+        "customer text, project_name text, start_date date, end_date date, allocation_pct real, "
+        "billable_pct real, project_manager text, operations_head text, resource_type text, "
+        "project_type text, actual_hrs bigint, actual_revenue real, sow_start_date date, "
+        "sow_end_date date, month date, salary bigint, support_expense bigint, cost bigint, "
+        "PRIMARY KEY (key));"
+    )
+
+    @property
+    def model(self):
+        """Gemini model, created (with the google.generativeai import) on first use"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = _genai().GenerativeModel(
+                        model_name="gemini-2.5-flash",
+                        system_instruction=get_system_prompt(),
+                        generation_config=self.generation_config,
+                    )
+        return self._model
+
+    @model.setter
+    def model(self, model):
+        self._model = model
+
+    def _plan_prompt(self, user_query: str, snapshot):
+        """Prompt plan for a question (fallback DDL when there is no schema snapshot)"""
+        plan = self.prompts.build(user_query, snapshot if snapshot and snapshot["tables"] else None)
+        if plan["prompt"] is None:
+            plan["prompt"] = get_full_prompt(user_query, self.FALLBACK_DDL)
+        return plan
+
+    def _build_prompt(self, user_query: str):
+        """Prompt plan built from the live schema snapshot and sampled column values"""
+        with timed("prompt"):
+            try:
+                snapshot = self.schema.get_snapshot()
+                self.prompts.ensure_values()
+            except Exception as e:
+                print(f"WARNING: schema introspection failed, using fallback DDL: {e}")
+                snapshot = None
+            return self._plan_prompt(user_query, snapshot)
+
+    async def _build_prompt_async(self, user_query: str):
+        """Async variant of _build_prompt (only touches the database when a reload is due)"""
+        snapshot = self.schema.peek_snapshot()
+        if snapshot is None or self.prompts.values_stale:
+            return await run_in_threadpool(self._build_prompt, user_query)
+        with timed("prompt"):
+            return self._plan_prompt(user_query, snapshot)
+
+    def _record_llm(self, plan, response, started: float):
+        """Record a finished Gemini call (llm stage, prompt statistics, token counters)"""
+        seconds = time.perf_counter() - started
+        observe_stage("llm", seconds)
+        prompt = self.prompts.record(plan, response, seconds * 1000)
+        record_llm_usage(prompt["mode"], prompt["prompt_tokens"], prompt["output_tokens"])
+        return prompt
+
+    def _lookup_cache(self, user_query: str):
+        """NL cache lookup (may embed the question, so it blocks)"""
+        with timed("nl_cache"):
+            return self.nl_cache.lookup(user_query)
+
+    @staticmethod
+    def _clean_sql(text: str) -> str:
+        """Strip markdown fences from the model output"""
+        return text.replace("```sql", "").replace("```", "").strip()
+
+    @staticmethod
+    def _chunk_text(chunk) -> str:
+        """Text of a streamed Gemini chunk ("" for chunks without parts, e.g. the final one)"""
         try:
-            # 1. Generate SQL from Gemini
-            prompt = get_full_prompt(user_query, self.ddl)
-            response = self.model.generate_content(prompt)
-            
-            # Clean the response (remove markdown)
-            raw_sql = response.text.replace("```sql", "").replace("```", "").strip()
-            
-            print(f"DEBUG - Generated SQL: {raw_sql}") 
+            return chunk.text
+        except ValueError:
+            return ""
 
-            # 2. Execute SQL using your existing Psycopg2 Connection
-            # We use pandas.read_sql_query which accepts a raw psycopg2 connection
-            with db.get_connection() as conn:
-                df = pd.read_sql_query(raw_sql, conn)
-                
-            # 3. Handle Empty Results
-            if df.empty:
-                return {
-                    "status": "success",
-                    "sql": raw_sql,
-                    "data": [],
-                    "row_count": 0,
-                    "message": "No records found matching your query."
-                }
-
-            # 4. Return Data
+    def _embed_question(self, question: str):
+        """Embed a question for the similarity tier of the NL-to-SQL cache"""
+        result = _genai().embed_content(
+            model=self.embedding_model,
+            content=question,
+            task_type="semantic_similarity",
+        )
+        return result["embedding"]
+
+    def _generate_sql(self, user_query: str):
+        """
+        Get SQL for a question from the NL cache, or from Gemini on a miss
+
+        Returns:
+            Tuple of (sql, cache_hit, prompt) where cache_hit is None on a
+            miss and prompt (size and latency of the Gemini call) is None on a hit
+        """
+        if self.nl_cache is not None:
+            hit = self._lookup_cache(user_query)
+            if hit is not None:
+                return hit["sql"], hit, None
+
+        plan = self._build_prompt(user_query)
+        start = time.perf_counter()
+        response = self.model.generate_content(plan["prompt"])
+        prompt = self._record_llm(plan, response, start)
+
+        # Clean the response (remove markdown)
+        return self._clean_sql(response.text), None, prompt
+
+    async def _generate_sql_async(self, user_query: str):
+        """Async variant of _generate_sql"""
+        if self.nl_cache is not None:
+            # Cache lookups may embed the question, so keep them off the loop
+            hit = await run_in_threadpool(self._lookup_cache, user_query)
+            if hit is not None:
+                return hit["sql"], hit, None
+
+        plan = await self._build_prompt_async(user_query)
+        start = time.perf_counter()
+        response = await self.model.generate_content_async(plan["prompt"])
+        prompt = self._record_llm(plan, response, start)
+
+        # Clean the response (remove markdown)
+        return self._clean_sql(response.text), None, prompt
+
+    @staticmethod
+    def _frame_result(result: QueryRows, raw_sql: str, cache_hit=None):
+        """Build the success response from fetched rows"""
+        cache = {k: v for k, v in cache_hit.items() if k != "sql"} if cache_hit else None
+
+        # Handle Empty Results
+        if not result.rows:
             return {
                 "status": "success",
                 "sql": raw_sql,
-                "data": df.to_dict(orient="records"),
-                "row_count": len(df)
+                "data": [],
+                "columns": result.columns,
+                "column_types": result.column_types,
+                "row_count": 0,
+                "cache": cache,
+                "message": "No records found matching your query."
             }
 
+        with timed("frame"):
+            columns = result.columns
+            data = [dict(zip(columns, row)) for row in result.rows]
+        return {
+            "status": "success",
+            "sql": raw_sql,
+            "data": data,
+            "columns": columns,
+            "column_types": result.column_types,
+            "row_count": len(data),
+            "cache": cache
+        }
+
+    @staticmethod
+    def _query_rows(rows, description) -> QueryRows:
+        """QueryRows from fetched tuples and a cursor description (psycopg2 or psycopg 3)"""
+        description = description or []
+        return QueryRows(
+            [desc[0] for desc in description],
+            [pg_type_name(desc[1]) for desc in description],
+            rows,
+        )
+
+    def _executable_sql(self, raw_sql: str):
+        """
+        SQL to execute: rewritten onto a revenue rollup when eligible and
+        capped at ROW_BUDGET rows when it returns raw rows
+
+        Returns:
+            Tuple of (SQL to execute, rollup used or None, row budget applied or None)
+        """
+        executed_sql, rollup = raw_sql, None
+        rewritten = rollup_manager.rewrite(raw_sql)
+        if rewritten is not None:
+            executed_sql, rollup = rewritten
+        executed_sql, row_budget = apply_row_budget(executed_sql, self.ROW_BUDGET)
+        return executed_sql, rollup, row_budget
+
+    @staticmethod
+    def _estimate(raw_sql: str, approximate: bool):
+        """Approximate answer from the revenue sample (SQLEngine result shape), or None to run exactly"""
+        if not approximate or sampled_replica is None:
+            return None
+        with timed("replica"):
+            return sampled_replica.execute(raw_sql)
+
+    @staticmethod
+    def _estimate_rows(estimate):
+        """Rows and annotations of an approximate answer"""
+        columns = estimate["columns"]
+        rows = [tuple(row[column] for column in columns) for row in estimate["data"]]
+        result = QueryRows(columns, estimate["column_types"], rows)
+        return result, {"rollup": None, "approximate": estimate["approximate"], "bounds": estimate["bounds"]}
+
+    @staticmethod
+    def _within_budget(result: QueryRows, row_budget, annotations):
+        """Trim rows fetched under a row budget (budget + 1 rows) and flag the truncation"""
+        if row_budget is not None and len(result.rows) > row_budget:
+            result = result._replace(rows=result.rows[:row_budget])
+            annotations.update(truncated=True, row_budget=row_budget)
+        return result, annotations
+
+    @staticmethod
+    def _error_result(e: Exception, raw_sql: str):
+        """Build the error response"""
+        print(f"ERROR executing SQL: {e}")
+        return {
+            "status": "error",
+            "error": str(e),
+            "sql": raw_sql
+        }
+
+    def generate_and_execute(self, user_query: str, cancellation=None, approximate=False):
+        raw_sql = "N/A"
+        try:
+            # 1. Generate SQL from Gemini (or reuse cached SQL)
+            raw_sql, cache_hit, prompt = self._generate_sql(user_query)
+
+            # 2. Execute SQL using your existing Psycopg2 Connection
+            fetched, annotations = self._execute_blocking(raw_sql, cancellation, approximate)
+            
+            # Only SQL that executed successfully is worth reusing
+            if cache_hit is None and self.nl_cache is not None:
+                self.nl_cache.store(user_query, raw_sql)
+                
+            # 3. Return Data
+            result = self._frame_result(fetched, raw_sql, cache_hit)
+            result.update(annotations)
+            result["prompt"] = prompt
+            return result
+
         except Exception as e:
-            print(f"ERROR executing SQL: {e}")
-            return {
-                "status": "error",
-                "error": str(e),
-                "sql": raw_sql
-            }
+            return self._error_result(e, raw_sql)
+
+    async def generate_and_execute_async(self, user_query: str, cancellation=None, approximate=False):
+        """
+        Async variant of generate_and_execute
+
+        Awaits Gemini with generate_content_async and runs the SQL on the
+        psycopg 3 async pool (or on the threadpool when it is unavailable),
+        so a slow LLM call or query never blocks the event loop. Generated
+        SQL runs under the "nl" statement_timeout; cancelling the task (or
+        ``cancellation`` on the threadpool path) cancels it on the server.
+
+        Raw-row answers are cut to ROW_BUDGET rows ("truncated" is set).
+        With ``approximate``, aggregates over revenue are estimated from
+        the row sample and carry "approximate" and per-row "bounds".
+        """
+        raw_sql = "N/A"
+        try:
+            # 1. Generate SQL from Gemini (or reuse cached SQL)
+            raw_sql, cache_hit, prompt = await self._generate_sql_async(user_query)
+
+            # 2. Execute SQL without blocking the event loop
+            fetched, annotations = await self._execute_async(raw_sql, cancellation, approximate)
+
+            # Only SQL that executed successfully is worth reusing
+            if cache_hit is None and self.nl_cache is not None:
+                await run_in_threadpool(self.nl_cache.store, user_query, raw_sql)
+
+            # 3. Return Data
+            result = self._frame_result(fetched, raw_sql, cache_hit)
+            result.update(annotations)
+            result["prompt"] = prompt
+            return result
+
+        except Exception as e:
+            return self._error_result(e, raw_sql)
+
+    @staticmethod
+    def _validate(raw_sql: str) -> None:
+        """
+        Reject generated SQL the validator does not accept
+
+        Raises:
+            ValueError: The SQL is not a single read-only SELECT
+        """
+        is_valid, error_msg = sql_validator.validate_query(raw_sql)
+        if not is_valid:
+            raise ValueError(f"SQL validation failed: {error_msg}")
+
+    def _execute_blocking(self, raw_sql: str, cancellation=None, approximate=False):
+        """
+        Validate and run generated SQL on the psycopg2 pool (estimated from
+        the revenue sample in approximate mode, on a rollup when eligible)
+
+        Returns:
+            Tuple of (QueryRows, result annotations: "rollup" and,
+            when they apply, "truncated"/"row_budget" or "approximate"/"bounds")
+
+        Raises:
+            ValueError: The SQL failed validation (nothing reached the database)
+        """
+        self._validate(raw_sql)
+        estimate = self._estimate(raw_sql, approximate)
+        if estimate is not None:
+            return self._estimate_rows(estimate)
+        rollup_manager.ensure_loaded()
+        executed_sql, rollup, row_budget = self._executable_sql(raw_sql)
+        fetched = self._read_sql_blocking(executed_sql, cancellation)
+        return self._within_budget(fetched, row_budget, {"rollup": rollup})
+
+    async def _execute_async(self, raw_sql: str, cancellation=None, approximate=False):
+        """
+        Async variant of _execute_blocking, on the psycopg 3 pool when available
+
+        Returns:
+            Tuple of (QueryRows, result annotations)
+
+        Raises:
+            ValueError: The SQL failed validation (nothing reached the database)
+        """
+        if not db.async_available:
+            return await run_in_threadpool(self._execute_blocking, raw_sql, cancellation, approximate)
+        self._validate(raw_sql)
+        estimate = self._estimate(raw_sql, approximate)
+        if estimate is not None:
+            return self._estimate_rows(estimate)
+
+        if not rollup_manager.loaded:
+            await run_in_threadpool(rollup_manager.ensure_loaded)
+        executed_sql, rollup, row_budget = self._executable_sql(raw_sql)
+
+        async with db.get_async_connection() as conn:
+            async with conn.cursor() as cur:
+                timeout = query_control.timeout_statement(query_control.NL)
+                with timed("db"):
+                    if prepared_statements is not None:
+                        # Popular questions resolve to the same SQL: reuse its plan
+                        await prepared_statements.execute_async(cur, executed_sql, setup=timeout)
+                    else:
+                        await cur.execute(timeout)
+                        await cur.execute(executed_sql)
+                    rows = await cur.fetchall()
+                fetched = self._query_rows(rows, cur.description)
+        return self._within_budget(fetched, row_budget, {"rollup": rollup})
+
+    async def generate_and_execute_shared(self, user_query: str, approximate=False):
+        """
+        Coalesced, admission-controlled variant of generate_and_execute_async
+
+        Concurrent requests for the same (normalized) question share one
+        pipeline run; followers get a copy of the leader's result marked
+        "coalesced". Only leaders take an admission slot.
+
+        Raises:
+            AdmissionRejected: No capacity to run the pipeline
+        """
+        async def run(cancellation):
+            if self.admission is None:
+                return await self.generate_and_execute_async(user_query, cancellation, approximate)
+            async with self.admission.slot():
+                return await self.generate_and_execute_async(user_query, cancellation, approximate)
+
+        result, shared = await self.inflight.do((normalize_question(user_query), approximate), run)
+        if shared:
+            result = dict(result)
+            result["coalesced"] = True
+        return result
+
+    async def stream_events(self, user_query: str, approximate=False):
+        """
+        Run the pipeline and yield progress events as they happen
+
+        Gemini's answer is streamed token by token and the rows are read
+        through a server-side cursor, so the first event arrives at once and
+        the first rows as soon as the database produces them. Events are
+        (name, payload) tuples:
+
+            ("stage", {"stage": "generating"})
+            ("token", {"text": "..."})                    (Gemini output chunks)
+            ("sql", {"sql": "...", "cache": ..., "prompt": ...})
+            ("validated", {})
+            ("executing", {"rollup": ..., "approximate": ...})
+            ("columns", {"columns": [...], "column_types": [...]})
+            ("rows", {"rows": [...]})                     (STREAM_BATCH_SIZE rows each)
+            ("done", {"row_count": n, "truncated": bool, "timings": {...}})
+        or ("error", {"error": "...", "stage": "...", "sql": "..."}) at any point,
+        with "retry_after" when the pipeline is at capacity. Streams are not
+        coalesced, but each one takes an admission slot. Raw-row answers
+        stop after ROW_BUDGET rows. An approximate answer (``approximate``)
+        arrives as a single "rows" event that also carries "bounds".
+        """
+        start = time.perf_counter()
+        timings = {}
+        raw_sql = "N/A"
+        stage = "admission"
+
+        def elapsed():
+            return round((time.perf_counter() - start) * 1000, 3)
+
+        try:
+            async with AsyncExitStack() as stack:
+                if self.admission is not None:
+                    await stack.enter_async_context(self.admission.slot())
+
+                # 1. Generate SQL, streaming Gemini's tokens (or reuse cached SQL)
+                stage = "generating"
+                yield "stage", {"stage": stage}
+                cache_hit = prompt = None
+                if self.nl_cache is not None:
+                    cache_hit = await run_in_threadpool(self._lookup_cache, user_query)
+                if cache_hit is not None:
+                    raw_sql = cache_hit["sql"]
+                else:
+                    plan = await self._build_prompt_async(user_query)
+                    llm_start = time.perf_counter()
+                    response = await self.model.generate_content_async(plan["prompt"], stream=True)
+                    chunks = []
+                    async for chunk in response:
+                        text = self._chunk_text(chunk)
+                        if text:
+                            timings.setdefault("first_token_ms", elapsed())
+                            chunks.append(text)
+                            yield "token", {"text": text}
+                    prompt = self._record_llm(plan, response, llm_start)
+                    raw_sql = self._clean_sql("".join(chunks))
+                timings["sql_ms"] = elapsed()
+                cache = {k: v for k, v in cache_hit.items() if k != "sql"} if cache_hit else None
+                yield "sql", {"sql": raw_sql, "cache": cache, "prompt": prompt}
+
+                # 2. Validate before anything reaches the database
+                stage = "validating"
+                is_valid, error_msg = sql_validator.validate_query(raw_sql)
+                if not is_valid:
+                    yield "error", {"error": f"SQL validation failed: {error_msg}", "stage": stage, "sql": raw_sql}
+                    return
+                yield "validated", {}
+
+                # 3. Execute, forwarding rows batch by batch
+                stage = "executing"
+                row_count = 0
+                truncated = False
+                estimate = self._estimate(raw_sql, approximate)
+                if estimate is not None:
+                    yield "executing", {"rollup": None, "approximate": estimate["approximate"]}
+                    yield "columns", {"columns": estimate["columns"], "column_types": estimate["column_types"]}
+                    timings["first_row_ms"] = elapsed()
+                    row_count = estimate["row_count"]
+                    yield "rows", {"rows": estimate["data"], "bounds": estimate["bounds"]}
+                else:
+                    if not rollup_manager.loaded:
+                        await run_in_threadpool(rollup_manager.ensure_loaded)
+                    executed_sql, rollup, row_budget = self._executable_sql(raw_sql)
+                    yield "executing", {"rollup": rollup, "approximate": None}
+
+                    async for columns, column_types, rows in self._iter_batches(executed_sql):
+                        if columns is not None:
+                            yield "columns", {"columns": columns, "column_types": column_types}
+                            continue
+                        if row_budget is not None and row_count + len(rows) > row_budget:
+                            # The budget query fetches one extra row to detect truncation
+                            rows = rows[:row_budget - row_count]
+                            truncated = True
+                        timings.setdefault("first_row_ms", elapsed())
+                        row_count += len(rows)
+                        if rows:
+                            yield "rows", {"rows": rows}
+
+            # Only SQL that executed successfully is worth reusing
+            if cache_hit is None and self.nl_cache is not None:
+                await run_in_threadpool(self.nl_cache.store, user_query, raw_sql)
+
+            timings["total_ms"] = elapsed()
+            yield "done", {"row_count": row_count, "truncated": truncated, "timings": timings}
+
+        except AdmissionRejected as e:
+            yield "error", {"error": str(e), "stage": stage, "sql": None, "retry_after": e.retry_after}
+        except Exception as e:
+            print(f"ERROR streaming NL pipeline: {e}")
+            yield "error", {"error": str(e), "stage": stage, "sql": raw_sql}
+
+    async def _iter_batches(self, executed_sql: str):
+        """
+        Execute SQL on a server-side cursor under the "nl" statement_timeout
+
+        Yields (columns, column_types, None) once, then (None, None, rows)
+        per batch of STREAM_BATCH_SIZE rows (each row a dictionary).
+        """
+        if not db.async_available:
+            batches = iterate_in_threadpool(self._iter_batches_blocking(executed_sql))
+            async for batch in batches:
+                yield batch
+            return
+
+        async with db.get_async_connection() as conn:
+            await conn.execute(query_control.timeout_statement(query_control.NL))
+            async with conn.cursor(name=f"xdive_nl_stream_{next(self._cursor_ids)}") as cur:
+                # The "db" stage covers the time to the first batch
+                with timed("db"):
+                    await cur.execute(executed_sql)
+                    batch = await cur.fetchmany(self.STREAM_BATCH_SIZE)
+                columns = [desc[0] for desc in cur.description] if cur.description else []
+                yield columns, [pg_type_name(desc[1]) for desc in cur.description or []], None
+                while batch:
+                    yield None, None, [dict(zip(columns, row)) for row in batch]
+                    batch = await cur.fetchmany(self.STREAM_BATCH_SIZE)
+
+    def _iter_batches_blocking(self, executed_sql: str):
+        """Blocking (psycopg2) variant of _iter_batches, iterated on the threadpool"""
+        with db.get_connection() as conn:
+            try:
+                with conn.cursor() as setup:
+                    setup.execute(query_control.timeout_statement(query_control.NL))
+                with conn.cursor(name=f"xdive_nl_stream_{next(self._cursor_ids)}") as cur:
+                    cur.itersize = self.STREAM_BATCH_SIZE
+                    with timed("db"):
+                        cur.execute(executed_sql)
+                        # Named cursors only expose a description after the first fetch
+                        batch = cur.fetchmany(self.STREAM_BATCH_SIZE)
+                    columns = [desc[0] for desc in cur.description] if cur.description else []
+                    yield columns, [pg_type_name(desc[1]) for desc in cur.description or []], None
+                    while batch:
+                        yield None, None, [dict(zip(columns, row)) for row in batch]
+                        batch = cur.fetchmany(self.STREAM_BATCH_SIZE)
+            finally:
+                # Close the read transaction opened by the named cursor
+                conn.rollback()
+
+    async def generate_and_execute_batch(self, questions, approximate=False):
+        """
+        Answer a list of questions concurrently
+
+        Questions that normalize alike are answered once. Up to
+        BATCH_CONCURRENCY questions are in generation at a time; each
+        generated statement is validated and then executed, at most
+        BATCH_EXECUTION_CONCURRENCY at a time on pooled connections.
+        Identical SQL from different questions runs only once. A failing
+        question only fails its own result. The batch as a whole takes
+        one admission slot. ``approximate`` applies to every question.
+
+        Raises:
+            AdmissionRejected: No capacity to run the batch
+
+        Returns:
+            Dictionary with one result per question (in request order) and
+            batch counters; each result carries "question", "duplicate",
+            "shared_execution" and "timings" (generate_ms, execute_ms and
+            total_ms since the batch started)
+        """
+        start = time.perf_counter()
+        # Normalized question -> index of its first occurrence
+        unique = {}
+        for index, question in enumerate(questions):
+            unique.setdefault(normalize_question(question), index)
+
+        generation = asyncio.Semaphore(self.BATCH_CONCURRENCY)
+        execution = asyncio.Semaphore(self.BATCH_EXECUTION_CONCURRENCY)
+        # Normalized SQL -> task running it, shared by every question that generated it
+        executions = {}
+
+        def elapsed(since):
+            return round((time.perf_counter() - since) * 1000, 3)
+
+        async def execute(raw_sql):
+            async with execution:
+                query_start = time.perf_counter()
+                fetched, annotations = await self._execute_async(raw_sql, approximate=approximate)
+                return fetched, annotations, elapsed(query_start)
+
+        async def answer(question):
+            raw_sql = "N/A"
+            timings = {}
+            shared = False
+            try:
+                async with generation:
+                    generate_start = time.perf_counter()
+                    raw_sql, cache_hit, prompt = await self._generate_sql_async(question)
+                    timings["generate_ms"] = elapsed(generate_start)
+
+                # Also checked in _execute_async; invalid SQL never becomes a shared execution
+                self._validate(raw_sql)
+
+                # Comments and whitespace are dropped outside literals only:
+                # 'a  b' and 'a b' stay different statements
+                key = SQLValidator._normalize_query(raw_sql)
+                shared = key in executions
+                if not shared:
+                    executions[key] = asyncio.ensure_future(execute(raw_sql))
+                fetched, annotations, timings["execute_ms"] = await executions[key]
+
+                if cache_hit is None and self.nl_cache is not None:
+                    await run_in_threadpool(self.nl_cache.store, question, raw_sql)
+
+                result = self._frame_result(fetched, raw_sql, cache_hit)
+                result.update(annotations)
+                result["prompt"] = prompt
+            except Exception as e:
+                result = self._error_result(e, raw_sql)
+            result["shared_execution"] = shared
+            timings["total_ms"] = elapsed(start)
+            result["timings"] = timings
+            return result
+
+        async with AsyncExitStack() as stack:
+            if self.admission is not None:
+                await stack.enter_async_context(self.admission.slot())
+            answers = await asyncio.gather(*(answer(questions[index]) for index in unique.values()))
+        by_key = dict(zip(unique, answers))
+
+        results = []
+        for index, question in enumerate(questions):
+            key = normalize_question(question)
+            result = dict(by_key[key])
+            result["question"] = question
+            result["duplicate"] = unique[key] != index
+            results.append(result)
+
+        return {
+            "status": "success",
+            "results": results,
+            "questions": len(questions),
+            "unique_questions": len(unique),
+            "executions": len(executions),
+            "failed": sum(1 for result in answers if result["status"] == "error"),
+            "wall_ms": elapsed(start),
+        }
+
+    def _read_sql_blocking(self, raw_sql: str, cancellation=None) -> QueryRows:
+        """Run the SQL on the psycopg2 pool under the "nl" statement_timeout"""
+        with db.get_connection() as conn:
+            if cancellation is not None:
+                cancellation.attach(conn)
+            try:
+                with conn.cursor() as cur:
+                    with timed("db"):
+                        cur.execute(query_control.timeout_statement(query_control.NL))
+                        cur.execute(raw_sql)
+                        rows = cur.fetchall()
+                    return self._query_rows(rows, cur.description)
+            finally:
+                if cancellation is not None:
+                    cancellation.detach()
 
 # Singleton Instance
 sql_service = GeminiSQLService()
\ No newline at end of file
@@ -1,25 +1,138 @@
+import os
 import pandas as pd
 from db.connection import db
+from services.file_readers import (
+    ALL_SHEETS, WORKBOOK_EXTENSIONS, concat_chunks, expand_sources, iter_record_chunks, read_header,
+    sheet_names, union_header,
+)
+from services.result_cache import result_cache
+from services.rollups import rollup_manager, SOURCE_TABLE, TIME_DIMENSION
+from services.columnar import columnar_replica
+from services.approximate import sampled_replica
+from services.staging_cache import staging_cache
+
+# Rows held in memory per COPY chunk
+DEFAULT_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "5000"))
+
+# Columns of revenue whose touched values a load reports. Only the rollups
+# act on them (refreshing just the touched months); the result cache is
+# flushed with bump_data_version and the columnar replica reloads in full.
+AFFECTED_COLUMNS = (TIME_DIMENSION, "customer")
+
 
 class IngestionEngine:
 
-    def ingest_excel(self, file_path, clean_function, table_name):
+    def _cleaned_chunks(self, chunks, clean_function):
+        """Apply a DataFrame cleaning function chunk by chunk"""
+        for header, rows in chunks:
+            clean_df = clean_function(pd.DataFrame.from_records(rows, columns=header))
+            clean_df = clean_df.astype(object).where(clean_df.notna(), None)
+            yield list(clean_df.columns), list(clean_df.itertuples(index=False, name=None))
+
+    @staticmethod
+    def _sheets(path, sheet_name):
+        """Worksheets of one source to load ([None]: the first sheet, or a CSV file)"""
+        if os.path.splitext(path)[1].lower() not in WORKBOOK_EXTENSIONS:
+            return [None]
+        if sheet_name == ALL_SHEETS:
+            return sheet_names(path)
+        return [sheet_name] if sheet_name is None or isinstance(sheet_name, str) else list(sheet_name)
+
+    def _read_sources(self, paths, chunk_size, sheet_name, workers):
+        """
+        Chunks of every source file under the union of their headers, plus a per-file report
+
+        Workbook sheets are parsed in parallel into the staging cache (or
+        reused from it) and read back from there; CSV files, and workbooks
+        when the cache is unavailable, are streamed directly. ``sheet_name``
+        may be one sheet, a list, or ALL_SHEETS for every sheet of each workbook.
+        """
+        selected = [(path, sheet) for path in paths for sheet in self._sheets(path, sheet_name)]
+        workbooks = [
+            (path, sheet) for path, sheet in selected
+            if os.path.splitext(path)[1].lower() in WORKBOOK_EXTENSIONS
+        ]
+        staged = {}
+        if workbooks and staging_cache is not None:
+            for entry in staging_cache.stage(workbooks, chunk_size=chunk_size, workers=workers):
+                staged[(entry["file"], entry["sheet"])] = entry
+
+        files = []
+        sources = []
+        headers = []
+        for path, sheet in selected:
+            entry = staged.get((path, sheet))
+            if entry is None:
+                files.append({"file": path, "sheet": sheet, "staged": False})
+                sources.append((path, sheet))
+                headers.append(read_header(path, sheet))
+            else:
+                files.append({"file": path, "sheet": sheet, "staged": True, "cached": entry["cached"],
+                              "rows": entry["rows"], "parse_seconds": entry["parse_seconds"]})
+                sources.append(entry)
+                headers.append(entry["header"])
+
+        def source_chunks():
+            # Opened one at a time, as the load reaches them
+            for source in sources:
+                if isinstance(source, dict):
+                    yield staging_cache.iter_chunks(source)
+                else:
+                    yield iter_record_chunks(source[0], chunk_size=chunk_size, sheet_name=source[1])
+
+        # Every source's columns are kept; files lacking one get NULL in it
+        return concat_chunks(union_header(headers), source_chunks()), files
+
+    @staticmethod
+    def _refresh_rollups(cur, affected):
+        """Refresh the rollups of the touched months (none when nothing changed)"""
+        months = affected[TIME_DIMENSION]
+        if months is None or months:
+            rollup_manager.refresh(cur, months)
+
+    def ingest_file(self, file_path, table_name, clean_function=None, mode="replace",
+                    chunk_size=DEFAULT_CHUNK_SIZE, sheet_name=None, workers=None):
         try:
-            # Step 1: Load Excel
-            df = pd.read_excel(file_path)
+            # Step 1: Stream the source in chunks (.csv, .xlsx, .xlsb); file_path may be a
+            # directory or a glob, whose files are loaded together in one transaction
+            chunks, files = self._read_sources(expand_sources(file_path), chunk_size, sheet_name, workers)
 
-            # Step 2: Clean it using your function
-            clean_df = clean_function(df)
+            # Step 2: Clean each chunk (the function must be row-local)
+            if clean_function is not None:
+                chunks = self._cleaned_chunks(chunks, clean_function)
 
-            # Step 3: Convert to list of dicts
-            records = clean_df.to_dict(orient="records")
+            # Step 3: COPY into a staging table and swap/merge into Postgres;
+            # revenue rollups are refreshed for the touched months in the same transaction
+            rollup_options = {}
+            if table_name == SOURCE_TABLE:
+                rollup_options = {
+                    "track_columns": AFFECTED_COLUMNS,
+                    "on_applied": self._refresh_rollups,
+                }
+            stats = db.bulk_load(table_name, chunks, mode=mode, **rollup_options)
+            stats["files"] = files
 
-            # Step 4: Insert into Postgres
-            inserted = db.bulk_insert(table_name, records)
+            delta = stats["delta"]
+            if delta is not None and not (delta["inserted"] or delta["updated"] or delta["deleted"]):
+                # Incremental load of an unchanged extract: nothing downstream is stale
+                return {"success": True, "rows_inserted": 0, **stats}
+
+            # Step 4: Cached query results and the in-memory replica are now stale
+            if result_cache is not None:
+                result_cache.bump_data_version()
+            if table_name == SOURCE_TABLE and columnar_replica is not None:
+                try:
+                    stats["replica"] = columnar_replica.load()
+                except Exception as e:
+                    print(f"WARNING: columnar replica reload failed: {e}")
+            if table_name == SOURCE_TABLE and sampled_replica is not None:
+                # Approximate queries run exactly until the new sample is drawn
+                sampled_replica.invalidate()
 
             return {
                 "success": True,
-                "rows_inserted": inserted
+                "rows_inserted": stats["rows"] if delta is None else delta["inserted"],
+                **stats
             }
 
         except Exception as e:
@@ -28,5 +141,8 @@ class IngestionEngine:
                 "error": str(e)
             }
 
+    def ingest_excel(self, file_path, clean_function, table_name):
+        return self.ingest_file(file_path, table_name, clean_function=clean_function)
+
     
 ingestion_engine = IngestionEngine()
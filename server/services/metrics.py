@@ -0,0 +1,343 @@
+"""
+Per-request stage timings and Prometheus metrics
+
+Code on the request path wraps each stage in ``timed(stage)`` (or reports
+a duration it measured itself with ``observe_stage``). Every observation
+goes to the ``xdive_stage_duration_seconds`` histogram and, inside an HTTP
+request, to that request's timings, which ``ServerTimingMiddleware`` sends
+back as a ``Server-Timing`` header. Stages:
+
+    nl_cache    NL-to-SQL cache lookup (includes the question embedding)
+    prompt      prompt build (schema selection, sampled values)
+    llm         Gemini call
+    validate    SQL validation
+    pool_wait   waiting for a pooled connection
+    db          statement execution and fetch
+    replica     answering from the in-memory replica or sample
+    frame       converting fetched rows to the result shape (dictionaries)
+    serialize   encoding the endpoint's return value into the response body
+
+``render`` produces the Prometheus text exposition of every registered
+histogram and counter plus point-in-time gauges (pool, cache, admission
+statistics) passed in by the caller.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import asyncio
+import functools
+import threading
+import time
+
+from fastapi.routing import APIRoute
+from starlette.responses import Response
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is +Inf
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with labels"""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # Label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        for label_values, counts, total, count in sorted(series):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, label_values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, label_values)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, label_values)} {count}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, *label_values: str) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            lines.append(f"{self.name}{_labels(self.label_names, label_values)} {_number(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide histograms and counters rendered by /metrics"""
+
+    def __init__(self):
+        self._metrics: List[Any] = []
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help_text, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self, gauges: Optional[Dict[str, Optional[Dict[str, Any]]]] = None) -> str:
+        """
+        Prometheus text exposition of every metric
+
+        Args:
+            gauges: Component name -> statistics dictionary (e.g. a cache's
+                stats()). Numeric leaves are exported as gauges named
+                xdive_<component>_<key>; nested dictionaries extend the
+                name. None components are skipped.
+
+        Returns:
+            Exposition text (CONTENT_TYPE)
+        """
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for component, stats in (gauges or {}).items():
+            if stats is None:
+                continue
+            for name, value in _flatten(f"xdive_{component}", stats):
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _flatten(prefix: str, stats: Dict[str, Any]) -> Iterator[Tuple[str, float]]:
+    """Numeric (and boolean) leaves of a statistics dictionary, with metric-safe names"""
+    for key, value in stats.items():
+        name = f"{prefix}_{''.join(c if c.isalnum() else '_' for c in str(key)).lower()}"
+        if isinstance(value, dict):
+            yield from _flatten(name, value)
+        elif isinstance(value, bool):
+            yield name, int(value)
+        elif isinstance(value, (int, float)):
+            yield name, value
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "xdive_stage_duration_seconds", "Time spent per request stage", ("stage",)
+)
+REQUEST_SECONDS = registry.histogram(
+    "xdive_http_request_duration_seconds", "HTTP request latency (until the body is sent)",
+    ("method", "route", "status")
+)
+LLM_REQUESTS = registry.counter("xdive_llm_requests_total", "Gemini generate calls", ("mode",))
+LLM_TOKENS = registry.counter("xdive_llm_tokens_total", "Gemini tokens reported by usage metadata", ("kind",))
+
+
+# --- Request timings ---
+
+class RequestTimings:
+    """Stage durations of one HTTP request (shared with its threadpool work)"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        # When the endpoint returned; serialization is measured from here
+        self.endpoint_done: Optional[float] = None
+        self._lock = threading.Lock()
+        self._stages: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._stages[stage] = self._stages.get(stage, 0.0) + seconds
+
+    def stages(self) -> Dict[str, float]:
+        """Stage -> total milliseconds (stages that ran more than once are summed)"""
+        with self._lock:
+            return {stage: seconds * 1000 for stage, seconds in self._stages.items()}
+
+    def header(self) -> str:
+        """Server-Timing header value, with "total" up to now"""
+        entries = [f"{stage};dur={ms:.1f}" for stage, ms in self.stages().items()]
+        entries.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_request_timings: ContextVar[Optional[RequestTimings]] = ContextVar("xdive_request_timings", default=None)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    """Timings of the HTTP request being handled, or None outside a request"""
+    return _request_timings.get()
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """Record a stage duration in the histogram and the current request's timings"""
+    STAGE_SECONDS.observe(seconds, stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def timed(stage: str):
+    """Time the enclosed block as ``stage`` (recorded even if it raises)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def record_llm_usage(mode: Optional[str], prompt_tokens: Optional[int], output_tokens: Optional[int]) -> None:
+    """Count one Gemini call and the tokens it reported"""
+    LLM_REQUESTS.inc(1, mode or "unknown")
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, "prompt")
+    if output_tokens:
+        LLM_TOKENS.inc(output_tokens, "output")
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware collecting stage timings per request
+
+    Adds a ``Server-Timing`` header (stages finished before the response
+    starts, plus "total") and records the request latency by route
+    template, so path parameters do not explode the label set.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _request_timings.set(timings)
+        status = [500]
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timings.header().encode("latin-1")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - timings.start,
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status[0]),
+            )
+
+
+def _mark_endpoint_done(endpoint: Callable) -> Callable:
+    """
+    Wrap an endpoint so the request's timings note when it returned
+
+    Endpoints returning a ready Response encoded their body themselves
+    (and time it as "serialize"), so nothing is left to measure for them.
+    """
+    def done(value=None):
+        timings = _request_timings.get()
+        if timings is not None and not isinstance(value, Response):
+            timings.endpoint_done = time.perf_counter()
+
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_endpoint(*args, **kwargs):
+            value = None
+            try:
+                value = await endpoint(*args, **kwargs)
+                return value
+            finally:
+                done(value)
+        return async_endpoint
+
+    @functools.wraps(endpoint)
+    def sync_endpoint(*args, **kwargs):
+        value = None
+        try:
+            value = endpoint(*args, **kwargs)
+            return value
+        finally:
+            done(value)
+    return sync_endpoint
+
+
+class TimedRoute(APIRoute):
+    """APIRoute reporting the encoding of the endpoint's return value as the "serialize" stage"""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, _mark_endpoint_done(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            response = await handler(request)
+            timings = _request_timings.get()
+            if timings is not None and timings.endpoint_done is not None:
+                observe_stage("serialize", time.perf_counter() - timings.endpoint_done)
+            return response
+
+        return timed_handler
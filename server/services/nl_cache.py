@@ -0,0 +1,430 @@
+"""Two-tier NL-to-SQL cache: exact normalized-question tier + embedding-similarity tier"""
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+import hashlib
+import importlib.util
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from services.cache import LRUCache
+
+
+def _chromadb_available() -> bool:
+    """Whether chromadb is installed (without paying for its import)"""
+    return importlib.util.find_spec("chromadb") is not None
+
+
+# Words that never change the meaning of an analytics question
+STOPWORDS = {
+    "a", "an", "the", "of", "for", "in", "on", "by", "per", "to", "from", "with",
+    "and", "is", "are", "was", "were", "what", "which", "who", "me", "show",
+    "give", "get", "list", "find", "tell", "please", "all", "each", "every",
+    "do", "does", "did", "how", "much", "our", "we", "i", "my",
+    "bring", "brings", "generate", "generated", "earn", "earned",
+}
+
+# Rewordings that ask for the same SQL: plural and abbreviated schema terms
+# and synonymous aggregates. Every other token (aggregates, orderings,
+# dimensions, names, numbers) must match exactly before a similarity hit
+# is trusted.
+SYNONYMS = {
+    "avg": "average", "mean": "average",
+    "many": "count", "number": "count",
+    "maximum": "max", "minimum": "min",
+    "hrs": "hours",
+    "emp": "employee", "employees": "employee", "people": "employee", "person": "employee",
+    "customers": "customer", "client": "customer", "clients": "customer",
+    "skills": "skill", "designations": "designation", "regions": "region",
+    "locations": "location", "projects": "project", "managers": "manager",
+    "months": "month", "monthly": "month", "years": "year", "yearly": "year",
+    "quarters": "quarter", "quarterly": "quarter",
+}
+def normalize_question(question: str) -> str:
+    """
+    Normalize a natural language question for exact-match caching
+
+    Lowercases, drops punctuation and collapses whitespace.
+
+    Args:
+        question: Raw user question
+
+    Returns:
+        Normalized question string
+    """
+    question = re.sub(r"[^\w\s]", " ", question.lower())
+    return " ".join(question.split())
+
+
+def question_terms(question: str) -> frozenset:
+    """
+    Terms a question's SQL depends on: every non-stopword token, with synonyms folded
+
+    Two questions may only share a cached SQL statement through the
+    similarity tier if their terms are identical, so "revenue for Javi
+    Pacheco" never reuses the SQL generated for "revenue for John Smith",
+    nor "average revenue by customer" the SQL for "total revenue by
+    customer" or "bottom 5" the SQL for "top 5".
+    """
+    tokens = normalize_question(question).split()
+    return frozenset(SYNONYMS.get(t, t) for t in tokens if t not in STOPWORDS)
+
+
+class _MemoryVectorIndex:
+    """In-process cosine-similarity index (used when chromadb is unavailable)"""
+
+    backend = "memory"
+
+    def __init__(self):
+        self._ids: List[str] = []
+        self._vectors: List[np.ndarray] = []
+        self._metadata: Dict[str, Dict[str, Any]] = {}
+
+    def load(self) -> List[Dict[str, Any]]:
+        return []
+
+    def add(self, entry_id: str, embedding: List[float], metadata: Dict[str, Any]) -> None:
+        """Insert or replace the entry with this id"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        vector = vector / norm if norm else vector
+        if entry_id in self._metadata:
+            self._vectors[self._ids.index(entry_id)] = vector
+        else:
+            self._ids.append(entry_id)
+            self._vectors.append(vector)
+        self._metadata[entry_id] = metadata
+
+    def query(self, embedding: List[float]) -> Optional[Dict[str, Any]]:
+        if not self._ids:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector = vector / norm
+        scores = np.vstack(self._vectors) @ vector
+        best = int(np.argmax(scores))
+        entry_id = self._ids[best]
+        return {"id": entry_id, "similarity": float(scores[best]), "metadata": self._metadata[entry_id]}
+
+    def delete(self, entry_ids: List[str]) -> None:
+        drop = set(entry_ids)
+        keep = [i for i, entry_id in enumerate(self._ids) if entry_id not in drop]
+        self._ids = [self._ids[i] for i in keep]
+        self._vectors = [self._vectors[i] for i in keep]
+        for entry_id in drop:
+            self._metadata.pop(entry_id, None)
+
+
+class _ChromaVectorIndex:
+    """Persistent cosine-similarity index stored in the server's chroma_db"""
+
+    backend = "chroma"
+
+    def __init__(self, path: str, collection_name: str):
+        import chromadb
+
+        client = chromadb.PersistentClient(path=path)
+        self._collection = client.get_or_create_collection(
+            name=collection_name,
+            metadata={"hnsw:space": "cosine"}
+        )
+
+    def load(self) -> List[Dict[str, Any]]:
+        stored = self._collection.get(include=["metadatas"])
+        return [
+            {"id": entry_id, **metadata}
+            for entry_id, metadata in zip(stored["ids"], stored["metadatas"])
+        ]
+
+    def add(self, entry_id: str, embedding: List[float], metadata: Dict[str, Any]) -> None:
+        self._collection.upsert(ids=[entry_id], embeddings=[embedding], metadatas=[metadata])
+
+    def query(self, embedding: List[float]) -> Optional[Dict[str, Any]]:
+        if self._collection.count() == 0:
+            return None
+        found = self._collection.query(query_embeddings=[embedding], n_results=1)
+        if not found["ids"] or not found["ids"][0]:
+            return None
+        return {
+            "id": found["ids"][0][0],
+            # Chroma reports cosine distance (1 - similarity)
+            "similarity": 1.0 - float(found["distances"][0][0]),
+            "metadata": found["metadatas"][0][0],
+        }
+
+    def delete(self, entry_ids: List[str]) -> None:
+        if entry_ids:
+            self._collection.delete(ids=entry_ids)
+
+
+class SemanticSQLCache:
+    """
+    Caches generated SQL in front of the LLM
+
+    Tier 1 is an exact LRU keyed on the normalized question. Tier 2 embeds
+    the question and reuses the SQL of the most similar cached question when
+    the cosine similarity clears ``similarity_threshold`` and the literal
+    tokens match. Both tiers are bounded by ``max_entries`` and ``ttl_seconds``.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Optional[Callable[[str], List[float]]] = None,
+        max_entries: int = 1000,
+        ttl_seconds: Optional[float] = 3600,
+        similarity_threshold: float = 0.92,
+        persist_path: Optional[str] = None,
+        collection_name: str = "nl_sql_cache"
+    ):
+        """
+        Args:
+            embed_fn: Function returning an embedding vector for a question
+                (None disables the similarity tier)
+            max_entries: Maximum entries per tier before LRU eviction
+            ttl_seconds: Entry lifetime in seconds (None disables expiry)
+            similarity_threshold: Minimum cosine similarity for a tier-2 hit
+            persist_path: chroma_db directory for the similarity tier
+                (in-memory index if None or chromadb is not installed)
+            collection_name: Chroma collection holding the cached questions
+        """
+        self.embed_fn = embed_fn
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+
+        self.exact = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+        self._lock = threading.Lock()
+        self._semantic_lru: "OrderedDict[str, float]" = OrderedDict()
+        self.semantic_hits = 0
+        self.semantic_misses = 0
+        self.semantic_rejections = 0
+        self.semantic_evictions = 0
+        self.embedding_errors = 0
+
+        # The similarity index (chromadb import, persisted entries) opens on first use
+        self._persist_path = persist_path
+        self._collection_name = collection_name
+        self._index = None
+
+    def open_index(self):
+        """
+        Open the similarity index if it is not open yet
+
+        Importing chromadb and reading the persisted entries takes a while,
+        so this runs on the first lookup or store, or from the startup
+        warm-up. Index operations all hold ``_lock``, so a caller racing the
+        load waits for it to finish.
+
+        Returns:
+            The index, or None when the similarity tier is disabled
+        """
+        if self.embed_fn is None or self._index is not None:
+            return self._index
+        with self._lock:
+            if self._index is None:
+                if self._persist_path and _chromadb_available():
+                    self._index = _ChromaVectorIndex(self._persist_path, self._collection_name)
+                else:
+                    self._index = _MemoryVectorIndex()
+                self._load_index()
+        return self._index
+
+    def _load_index(self) -> None:
+        """Rebuild the LRU bookkeeping from entries persisted by earlier runs"""
+        entries = sorted(self._index.load(), key=lambda e: e.get("created_at", 0))
+        now = time.time()
+        expired = []
+        for entry in entries:
+            if self._expired(entry.get("created_at", 0), now):
+                expired.append(entry["id"])
+            else:
+                self._semantic_lru[entry["id"]] = entry.get("created_at", now)
+        self._index.delete(expired)
+        self._evict_semantic()
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def _evict_semantic(self) -> None:
+        """Drop least recently used similarity entries beyond max_entries"""
+        evicted = []
+        while len(self._semantic_lru) > self.max_entries:
+            entry_id, _ = self._semantic_lru.popitem(last=False)
+            evicted.append(entry_id)
+        if evicted:
+            self.semantic_evictions += len(evicted)
+            self._index.delete(evicted)
+
+    def _embed(self, question: str) -> Optional[List[float]]:
+        try:
+            return list(self.embed_fn(question))
+        except Exception as e:
+            self.embedding_errors += 1
+            print(f"WARNING: question embedding failed, skipping similarity cache: {e}")
+            return None
+
+    def lookup(self, question: str) -> Optional[Dict[str, Any]]:
+        """
+        Find cached SQL for a question
+
+        Args:
+            question: Raw user question
+
+        Returns:
+            Dictionary with "sql", "tier" ("exact" or "semantic") and, for
+            similarity hits, "similarity" and "matched_question"; None on a miss
+        """
+        key = normalize_question(question)
+        sql = self.exact.get(key)
+        if sql is not None:
+            return {"sql": sql, "tier": "exact"}
+
+        if self.open_index() is None:
+            return None
+
+        embedding = self._embed(question)
+        if embedding is None:
+            return None
+
+        with self._lock:
+            match = self._index.query(embedding)
+            if match is None or match["similarity"] < self.similarity_threshold:
+                self.semantic_misses += 1
+                return None
+
+            metadata = match["metadata"]
+            if self._expired(metadata.get("created_at", 0), time.time()):
+                self._semantic_lru.pop(match["id"], None)
+                self._index.delete([match["id"]])
+                self.semantic_misses += 1
+                return None
+
+            if question_terms(metadata["question"]) != question_terms(question):
+                # Similar wording but a different aggregate, ordering, dimension or literal
+                self.semantic_rejections += 1
+                self.semantic_misses += 1
+                return None
+
+            if match["id"] in self._semantic_lru:
+                self._semantic_lru.move_to_end(match["id"])
+            self.semantic_hits += 1
+
+        # Promote to the exact tier so the next identical question skips embedding
+        self.exact.set(key, metadata["sql"])
+        return {
+            "sql": metadata["sql"],
+            "tier": "semantic",
+            "similarity": match["similarity"],
+            "matched_question": metadata["question"],
+        }
+
+    def store(self, question: str, sql: str) -> None:
+        """
+        Cache the SQL generated for a question in both tiers
+
+        Args:
+            question: Raw user question
+            sql: SQL statement generated (and successfully executed) for it
+        """
+        key = normalize_question(question)
+        self.exact.set(key, sql)
+
+        if self.open_index() is None:
+            return
+
+        embedding = self._embed(question)
+        if embedding is None:
+            return
+
+        entry_id = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        created_at = time.time()
+        with self._lock:
+            self._index.add(entry_id, embedding, {
+                "question": question,
+                "sql": sql,
+                "created_at": created_at,
+            })
+            self._semantic_lru[entry_id] = created_at
+            self._semantic_lru.move_to_end(entry_id)
+            self._evict_semantic()
+
+    def clear(self) -> None:
+        """Drop every cached question from both tiers"""
+        self.exact.clear()
+        if self.open_index() is None:
+            return
+        with self._lock:
+            self._index.delete(list(self._semantic_lru.keys()))
+            self._semantic_lru.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get hit/miss statistics for both tiers
+
+        Returns:
+            Dictionary with "exact" and "semantic" tier statistics
+        """
+        semantic_lookups = self.semantic_hits + self.semantic_misses
+        return {
+            "exact": self.exact.stats(),
+            "semantic": {
+                "enabled": self.embed_fn is not None,
+                "backend": self._index.backend if self._index is not None else None,
+                "entries": len(self._semantic_lru),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "similarity_threshold": self.similarity_threshold,
+                "hits": self.semantic_hits,
+                "misses": self.semantic_misses,
+                "literal_mismatches": self.semantic_rejections,
+                "evictions": self.semantic_evictions,
+                "embedding_errors": self.embedding_errors,
+                "hit_rate": self.semantic_hits / semantic_lookups if semantic_lookups else 0.0,
+            },
+        }
+
+
+def _env_float(name: str, default: Optional[float]) -> Optional[float]:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return None if value.lower() == "none" else float(value)
+
+
+def build_nl_cache(embed_fn: Optional[Callable[[str], List[float]]]) -> Optional[SemanticSQLCache]:
+    """
+    Build the NL-to-SQL cache from environment configuration
+
+    Environment:
+        NL_CACHE_ENABLED: "false" disables the cache entirely
+        NL_CACHE_SEMANTIC: "false" disables the similarity tier
+        NL_CACHE_MAX_ENTRIES: Entries per tier (default 1000)
+        NL_CACHE_TTL_SECONDS: Entry lifetime (default 3600, "none" = no expiry)
+        NL_CACHE_SIMILARITY_THRESHOLD: Cosine similarity for a hit (default 0.92)
+        NL_CACHE_CHROMA_PATH: chroma_db directory (default server/chroma_db)
+
+    Args:
+        embed_fn: Embedding function for the similarity tier
+
+    Returns:
+        Configured cache, or None when caching is disabled
+    """
+    if os.getenv("NL_CACHE_ENABLED", "true").lower() == "false":
+        return None
+
+    if os.getenv("NL_CACHE_SEMANTIC", "true").lower() == "false":
+        embed_fn = None
+
+    default_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "chroma_db")
+    return SemanticSQLCache(
+        embed_fn=embed_fn,
+        max_entries=int(os.getenv("NL_CACHE_MAX_ENTRIES", "1000")),
+        ttl_seconds=_env_float("NL_CACHE_TTL_SECONDS", 3600),
+        similarity_threshold=_env_float("NL_CACHE_SIMILARITY_THRESHOLD", 0.92),
+        persist_path=os.getenv("NL_CACHE_CHROMA_PATH", default_path),
+    )
@@ -0,0 +1,347 @@
+"""Per-connection cache of server-side prepared statements"""
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import os
+import re
+import threading
+import uuid
+import weakref
+
+from db.connection import behind_transaction_pooler
+from services.sql_validator import SQLValidator
+
+
+# psycopg2 placeholders: %(name)s, the %% escape, and positional %s (not preparable)
+_PLACEHOLDER_RE = re.compile(r"%\((\w+)\)s|%%|%s")
+
+# SQLSTATEs meaning a connection's prepared statements no longer match the server
+_STALE_STATEMENT_CODES = {
+    "0A000",  # cached plan must not change result type (table altered)
+    "26000",  # prepared statement does not exist (session reset by a proxy)
+    "42P05",  # prepared statement already exists (name left over in the session)
+}
+
+
+def to_positional(query: str, parameters: Optional[Dict[str, Any]]) -> Optional[Tuple[str, List[str]]]:
+    """
+    Convert a psycopg2 query to PREPARE syntax
+
+    Named placeholders become $1..$n in order of first appearance. Lists
+    and tuples are not preparable: psycopg2 expands a tuple in place (for
+    ``IN %(ids)s``), which a single $n cannot stand for.
+
+    Args:
+        query: SQL with %(name)s placeholders when parameters are given
+        parameters: Query parameters (None for a literal query)
+
+    Returns:
+        Tuple of (statement text, parameter names per position), or None if
+        the query cannot be prepared
+    """
+    text = query.strip().rstrip(";").rstrip()
+    if not parameters:
+        return text, []
+
+    names: List[str] = []
+    preparable = True
+
+    def replace(match):
+        nonlocal preparable
+        token = match.group(0)
+        if token == "%%":
+            return "%"
+        if token == "%s":
+            preparable = False
+            return token
+        name = match.group(1)
+        if name not in names:
+            names.append(name)
+        return f"${names.index(name) + 1}"
+
+    text = _PLACEHOLDER_RE.sub(replace, text)
+    if not preparable or any(name not in parameters for name in names):
+        return None
+    if any(isinstance(parameters[name], (list, tuple)) for name in names):
+        return None
+    return text, names
+
+
+class _ConnectionStatements:
+    """Prepared statements of one database session, in LRU order"""
+    __slots__ = ("names", "generation")
+
+    def __init__(self, generation: int):
+        # normalized SQL -> (statement name, parameter names)
+        self.names: "OrderedDict[str, Tuple[str, List[str]]]" = OrderedDict()
+        self.generation = generation
+
+
+class PreparedStatementCache:
+    """
+    Server-side prepared statements reused across executions of the same SQL
+
+    Each pooled connection keeps its own LRU of statements keyed by
+    normalized SQL: the first execution PREPAREs the statement, later ones
+    only EXECUTE it, so Postgres skips parsing and (for generic plans)
+    planning. A schema change bumps the generation, and each connection
+    deallocates its statements the next time it is used. Statement names
+    carry the process id and a random suffix, so workers sharing a server
+    session never collide, and only this process's statements are ever
+    deallocated.
+    """
+
+    NAME_PREFIX = "xdive_ps_"
+
+    def __init__(self, max_per_connection: int = 100):
+        """
+        Args:
+            max_per_connection: Statements kept per connection before LRU eviction
+        """
+        self.max_per_connection = max_per_connection
+        self._connections: "weakref.WeakKeyDictionary[Any, _ConnectionStatements]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.unpreparable = 0
+
+    def invalidate(self, *_args) -> None:
+        """Deallocate every connection's statements on its next use (schema change listener)"""
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+
+    @staticmethod
+    def _key(query: str) -> Optional[str]:
+        """Cache key, or None for multi-statement text that PREPARE rejects"""
+        normalized = SQLValidator._normalize_query(query).rstrip(";").rstrip()
+        if not normalized or ";" in normalized:
+            return None
+        return normalized
+
+    def _statements(self, conn) -> Tuple[_ConnectionStatements, bool]:
+        """Get a connection's statements and whether they must be deallocated first"""
+        with self._lock:
+            statements = self._connections.get(conn)
+            if statements is None:
+                statements = self._connections[conn] = _ConnectionStatements(self.generation)
+                return statements, False
+            if statements.generation != self.generation:
+                statements.names.clear()
+                statements.generation = self.generation
+                return statements, True
+            return statements, False
+
+    def _lookup(self, statements: _ConnectionStatements, key: str) -> Optional[Tuple[str, List[str]]]:
+        entry = statements.names.get(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if entry is not None:
+            statements.names.move_to_end(key)
+        return entry
+
+    def _store(self, statements: _ConnectionStatements, key: str, entry: Tuple[str, List[str]]) -> Optional[str]:
+        """Remember a statement; returns the name of an evicted statement, if any"""
+        statements.names[key] = entry
+        if len(statements.names) <= self.max_per_connection:
+            return None
+        _, (evicted, _) = statements.names.popitem(last=False)
+        with self._lock:
+            self.evictions += 1
+        return evicted
+
+    def _forget(self, conn) -> None:
+        with self._lock:
+            self._connections.pop(conn, None)
+
+    def _process_prefix(self) -> str:
+        """Name prefix of this process's statements (recomputed after a fork)"""
+        return f"{self.NAME_PREFIX}{os.getpid()}_"
+
+    def _new_name(self) -> str:
+        return f"{self._process_prefix()}{uuid.uuid4().hex[:16]}"
+
+    def _deallocate_own(self, cur) -> None:
+        """Deallocate this process's statements in the session (not DEALLOCATE ALL)"""
+        cur.execute(
+            "SELECT name FROM pg_prepared_statements WHERE starts_with(name, %s)",
+            (self._process_prefix(),)
+        )
+        for (name,) in cur.fetchall():
+            cur.execute(f"DEALLOCATE {name}")
+
+    # --- psycopg2 (SQL-level PREPARE / EXECUTE) ---
+
+    def execute(
+        self,
+        cur,
+        query: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        setup: Optional[str] = None
+    ) -> None:
+        """
+        Execute a query on a psycopg2 cursor through the connection's prepared statements
+
+        Falls back to a plain execute for text that cannot be prepared.
+
+        Args:
+            cur: psycopg2 cursor
+            query: SQL query string
+            parameters: Optional query parameters
+            setup: Statement run first in the transaction (and again if the
+                transaction is restarted), e.g. SET LOCAL statement_timeout
+        """
+        if setup:
+            cur.execute(setup)
+
+        key = self._key(query)
+        converted = to_positional(query, parameters) if key is not None else None
+        if converted is None:
+            with self._lock:
+                self.unpreparable += 1
+            cur.execute(query, parameters or None)
+            return
+
+        try:
+            self._execute_prepared(cur, key, converted, parameters)
+        except Exception as e:
+            if getattr(e, "pgcode", None) not in _STALE_STATEMENT_CODES:
+                raise
+            # The server-side statements are gone or outdated: start over once
+            cur.connection.rollback()
+            self._forget(cur.connection)
+            self._deallocate_own(cur)
+            if setup:
+                cur.execute(setup)
+            self._execute_prepared(cur, key, converted, parameters)
+
+    def _execute_prepared(self, cur, key: str, converted: Tuple[str, List[str]], parameters) -> None:
+        statements, stale = self._statements(cur.connection)
+        if stale:
+            self._deallocate_own(cur)
+
+        entry = self._lookup(statements, key)
+        if entry is None:
+            text, names = converted
+            entry = (self._new_name(), names)
+            cur.execute(f"PREPARE {entry[0]} AS {text}")
+            evicted = self._store(statements, key, entry)
+            if evicted:
+                cur.execute(f"DEALLOCATE {evicted}")
+
+        name, names = entry
+        if names:
+            values = [parameters[param] for param in names]
+            cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(values))})", values)
+        else:
+            cur.execute(f"EXECUTE {name}")
+
+    # --- psycopg 3 (protocol-level prepared statements) ---
+
+    async def execute_async(
+        self,
+        cur,
+        query: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        setup: Optional[str] = None
+    ) -> None:
+        """
+        Execute a query on a psycopg 3 async cursor as a prepared statement
+
+        psycopg 3 prepares at the protocol level and keeps its own LRU of
+        ``prepared_max`` statements; this mirrors it for hit statistics and
+        schema invalidation. ``setup`` is handled as in execute(). Lists and
+        tuples run unprepared, as in execute().
+        """
+        conn = cur.connection
+        if setup:
+            await cur.execute(setup)
+        key = self._key(query)
+        if key is None or to_positional(query, parameters) is None:
+            with self._lock:
+                self.unpreparable += 1
+            await cur.execute(query, parameters or None)
+            return
+
+        try:
+            await self._execute_prepared_async(cur, key, query, parameters)
+        except Exception as e:
+            if getattr(getattr(e, "diag", None), "sqlstate", None) not in _STALE_STATEMENT_CODES:
+                raise
+            await conn.rollback()
+            self._forget(conn)
+            # psycopg clears its own statement cache when it sees DEALLOCATE ALL
+            await conn.execute("DEALLOCATE ALL")
+            if setup:
+                await cur.execute(setup)
+            await self._execute_prepared_async(cur, key, query, parameters)
+
+    async def _execute_prepared_async(self, cur, key: str, query: str, parameters) -> None:
+        conn = cur.connection
+        statements, stale = self._statements(conn)
+        if stale:
+            await conn.execute("DEALLOCATE ALL")
+        conn.prepared_max = self.max_per_connection
+
+        if self._lookup(statements, key) is None:
+            self._store(statements, key, ("", []))
+        await cur.execute(query, parameters or None, prepare=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get prepared statement statistics
+
+        Returns:
+            Connections tracked, statements held, hit/miss/eviction counters and hit rate
+        """
+        with self._lock:
+            connections = list(self._connections.values())
+            lookups = self.hits + self.misses
+            return {
+                "connections": len(connections),
+                "statements": sum(len(statements.names) for statements in connections),
+                "max_per_connection": self.max_per_connection,
+                "generation": self.generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "unpreparable": self.unpreparable,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def build_prepared_statements() -> Optional[PreparedStatementCache]:
+    """
+    Build the prepared statement cache from environment configuration
+
+    Prepared statements are session state, so they are always disabled
+    behind a transaction-mode pooler (see behind_transaction_pooler): an
+    EXECUTE could reach a server session that never ran the PREPARE.
+
+    Environment:
+        SQL_PREPARED_STATEMENTS: "false" disables prepared statements
+        SQL_PREPARED_MAX_PER_CONNECTION: Statements kept per connection (default 100)
+
+    Returns:
+        Configured cache, or None when disabled
+    """
+    if os.getenv("SQL_PREPARED_STATEMENTS", "true").lower() == "false":
+        return None
+    if behind_transaction_pooler():
+        if os.getenv("SQL_PREPARED_STATEMENTS"):
+            print("WARNING: prepared statements disabled behind the transaction-mode pooler (port 6543)")
+        return None
+
+    return PreparedStatementCache(
+        max_per_connection=int(os.getenv("SQL_PREPARED_MAX_PER_CONNECTION", "100"))
+    )
+
+
+# Global prepared statement cache (None when disabled)
+prepared_statements = build_prepared_statements()
@@ -0,0 +1,506 @@
+"""
+Question-aware prompt building for NL-to-SQL
+
+Instead of the full DDL, each Gemini prompt carries only the tables and
+columns the question refers to, rendered in a compact notation:
+
+    revenue(key text PK, customer text, actual_revenue real, month date)
+    -- revenue.customer: '47D_Acme - X'
+
+Columns are selected by matching the question against column names, a
+few domain synonyms (client -> customer, hours -> actual_hrs, ...) and
+values sampled from pg_stats (customer, employee and manager names, ...).
+Matched values are listed in the prompt so the model can filter on the
+stored spelling. When nothing matches, every table is rendered.
+
+Prompt sizes (estimated, and as reported by Gemini) and LLM latency are
+recorded per request so the savings can be measured.
+"""
+from typing import Any, Dict, List, Optional, Set, Tuple
+import os
+import re
+import threading
+import time
+
+from db.schema import INTERNAL_TABLE_PREFIX, render_ddl
+from services.prompts import get_full_prompt, get_system_prompt
+
+
+# Question words that refer to a column without naming it
+COLUMN_SYNONYMS = {
+    "customer": ["client", "account"],
+    "emp_name": ["employee", "staff", "people", "person", "resource", "who", "name"],
+    "emp_id": ["employee"],
+    "actual_revenue": ["revenue", "earning", "income", "billing", "sale", "profit", "margin"],
+    "cost": ["profit", "margin", "expense", "spend"],
+    "actual_hrs": ["hour", "effort"],
+    "project_manager": ["pm", "manager"],
+    "operations_head": ["head"],
+    "billable_pct": ["billable", "utilization", "billability"],
+    "allocation_pct": ["allocation", "allocated"],
+    "designation": ["role", "title", "level", "grade", "position"],
+    "skill": ["technology", "tech", "stack"],
+    "location": ["city", "country", "office", "site"],
+    "region": ["geography", "geo"],
+    "salary": ["pay", "compensation", "ctc"],
+}
+
+# Words (besides years) that make a question about time; they select the date columns
+TIME_WORDS = {
+    "month", "monthly", "year", "yearly", "annual", "quarter", "quarterly", "week", "weekly",
+    "daily", "date", "period", "trend", "growth", "ytd", "mtd", "qtd", "since", "latest",
+    "recent", "previou", "last", "when", "jan", "january", "feb", "february", "mar", "march",
+    "apr", "april", "may", "jun", "june", "jul", "july", "aug", "august", "sep", "sept",
+    "september", "oct", "october", "nov", "november", "dec", "december",
+}
+
+# Column name parts too generic to select a column on their own
+_GENERIC_PARTS = {"id", "pct", "code", "name", "type"}
+
+# Sampled values are only indexed for text columns
+_TEXT_TYPES = ("text", "character varying", "character", "varchar", "citext")
+
+# Date/time columns, selected when the question is about time
+_TIME_TYPES = ("date", "timestamp")
+
+# Shorter spellings of verbose catalog type names
+_TYPE_ALIASES = {
+    "character varying": "varchar",
+    "timestamp without time zone": "timestamp",
+    "timestamp with time zone": "timestamptz",
+    "double precision": "float8",
+}
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_YEAR_RE = re.compile(r"\b(?:19|20)\d{2}\b")
+
+# Most common values and histogram bounds that ANALYZE sampled per column
+VALUES_QUERY = """
+    SELECT tablename, attname,
+           most_common_vals::text::text[] AS common_values,
+           histogram_bounds::text::text[] AS bounds
+    FROM pg_stats
+    WHERE schemaname = 'public'
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough Gemini token count (about four characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def _stem(word: str) -> str:
+    """Crude plural folding so 'customers' matches 'customer'"""
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _words(text: str) -> List[str]:
+    return [_stem(word) for word in _WORD_RE.findall(text.lower())]
+
+
+def _names_column(column: str, words: Set[str]) -> bool:
+    """True if any word is a (non-generic) part of the column name or a synonym of it"""
+    parts = {_stem(part) for part in column.split("_")} - _GENERIC_PARTS
+    return bool(parts & words) or bool(set(COLUMN_SYNONYMS.get(column, ())) & words)
+
+
+def _short_type(pg_type: str) -> str:
+    for name, alias in _TYPE_ALIASES.items():
+        if pg_type.startswith(name):
+            return alias + pg_type[len(name):]
+    return pg_type
+
+
+def render_compact(
+    schema_info: Dict[str, Any],
+    columns: Optional[Dict[str, List[str]]] = None,
+    values: Optional[Dict[Tuple[str, str], List[str]]] = None
+) -> str:
+    """
+    Render tables as ``name(column type, ...)`` lines
+
+    Args:
+        schema_info: Snapshot in the get_schema_metadata shape
+        columns: Table -> columns to render (default: every public, non-internal table in full)
+        values: (table, column) -> stored values listed after the tables
+
+    Returns:
+        Compact schema string
+    """
+    if columns is None:
+        columns = {
+            name: [col["name"] for col in table["columns"]]
+            for name, table in schema_info["tables"].items()
+            if not name.startswith(INTERNAL_TABLE_PREFIX)
+        }
+
+    lines = []
+    for table_name, selected in columns.items():
+        table = schema_info["tables"][table_name]
+        types = {col["name"]: col["type"] for col in table["columns"]}
+        references = {}
+        for fk in table["foreign_keys"]:
+            for column, referred in zip(fk["constrained_columns"], fk["referred_columns"]):
+                references[column] = f"{fk['referred_table']}.{referred}"
+
+        parts = []
+        for column in selected:
+            part = f"{column} {_short_type(types[column])}"
+            if column in table["primary_keys"]:
+                part += " PK"
+            if column in references:
+                part += f" -> {references[column]}"
+            parts.append(part)
+        lines.append(f"{table_name}({', '.join(parts)})")
+
+    for (table_name, column), stored in (values or {}).items():
+        quoted = ", ".join("'" + value.replace("'", "''") + "'" for value in stored)
+        lines.append(f"-- {table_name}.{column}: {quoted}")
+
+    return "\n".join(lines)
+
+
+class PromptBuilder:
+    """
+    Build compact, question-specific Gemini prompts and record their size
+
+    Sampled column values come from pg_stats (no table scans) and are
+    reloaded every ``values_refresh_seconds`` or after a schema change.
+    """
+
+    def __init__(
+        self,
+        database,
+        select_schema: bool = True,
+        sample_values: bool = True,
+        max_values: int = 5,
+        values_refresh_seconds: float = 3600.0
+    ):
+        """
+        Args:
+            database: DatabaseConnection providing pooled connections
+            select_schema: Send only the relevant tables/columns (False: full DDL)
+            sample_values: Match question words against sampled column values
+            max_values: Values listed per matched column
+            values_refresh_seconds: Age after which sampled values are reloaded
+        """
+        self.db = database
+        self.select_schema = select_schema
+        self.sample_values = sample_values
+        self.max_values = max_values
+        self.values_refresh_seconds = values_refresh_seconds
+        self._lock = threading.Lock()
+        # (table, column) -> sampled values, plus a word -> [(table, column, value)] index
+        self._values: Optional[Dict[Tuple[str, str], List[str]]] = None
+        self._value_words: Dict[str, List[Tuple[str, str, str]]] = {}
+        self._values_loaded_at = 0.0
+        self._system_tokens = estimate_tokens(get_system_prompt())
+
+        self.requests = 0
+        self.selected = 0
+        self.estimated_tokens = 0
+        self.baseline_tokens = 0
+        self.reported_requests = 0
+        self.reported_tokens = 0
+        self.output_tokens = 0
+        self.llm_ms = 0.0
+
+    # ------------------------------------------------------------------
+    # Sampled values
+    # ------------------------------------------------------------------
+
+    @property
+    def values_stale(self) -> bool:
+        """True when the sampled values must be (re)loaded before the next prompt"""
+        return self.select_schema and self.sample_values and (
+            self._values is None
+            or time.time() - self._values_loaded_at >= self.values_refresh_seconds
+        )
+
+    def invalidate(self, snapshot: Optional[Dict[str, Any]] = None) -> None:
+        """Reload sampled values before the next prompt (schema_catalog.on_change callback)"""
+        self._values_loaded_at = 0.0
+
+    def load_values(self) -> int:
+        """
+        Sample distinct values of text columns from pg_stats
+
+        Returns:
+            Number of (table, column) pairs with sampled values
+        """
+        values: Dict[Tuple[str, str], List[str]] = {}
+        with self.db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(VALUES_QUERY)
+                for table_name, column, common_values, bounds in cur.fetchall():
+                    if table_name.startswith(INTERNAL_TABLE_PREFIX):
+                        continue
+                    sampled = list(dict.fromkeys((common_values or []) + (bounds or [])))
+                    if sampled:
+                        values[(table_name, column)] = sampled
+            conn.rollback()
+
+        with self._lock:
+            self._values = values
+            self._value_words = {}
+            self._values_loaded_at = time.time()
+        return len(values)
+
+    def ensure_values(self) -> bool:
+        """
+        Load sampled values if they are missing or stale
+
+        Returns:
+            True if sampled values are available (failures are logged, not raised)
+        """
+        if not self.values_stale:
+            return bool(self._values)
+        try:
+            self.load_values()
+        except Exception as e:
+            # Keep serving prompts without value matching
+            print(f"WARNING: could not sample column values for prompts: {e}")
+            if self._values is None:
+                self._values = {}
+            self._values_loaded_at = time.time()
+        return bool(self._values)
+
+    def _value_index(self, snapshot: Dict[str, Any]) -> Dict[str, List[Tuple[str, str, str]]]:
+        """Word -> (table, column, value) for sampled values of text columns"""
+        with self._lock:
+            if self._value_words or not self._values:
+                return self._value_words
+
+            index: Dict[str, List[Tuple[str, str, str]]] = {}
+            for (table_name, column), sampled in self._values.items():
+                table = snapshot["tables"].get(table_name)
+                if table is None:
+                    continue
+                pg_type = next((col["type"] for col in table["columns"] if col["name"] == column), "")
+                if not pg_type.startswith(_TEXT_TYPES):
+                    continue
+                for value in sampled:
+                    for word in set(_words(value)):
+                        # Short or numeric words say nothing about the column
+                        if len(word) >= 3 and not word.isdigit():
+                            index.setdefault(word, []).append((table_name, column, value))
+            self._value_words = index
+            return index
+
+    # ------------------------------------------------------------------
+    # Prompt building
+    # ------------------------------------------------------------------
+
+    def _match_values(self, words: List[str], question_text: str, snapshot: Dict[str, Any]):
+        """
+        Sampled values mentioned in the question
+
+        A value matches when all of its words occur in the question, or
+        when one of its distinctive words does ('acme' -> '47D_Acme - X').
+        """
+        matches: Dict[Tuple[str, str], List[str]] = {}
+        index = self._value_index(snapshot)
+        for word in dict.fromkeys(words):
+            candidates = index.get(word, ())
+            for table_name, column, value in candidates:
+                value_text = " ".join(_words(value))
+                exact = f" {value_text} " in question_text
+                if exact or len(candidates) <= self.max_values:
+                    found = matches.setdefault((table_name, column), [])
+                    if value not in found:
+                        found.append(value)
+        return {key: found[:self.max_values] for key, found in matches.items()}
+
+    @staticmethod
+    def _time_columns(table: Dict[str, Any]) -> List[str]:
+        """Date columns for a time question: those named after a period (month), else all of them"""
+        dated = [col["name"] for col in table["columns"] if col["type"].startswith(_TIME_TYPES)]
+        named = [name for name in dated if name in TIME_WORDS]
+        return named or dated
+
+    def _select(self, question: str, snapshot: Dict[str, Any]):
+        """
+        Pick the tables and columns a question refers to
+
+        Returns:
+            Tuple of (table -> columns, (table, column) -> matched values);
+            the column map is empty when nothing matched
+        """
+        words = _words(question)
+        word_set = set(words)
+        question_text = f" {' '.join(words)} "
+        about_time = bool(word_set & TIME_WORDS) or bool(_YEAR_RE.search(question))
+        values = self._match_values(words, question_text, snapshot) if self._values else {}
+
+        selected: Dict[str, List[str]] = {}
+        # Time words alone do not say what the question is about
+        relevant = False
+        for table_name, table in snapshot["tables"].items():
+            if table_name.startswith(INTERNAL_TABLE_PREFIX):
+                continue
+
+            table_words = set(_words(table_name.replace("_", " ")))
+            table_named = bool(table_words & word_set)
+            # Words naming the table only select columns when something else does too
+            column_words = word_set - table_words
+            matched: Set[str] = {
+                col["name"] for col in table["columns"]
+                if _names_column(col["name"], column_words) or (table_name, col["name"]) in values
+            }
+            if table_named:
+                relevant = True
+                if not matched:
+                    # The table itself was asked about: give the model every column
+                    matched = {col["name"] for col in table["columns"]}
+                else:
+                    matched.update(col["name"] for col in table["columns"] if _names_column(col["name"], table_words))
+            elif matched:
+                relevant = True
+            if not matched:
+                continue
+            if about_time:
+                matched.update(self._time_columns(table))
+            matched.update(table["primary_keys"])
+            # Keep catalog order so related columns stay together
+            selected[table_name] = [col["name"] for col in table["columns"] if col["name"] in matched]
+
+        if not relevant:
+            return {}, {}
+        return selected, {key: found for key, found in values.items() if key[0] in selected}
+
+    def build(self, question: str, snapshot: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Build the Gemini prompt for a question
+
+        Never touches the database: call ensure_values() beforehand to
+        match against sampled values.
+
+        Args:
+            question: User question
+            snapshot: Schema snapshot, or None to use the full DDL fallback
+
+        Returns:
+            Plan dictionary: "prompt" plus "mode" (selected / full / ddl),
+            "tables", "columns", "values" and token estimates of the prompt
+            and of the full-DDL prompt it replaces ("baseline_tokens")
+        """
+        if snapshot is None:
+            return {"prompt": None, "mode": "ddl"}
+
+        baseline = get_full_prompt(question, render_ddl(snapshot))
+        if not self.select_schema:
+            prompt, mode, columns, values = baseline, "ddl", None, {}
+        else:
+            columns, values = self._select(question, snapshot)
+            mode = "selected" if columns else "full"
+            prompt = get_full_prompt(question, render_compact(snapshot, columns or None, values))
+
+        tables = list(columns) if columns else [
+            name for name in snapshot["tables"] if not name.startswith(INTERNAL_TABLE_PREFIX)
+        ]
+        return {
+            "prompt": prompt,
+            "mode": mode,
+            "tables": tables,
+            "columns": sum(len(names) for names in columns.values()) if columns else None,
+            "values": sum(len(found) for found in values.values()),
+            "estimated_tokens": self._system_tokens + estimate_tokens(prompt),
+            "baseline_tokens": self._system_tokens + estimate_tokens(baseline),
+        }
+
+    # ------------------------------------------------------------------
+    # Measurement
+    # ------------------------------------------------------------------
+
+    def record(self, plan: Dict[str, Any], response: Any, llm_ms: float) -> Dict[str, Any]:
+        """
+        Record the size and latency of one Gemini call
+
+        Args:
+            plan: Result of build() (may lack estimates for the fallback DDL)
+            response: Gemini response; its usage_metadata holds exact token counts
+            llm_ms: Wall time of the Gemini call
+
+        Returns:
+            Per-request summary for the API response
+        """
+        usage = getattr(response, "usage_metadata", None)
+        prompt_tokens = getattr(usage, "prompt_token_count", None) if usage is not None else None
+        output_tokens = getattr(usage, "candidates_token_count", None) if usage is not None else None
+
+        with self._lock:
+            self.requests += 1
+            self.llm_ms += llm_ms
+            if plan.get("mode") == "selected":
+                self.selected += 1
+            if "estimated_tokens" in plan:
+                self.estimated_tokens += plan["estimated_tokens"]
+                self.baseline_tokens += plan["baseline_tokens"]
+            if prompt_tokens:
+                self.reported_requests += 1
+                self.reported_tokens += prompt_tokens
+                self.output_tokens += output_tokens or 0
+
+        return {
+            "mode": plan.get("mode"),
+            "tables": plan.get("tables"),
+            "columns": plan.get("columns"),
+            "values": plan.get("values"),
+            "prompt_tokens": prompt_tokens,
+            "output_tokens": output_tokens,
+            "estimated_tokens": plan.get("estimated_tokens"),
+            "baseline_tokens": plan.get("baseline_tokens"),
+            "llm_ms": round(llm_ms, 3),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Prompt sizes, estimated savings and LLM latency over all recorded requests"""
+        requests = self.requests
+        return {
+            "select_schema": self.select_schema,
+            "sample_values": self.sample_values,
+            "sampled_columns": len(self._values) if self._values else 0,
+            "requests": requests,
+            "selected": self.selected,
+            "estimated_tokens_avg": round(self.estimated_tokens / requests, 1) if requests else 0.0,
+            "baseline_tokens_avg": round(self.baseline_tokens / requests, 1) if requests else 0.0,
+            "estimated_saving": (
+                round(1 - self.estimated_tokens / self.baseline_tokens, 4) if self.baseline_tokens else 0.0
+            ),
+            "prompt_tokens_avg": (
+                round(self.reported_tokens / self.reported_requests, 1) if self.reported_requests else None
+            ),
+            "output_tokens_avg": (
+                round(self.output_tokens / self.reported_requests, 1) if self.reported_requests else None
+            ),
+            "llm_ms_avg": round(self.llm_ms / requests, 3) if requests else 0.0,
+        }
+
+
+def build_prompt_builder() -> PromptBuilder:
+    """
+    Build the prompt builder from environment configuration
+
+    Environment:
+        PROMPT_SCHEMA_SELECTION: "false" sends the full DDL with every prompt
+        PROMPT_SAMPLE_VALUES: "false" disables matching against sampled column values
+        PROMPT_MAX_VALUES: Sampled values listed per matched column (default 5)
+        PROMPT_VALUES_REFRESH_SECONDS: Age after which sampled values are reloaded (default 3600)
+
+    Returns:
+        Configured prompt builder (sampled values load on first use)
+    """
+    from db.connection import db
+    return PromptBuilder(
+        db,
+        select_schema=os.getenv("PROMPT_SCHEMA_SELECTION", "true").lower() != "false",
+        sample_values=os.getenv("PROMPT_SAMPLE_VALUES", "true").lower() != "false",
+        max_values=int(os.getenv("PROMPT_MAX_VALUES", "5")),
+        values_refresh_seconds=float(os.getenv("PROMPT_VALUES_REFRESH_SECONDS", "3600")),
+    )
+
+
+# Global prompt builder instance
+prompt_builder = build_prompt_builder()
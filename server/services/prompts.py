@@ -1,29 +1,19 @@
 def get_system_prompt():
     """
     Returns the strict system instruction for the SQL Coder.
+
+    Sent with every Gemini call, so it is kept to a few dense lines.
     """
-    return """
-    You are a PostgreSQL expert and a strict SQL code generator.
-    
-    YOUR JOB:
-    1. Receive a natural language question and a database schema.
-    2. Output ONLY valid, executable PostgreSQL code.
-    3. Do NOT output markdown code blocks (```sql), explanations, or notes.
-    4. If the question cannot be answered with the schema, return: SELECT 'ERROR: Irrelevant question' as error_msg;
-    
-    RULES:
-    - Use ILIKE for text matching to be case-insensitive.
-    - Use standard aggregations (SUM, AVG, COUNT) where appropriate.
-    - Return plain text SQL only. No formatting.
-    """
+    return (
+        "You are a PostgreSQL expert and a strict SQL code generator.\n"
+        "Given a database schema and a question, output ONLY valid, executable PostgreSQL: "
+        "no markdown code blocks, explanations or notes.\n"
+        "If the schema cannot answer the question, return: SELECT 'ERROR: Irrelevant question' as error_msg;\n"
+        "Schema notation: table(column type, ...); PK marks primary key columns, -> a foreign key. "
+        "A '-- table.column:' line lists values stored in that column; use them verbatim.\n"
+        "Use ILIKE for other text matching (case-insensitive). "
+        "Use standard aggregations (SUM, AVG, COUNT) where appropriate."
+    )
 
 def get_full_prompt(question, ddl_schema):
-    return f"""
-    ### SCHEMA:
-    {ddl_schema}
-    
-    ### QUESTION:
-    {question}
-    
-    ### SQL:
-    """
\ No newline at end of file
+    return f"### SCHEMA:\n{ddl_schema}\n### QUESTION:\n{question}\n### SQL:\n"
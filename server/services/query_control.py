@@ -0,0 +1,132 @@
+"""Statement timeouts per request class and server-side cancellation of running queries"""
+from typing import Awaitable, Callable, Optional, TypeVar
+import asyncio
+import os
+import threading
+
+
+# Request classes and their default statement_timeout (milliseconds)
+SQL = "sql"              # Manual SQL from /api/query/sql
+NL = "nl"                # Gemini-generated SQL
+DASHBOARD = "dashboard"  # Server-side dashboard rollups
+STREAM = "stream"        # Streamed (NDJSON) exports
+
+DEFAULT_TIMEOUTS_MS = {
+    SQL: 30000,
+    NL: 15000,
+    DASHBOARD: 60000,
+    STREAM: 300000,
+}
+
+# Seconds between client-disconnect checks while a query runs
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "0.5"))
+
+T = TypeVar("T")
+
+
+def statement_timeout_ms(request_class: str) -> int:
+    """
+    statement_timeout for a request class
+
+    Overridable per class with SQL_TIMEOUT_<CLASS>_MS (e.g. SQL_TIMEOUT_NL_MS);
+    0 disables the timeout.
+    """
+    default = DEFAULT_TIMEOUTS_MS.get(request_class, DEFAULT_TIMEOUTS_MS[SQL])
+    return int(os.getenv(f"SQL_TIMEOUT_{request_class.upper()}_MS", str(default)))
+
+
+def timeout_statement(request_class: str) -> str:
+    """SET LOCAL statement applying the class timeout to the current transaction"""
+    return f"SET LOCAL statement_timeout = {statement_timeout_ms(request_class)}"
+
+
+class QueryCancelledError(Exception):
+    """The query was cancelled because the client went away"""
+
+
+class QueryCancellation:
+    """
+    Handle for cancelling a running query from another thread or task
+
+    The execution path attaches the psycopg2 connection it runs on;
+    cancel() then interrupts the statement on the server with
+    connection.cancel(), so the worker thread returns and the connection
+    goes back to the pool instead of running to completion.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn = None
+        self.cancelled = False
+
+    def attach(self, conn) -> None:
+        """Register the connection the query runs on"""
+        with self._lock:
+            if self.cancelled:
+                raise QueryCancelledError("Query cancelled: client disconnected")
+            self._conn = conn
+
+    def detach(self) -> None:
+        """Forget the connection once the query finished"""
+        with self._lock:
+            self._conn = None
+
+    def cancel(self) -> None:
+        """Cancel the attached query (and any query attached later)"""
+        with self._lock:
+            self.cancelled = True
+            conn = self._conn
+        if conn is not None:
+            try:
+                conn.cancel()
+            except Exception as e:
+                print(f"WARNING: query cancellation failed: {e}")
+
+
+def _consume_outcome(task: "asyncio.Future") -> None:
+    # Abandoned tasks still finish; retrieve the outcome so asyncio does not log it
+    if not task.cancelled():
+        task.exception()
+
+
+async def run_until_disconnected(
+    request,
+    run: Callable[[QueryCancellation], Awaitable[T]],
+    poll_interval: Optional[float] = None
+) -> T:
+    """
+    Await ``run`` while watching the HTTP client
+
+    If the client disconnects first, the running query is cancelled on the
+    server and QueryCancelledError is raised.
+
+    Args:
+        request: Starlette Request of the caller
+        run: Coroutine function taking the QueryCancellation handle
+        poll_interval: Seconds between disconnect checks
+
+    Returns:
+        The result of ``run``
+    """
+    cancellation = QueryCancellation()
+    task = asyncio.ensure_future(run(cancellation))
+    interval = poll_interval or DISCONNECT_POLL_SECONDS
+
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                # psycopg2 (threadpool) queries need a server-side cancel;
+                # psycopg 3 cancels on the server when its task is cancelled
+                cancellation.cancel()
+                task.cancel()
+                task.add_done_callback(_consume_outcome)
+                raise QueryCancelledError("Query cancelled: client disconnected")
+    except asyncio.CancelledError:
+        cancellation.cancel()
+        task.cancel()
+        task.add_done_callback(_consume_outcome)
+        raise
+
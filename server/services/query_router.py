@@ -2,6 +2,8 @@
 from typing import Dict, Any, Optional
 
 from services.sql_engine import sql_engine
+from services import query_control
+from services.query_control import QueryCancellation
 from services.nlp_engine import nlp_engine
 
 
@@ -31,6 +33,52 @@ class QueryRouter:
         result["mode"] = "sql"
         return result
     
+    async def execute_sql_query_async(
+        self,
+        query: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        cancellation: Optional[QueryCancellation] = None,
+        approximate: bool = False,
+        row_budget: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Route SQL query to SQL engine without blocking the event loop
+        
+        Args:
+            query: SQL query string
+            parameters: Optional query parameters
+            cancellation: Handle that cancels the query if the client disconnects
+            approximate: Allow aggregates to be estimated from the revenue sample
+            row_budget: Optional row cap for raw-row queries
+            
+        Returns:
+            Query execution result
+        """
+        result = await self.sql_engine.execute_query_async(
+            query, parameters, query_control.SQL, cancellation, approximate, row_budget
+        )
+        result["mode"] = "sql"
+        return result
+    
+    def stream_sql_query(
+        self,
+        query: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        itersize: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Route SQL query to SQL engine in streaming mode
+        
+        Args:
+            query: SQL query string
+            parameters: Optional query parameters
+            itersize: Optional rows per server-side fetch
+            
+        Returns:
+            Dictionary with an NDJSON chunk iterator or a validation error
+        """
+        return self.sql_engine.stream_query(query, parameters, itersize)
+    
     def execute_nlp_query(
         self, 
         nl_query: str, 
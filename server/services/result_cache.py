@@ -0,0 +1,149 @@
+"""Result-set cache keyed by normalized SQL, parameters and data version"""
+from typing import Any, Dict, Optional, Tuple
+import json
+import os
+import threading
+
+from services.cache import LRUCache
+from services.result_formats import json_default
+from services.sql_validator import SQLValidator
+
+
+# Rows serialized to estimate the size of a cached result
+SIZE_SAMPLE_ROWS = 100
+
+
+def estimate_result_bytes(result: Dict[str, Any]) -> int:
+    """
+    Estimate the in-memory footprint of a query result
+
+    Serializes a sample of the rows and scales it to the full row count,
+    which is far cheaper than encoding large results in full.
+
+    Args:
+        result: SQLEngine result dictionary
+
+    Returns:
+        Approximate size in bytes
+    """
+    rows = result.get("data") or []
+    overhead = 256 + 32 * len(result.get("columns") or [])
+    if not rows:
+        return overhead
+
+    sample = rows[:SIZE_SAMPLE_ROWS]
+    sample_bytes = len(json.dumps(sample, default=json_default))
+    # Python objects take roughly 3x their JSON encoding
+    return overhead + 3 * sample_bytes * len(rows) // len(sample)
+
+
+class ResultCache:
+    """
+    Memory-bounded LRU cache of successful SELECT results
+
+    Entries are keyed by (normalized SQL, parameters, data version).
+    Ingestion bumps the data version, which makes every older entry
+    unreachable and drops it from memory.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: Optional[float] = 300
+    ):
+        """
+        Args:
+            max_entries: Maximum number of cached results
+            max_bytes: Total memory budget in bytes
+            ttl_seconds: Entry lifetime in seconds (None disables expiry)
+        """
+        self._cache = LRUCache(
+            max_entries=max_entries,
+            ttl_seconds=ttl_seconds,
+            max_bytes=max_bytes,
+            sizeof=estimate_result_bytes
+        )
+        self._version_lock = threading.Lock()
+        self.data_version = 0
+        self.invalidations = 0
+
+    def make_key(self, query: str, parameters: Optional[Dict[str, Any]] = None) -> Tuple[str, str, int]:
+        """
+        Build the cache key for a query
+
+        Args:
+            query: SQL query string
+            parameters: Optional query parameters
+
+        Returns:
+            Tuple of (normalized SQL, canonical parameters, data version)
+        """
+        params = json.dumps(parameters, sort_keys=True, default=json_default) if parameters else ""
+        return SQLValidator._normalize_query(query), params, self.data_version
+
+    def get(self, key: Tuple[str, str, int]) -> Optional[Dict[str, Any]]:
+        """Look up a cached result by key"""
+        return self._cache.get(key)
+
+    def set(self, key: Tuple[str, str, int], result: Dict[str, Any]) -> None:
+        """Cache a successful result (ignored if stamped with an old data version)"""
+        if key[2] != self.data_version:
+            return
+        self._cache.set(key, result)
+
+    def bump_data_version(self) -> int:
+        """
+        Invalidate every cached result after the underlying data changed
+
+        Returns:
+            The new data version
+        """
+        with self._version_lock:
+            self.data_version += 1
+            self.invalidations += 1
+            self._cache.clear()
+            return self.data_version
+
+    def clear(self) -> None:
+        """Drop every cached result without changing the data version"""
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics
+
+        Returns:
+            LRU statistics plus the current data version
+        """
+        stats = self._cache.stats()
+        stats["data_version"] = self.data_version
+        stats["invalidations"] = self.invalidations
+        return stats
+
+
+def build_result_cache() -> Optional[ResultCache]:
+    """
+    Build the result cache from environment configuration
+
+    Environment:
+        RESULT_CACHE_ENABLED: "false" disables the cache
+        RESULT_CACHE_MAX_ENTRIES: Maximum cached results (default 1000)
+        RESULT_CACHE_MAX_MB: Memory budget in MiB (default 64)
+        RESULT_CACHE_TTL_SECONDS: Entry lifetime (default 300)
+
+    Returns:
+        Configured cache, or None when caching is disabled
+    """
+    if os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "false":
+        return None
+
+    return ResultCache(
+        max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1000")),
+        max_bytes=int(float(os.getenv("RESULT_CACHE_MAX_MB", "64")) * 1024 * 1024),
+        ttl_seconds=float(os.getenv("RESULT_CACHE_TTL_SECONDS", "300")),
+    )
+
+
+# Global result cache instance (None when disabled)
+result_cache = build_result_cache()
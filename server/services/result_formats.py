@@ -0,0 +1,281 @@
+"""Response format negotiation - row, columnar JSON and Arrow IPC encodings"""
+from typing import Dict, Any, List, Optional
+import functools
+import importlib.util
+import json
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:  # falls back to the stdlib encoder
+    orjson = None
+
+
+ROWS = "rows"
+COLUMNAR = "columnar"
+ARROW = "arrow"
+
+FORMATS = (ROWS, COLUMNAR, ARROW)
+
+JSON_MEDIA_TYPE = "application/json"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+COLUMNAR_MEDIA_TYPE = "application/vnd.xdive.columnar+json"
+SSE_MEDIA_TYPE = "text/event-stream"
+
+# PostgreSQL type OIDs (cursor.description type_code) -> logical type names
+PG_TYPE_NAMES = {
+    16: "boolean",
+    20: "integer", 21: "integer", 23: "integer", 26: "integer",
+    700: "float", 701: "float",
+    1700: "numeric",
+    18: "text", 19: "text", 25: "text", 1042: "text", 1043: "text", 2950: "text",
+    1082: "date",
+    1083: "time",
+    1114: "timestamp", 1184: "timestamp",
+    114: "json", 3802: "json",
+}
+
+
+def json_default(value: Any) -> Any:
+    """JSON fallback for PostgreSQL types the stdlib encoder does not handle"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime, dt_time)):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_json(payload: Any) -> bytes:
+    """
+    Encode a payload as compact UTF-8 JSON
+
+    Uses orjson when it is installed (dates, times and timestamps are
+    encoded natively, Decimal through json_default), otherwise the stdlib
+    encoder with json_default. The output is the same except for NaN and
+    infinity, which orjson writes as null.
+
+    Args:
+        payload: JSON-compatible value (result rows may hold PostgreSQL types)
+
+    Returns:
+        UTF-8 encoded JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(payload, default=json_default)
+    return json.dumps(payload, default=json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> bytes:
+    """
+    Encode one Server-Sent Event
+
+    Args:
+        event: Event name (the ``event:`` field)
+        data: Payload, sent as single-line JSON in the ``data:`` field
+
+    Returns:
+        UTF-8 encoded event, terminated by a blank line
+    """
+    return b"event: " + event.encode("utf-8") + b"\ndata: " + encode_json(data) + b"\n\n"
+
+
+def pg_type_name(type_code: Any) -> str:
+    """
+    Map a cursor.description type code to a logical type name
+
+    Args:
+        type_code: PostgreSQL type OID from the cursor description
+
+    Returns:
+        Logical type name ("unknown" for unmapped types)
+    """
+    return PG_TYPE_NAMES.get(type_code, "unknown")
+
+
+def infer_type_name(values: List[Any]) -> str:
+    """
+    Infer a logical type name from the first non-null value of a column
+
+    Used where no cursor description is available (e.g. DataFrame results).
+    """
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            return "boolean"
+        if isinstance(value, int):
+            return "integer"
+        if isinstance(value, float):
+            return "float"
+        if isinstance(value, Decimal):
+            return "numeric"
+        if isinstance(value, datetime):
+            return "timestamp"
+        if isinstance(value, date):
+            return "date"
+        if isinstance(value, str):
+            return "text"
+        return "unknown"
+    return "unknown"
+
+
+def negotiate_format(format_param: Optional[str], accept: Optional[str]) -> Optional[str]:
+    """
+    Pick the response format from the ?format= parameter or Accept header
+
+    The explicit query parameter wins over the Accept header.
+
+    Args:
+        format_param: Value of the ``format`` query parameter, if any
+        accept: Value of the Accept request header, if any
+
+    Returns:
+        One of FORMATS, or None if the requested format is not supported
+    """
+    if format_param:
+        fmt = format_param.strip().lower()
+        if fmt == "json":
+            return ROWS
+        return fmt if fmt in FORMATS else None
+
+    if accept:
+        if ARROW_MEDIA_TYPE in accept:
+            return ARROW
+        if COLUMNAR_MEDIA_TYPE in accept:
+            return COLUMNAR
+
+    return ROWS
+
+
+def to_columns(rows: List[Dict[str, Any]], columns: List[str]) -> Dict[str, List[Any]]:
+    """
+    Transpose row dictionaries into per-column value arrays
+
+    Args:
+        rows: Result rows as dictionaries
+        columns: Column names in result order
+
+    Returns:
+        Dictionary mapping each column name to its list of values
+    """
+    return {col: [row.get(col) for row in rows] for col in columns}
+
+
+def build_schema(
+    columns: List[str],
+    column_data: Dict[str, List[Any]],
+    column_types: Optional[List[str]] = None
+) -> List[Dict[str, str]]:
+    """
+    Build the schema header for a columnar response
+
+    Args:
+        columns: Column names in result order
+        column_data: Per-column value arrays (used when types are unknown)
+        column_types: Optional logical type per column from the cursor
+
+    Returns:
+        List of {"name", "type"} entries
+    """
+    schema = []
+    for i, col in enumerate(columns):
+        type_name = column_types[i] if column_types and i < len(column_types) else "unknown"
+        if type_name == "unknown":
+            type_name = infer_type_name(column_data[col])
+        schema.append({"name": col, "type": type_name})
+    return schema
+
+
+def to_columnar(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a row-oriented query result into the columnar JSON shape
+
+    Every key other than "data" is passed through unchanged; "data" becomes
+    a column -> values mapping and a "schema" header is added.
+
+    Args:
+        result: Result dictionary with "data" rows and "columns" names
+
+    Returns:
+        Columnar result dictionary
+    """
+    rows = result.get("data") or []
+    columns = result.get("columns") or (list(rows[0].keys()) if rows else [])
+    column_data = to_columns(rows, columns)
+
+    columnar = {key: value for key, value in result.items() if key != "data"}
+    columnar["format"] = COLUMNAR
+    columnar["columns"] = columns
+    columnar["schema"] = build_schema(columns, column_data, result.get("column_types"))
+    columnar["data"] = column_data
+    return columnar
+
+
+@functools.lru_cache(maxsize=None)
+def _pyarrow():
+    """pyarrow, imported on the first Arrow response (None when it is not installed)"""
+    try:
+        import pyarrow
+    except ImportError:  # Arrow IPC responses are optional
+        return None
+    return pyarrow
+
+
+def _arrow_type(pa, type_name: str):
+    """Map a logical type name to an Arrow type (None lets pyarrow infer it)"""
+    return {
+        "boolean": pa.bool_(),
+        "integer": pa.int64(),
+        "float": pa.float64(),
+        "text": pa.string(),
+        "date": pa.date32(),
+    }.get(type_name)
+
+
+def arrow_available() -> bool:
+    """Check whether Arrow IPC encoding is available (pyarrow installed)"""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def to_arrow_ipc(result: Dict[str, Any], metadata_keys: Optional[List[str]] = None) -> bytes:
+    """
+    Encode a query result as an Arrow IPC stream
+
+    Scalar result fields listed in ``metadata_keys`` (e.g. sql, row_count)
+    travel in the Arrow schema metadata.
+
+    Args:
+        result: Result dictionary with "data" rows and "columns" names
+        metadata_keys: Result keys to copy into the schema metadata
+
+    Returns:
+        Arrow IPC stream bytes
+    """
+    pa = _pyarrow()
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed; Arrow responses are unavailable")
+
+    columnar = to_columnar(result)
+
+    arrays = []
+    fields = []
+    for entry in columnar["schema"]:
+        values = columnar["data"][entry["name"]]
+        arrow_type = _arrow_type(pa, entry["type"])
+        array = pa.array(values, type=arrow_type) if arrow_type else pa.array(values)
+        arrays.append(array)
+        fields.append(pa.field(entry["name"], array.type))
+
+    metadata = {
+        key: str(result[key])
+        for key in (metadata_keys or [])
+        if result.get(key) is not None
+    }
+    schema = pa.schema(fields, metadata=metadata or None)
+    table = pa.Table.from_arrays(arrays, schema=schema)
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,621 @@
+"""
+Incrementally maintained revenue rollups and transparent aggregate query rewriting
+
+One summary table per dimension holds (month, dimension) groups with the
+sum, count, min and max of every measure. Ingestion refreshes only the
+months it touched, in the same transaction as the load. SQLEngine rewrites
+eligible aggregates over ``revenue`` to read the (much smaller) rollup.
+
+Usage (from the server directory):
+    python -m services.rollups build      # create (or recreate) the rollup tables
+    python -m services.rollups refresh    # recompute them after writes outside ingestion
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import os
+import re
+import sys
+import threading
+import time
+
+from psycopg2 import sql
+
+from db.schema import INTERNAL_TABLE_PREFIX
+from services.sql_validator import SQLValidator
+
+
+SOURCE_TABLE = "revenue"
+TIME_DIMENSION = "month"
+DIMENSIONS = ("customer", "skill", "designation", "region", "project_manager")
+MEASURES = ("actual_revenue", "actual_hrs", "cost", "salary", "support_expense", "allocation_pct", "billable_pct")
+
+# Aggregates that can be recombined from per-group partials
+REWRITABLE_AGGREGATES = {"SUM", "COUNT", "AVG", "MIN", "MAX"}
+
+# Words that may precede "(" in an eligible query: row-level (scalar)
+# functions and keywords. Any other function could be an aggregate that
+# does not recombine (string_agg, stddev, ...), so the query is left alone.
+SCALAR_PAREN_WORDS = {
+    "ROUND", "COALESCE", "NULLIF", "GREATEST", "LEAST", "ABS", "CEIL", "CEILING", "FLOOR",
+    "DATE_TRUNC", "DATE_PART", "EXTRACT", "TO_CHAR", "TO_DATE", "MAKE_DATE", "CAST",
+    "UPPER", "LOWER", "INITCAP", "TRIM", "BTRIM", "LTRIM", "RTRIM", "LENGTH", "SUBSTRING",
+    "SUBSTR", "LEFT", "RIGHT", "CONCAT", "REPLACE", "SPLIT_PART", "POSITION",
+    "SELECT", "WHERE", "HAVING", "AND", "OR", "NOT", "IN", "BY", "AS", "THEN", "ELSE",
+    "WHEN", "CASE", "BETWEEN", "LIKE", "ILIKE", "IS", "ON", "ANY", "ARRAY",
+}
+
+# Constructs whose meaning changes when rows are pre-aggregated
+DISALLOWED_WORDS = {
+    "JOIN", "UNION", "INTERSECT", "EXCEPT", "OVER", "WINDOW", "GROUPING", "ROLLUP",
+    "CUBE", "SETS", "DISTINCT", "LATERAL", "WITH", "FILTER", "WITHIN", "TABLESAMPLE",
+    "ONLY", "FOR", "INTO", "VALUES", "RECURSIVE",
+}
+
+CLAUSE_WORDS = {"WHERE", "GROUP", "HAVING", "ORDER", "LIMIT", "OFFSET"}
+
+_TOKEN_RE = re.compile(
+    r"""
+      (?P<string>'(?:[^']|'')*')
+    | (?P<prefixed>[EeBbXxUu]&?')
+    | (?P<quoted>")
+    | (?P<dollar>\$)
+    | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    | (?P<word>[A-Za-z_][A-Za-z0-9_]*)
+    | (?P<space>\s+)
+    | (?P<op>::|<>|!=|<=|>=|\|\||.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+INTEGER_TYPES = {"smallint", "integer", "bigint"}
+FLOAT_TYPES = {"real", "double precision"}
+
+# Key of the transaction-level advisory lock serializing rollup writers
+REFRESH_LOCK = f"{INTERNAL_TABLE_PREFIX}rollup_{SOURCE_TABLE}"
+
+# PostgreSQL 15 added NULLS NOT DISTINCT (one NULL month or dimension group per key)
+_NULLS_NOT_DISTINCT_VERSION = 150000
+
+
+def rollup_table(dimension: Optional[str]) -> str:
+    """Name of the rollup table for a dimension (None: the month-only rollup)"""
+    return f"{INTERNAL_TABLE_PREFIX}rollup_{SOURCE_TABLE}_{dimension or TIME_DIMENSION}"
+
+
+def _partial_sum_type(base_type: str) -> str:
+    """Storage type of a per-group sum: exact for integers, float8 for floats"""
+    return "double precision" if base_type in FLOAT_TYPES else "numeric"
+
+
+def _sum_result_type(base_type: str) -> str:
+    """Result type PostgreSQL gives SUM() over the base column"""
+    if base_type in ("smallint", "integer"):
+        return "bigint"
+    if base_type in FLOAT_TYPES:
+        return base_type
+    return "numeric"
+
+
+class _Token:
+    __slots__ = ("kind", "text", "upper", "start", "end")
+
+    def __init__(self, kind: str, text: str, start: int, end: int):
+        self.kind = kind
+        self.text = text
+        self.upper = text.upper() if kind == "word" else text
+        self.start = start
+        self.end = end
+
+
+class RollupManager:
+    """Builds, refreshes and rewrites queries onto the revenue rollups"""
+
+    def __init__(self, database, rewrite_enabled: bool = True, retry_seconds: float = 30.0):
+        """
+        Args:
+            database: DatabaseConnection providing pooled connections
+            rewrite_enabled: Rewrite eligible queries onto the rollups
+            retry_seconds: After a failed catalog read, requests skip the
+                rollups for this long instead of querying again
+        """
+        self.db = database
+        self.rewrite_enabled = rewrite_enabled
+        self.retry_seconds = retry_seconds
+        self._lock = threading.Lock()
+        self._failed_at: Optional[float] = None
+        self._column_types: Dict[str, str] = {}
+        self._tables: Dict[Optional[str], str] = {}
+        self.loaded = False
+        self.rewrites = 0
+        self.skipped = 0
+        self.refreshes = 0
+        self.refreshed_at: Optional[float] = None
+
+    # --- Catalog state ---
+
+    def _read_state(self, cur) -> None:
+        cur.execute(
+            """
+            SELECT a.attname, format_type(a.atttypid, a.atttypmod)
+            FROM pg_attribute a
+            WHERE a.attrelid = to_regclass(%s) AND a.attnum > 0 AND NOT a.attisdropped
+            """,
+            (SOURCE_TABLE,)
+        )
+        column_types = dict(cur.fetchall())
+
+        wanted = {dim: rollup_table(dim) for dim in (None,) + DIMENSIONS}
+        cur.execute(
+            "SELECT relname FROM pg_class WHERE relname = ANY(%s) AND relkind = 'r'",
+            (list(wanted.values()),)
+        )
+        existing = {row[0] for row in cur.fetchall()}
+
+        self._column_types = column_types
+        self._tables = {dim: table for dim, table in wanted.items() if table in existing}
+        self.loaded = True
+
+    def load(self) -> None:
+        """Read the revenue column types and which rollup tables exist"""
+        with self._lock:
+            with self.db.get_connection() as conn:
+                with conn.cursor() as cur:
+                    self._read_state(cur)
+                conn.rollback()
+
+    def ensure_loaded(self) -> bool:
+        """
+        Load the catalog state if needed
+
+        Returns:
+            False when the database is unreachable; the failure is remembered
+            for retry_seconds so requests do not each wait on the database
+        """
+        if self.loaded:
+            return True
+        failed_at = self._failed_at
+        if failed_at is not None and time.time() - failed_at < self.retry_seconds:
+            return False
+        try:
+            self.load()
+            self._failed_at = None
+        except Exception as e:
+            self._failed_at = time.time()
+            print(f"WARNING: rollup state unavailable (retrying in {self.retry_seconds:g}s): {e}")
+        return self.loaded
+
+    def invalidate(self, *_args) -> None:
+        """Re-read the catalog state on next use (schema change listener)"""
+        self.loaded = False
+        self._failed_at = None
+
+    @property
+    def available(self) -> bool:
+        """Whether the month rollup (and so at least totals) can be used"""
+        return None in self._tables
+
+    def _dimensions(self) -> List[Optional[str]]:
+        """Dimensions present in the source table, None being the month-only rollup"""
+        return [None] + [dim for dim in DIMENSIONS if dim in self._column_types]
+
+    def _measures(self) -> List[str]:
+        return [m for m in MEASURES if m in self._column_types]
+
+    # --- Build / refresh ---
+
+    def _select(self, dimension: Optional[str], filtered: bool) -> sql.Composed:
+        """Aggregate the source into (month, dimension) groups"""
+        keys = [TIME_DIMENSION] + ([dimension] if dimension else [])
+        items = [sql.Identifier(key) for key in keys]
+        items.append(sql.SQL("COUNT(*) AS row_count"))
+        for measure in self._measures():
+            column = sql.Identifier(measure)
+            items.extend([
+                sql.SQL("SUM({}::{}) AS {}").format(
+                    column, sql.SQL(_partial_sum_type(self._column_types[measure])),
+                    sql.Identifier(f"{measure}_sum")
+                ),
+                sql.SQL("COUNT({}) AS {}").format(column, sql.Identifier(f"{measure}_count")),
+                sql.SQL("MIN({}) AS {}").format(column, sql.Identifier(f"{measure}_min")),
+                sql.SQL("MAX({}) AS {}").format(column, sql.Identifier(f"{measure}_max")),
+            ])
+
+        query = sql.SQL("SELECT {} FROM {}").format(sql.SQL(", ").join(items), sql.Identifier(SOURCE_TABLE))
+        if filtered:
+            query += self._month_filter()
+        return query + sql.SQL(" GROUP BY {}").format(sql.SQL(", ").join(map(sql.Identifier, keys)))
+
+    def _month_filter(self) -> sql.Composed:
+        month_type = self._column_types.get(TIME_DIMENSION, "date")
+        return sql.SQL(" WHERE {0} = ANY(%(months)s::{1}[]) OR ({0} IS NULL AND %(null_month)s)").format(
+            sql.Identifier(TIME_DIMENSION), sql.SQL(month_type)
+        )
+
+    @staticmethod
+    def _lock_writers(cur) -> None:
+        """
+        Serialize rollup writers until the end of the current transaction
+
+        A refresh deletes and re-inserts groups; two overlapping ones running
+        concurrently would each insert the same groups from their own snapshot.
+        """
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (REFRESH_LOCK,))
+
+    def _create_key_index(self, cur, dimension: Optional[str]) -> None:
+        """Unique index on (month, dimension): a duplicated group fails the write"""
+        table = rollup_table(dimension)
+        keys = [TIME_DIMENSION] + ([dimension] if dimension else [])
+        cur.execute("SHOW server_version_num")
+        nulls = " NULLS NOT DISTINCT" if int(cur.fetchone()[0]) >= _NULLS_NOT_DISTINCT_VERSION else ""
+        cur.execute(sql.SQL("CREATE UNIQUE INDEX {} ON {} ({})" + nulls).format(
+            sql.Identifier(f"{table}_key"), sql.Identifier(table),
+            sql.SQL(", ").join(map(sql.Identifier, keys))
+        ))
+
+    def build(self) -> Dict[str, Any]:
+        """
+        (Re)create every rollup table from the source table
+
+        Returns:
+            Dictionary with the tables built, their row counts and seconds
+        """
+        start_time = time.time()
+        counts = {}
+        with self._lock:
+            with self.db.get_connection() as conn:
+                try:
+                    with conn.cursor() as cur:
+                        self._lock_writers(cur)
+                        self._read_state(cur)
+                        if TIME_DIMENSION not in self._column_types:
+                            raise Exception(f"Table '{SOURCE_TABLE}' has no '{TIME_DIMENSION}' column")
+
+                        for dimension in self._dimensions():
+                            table = sql.Identifier(rollup_table(dimension))
+                            cur.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(table))
+                            cur.execute(sql.SQL("CREATE TABLE {} AS ").format(table) + self._select(dimension, False))
+                            counts[rollup_table(dimension)] = cur.rowcount
+                            # Leading month column also serves the month filters of refresh
+                            self._create_key_index(cur, dimension)
+                            if dimension:
+                                cur.execute(sql.SQL("CREATE INDEX ON {} ({})").format(table, sql.Identifier(dimension)))
+                            cur.execute(sql.SQL("ANALYZE {}").format(table))
+                        self._read_state(cur)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+
+        self.refreshes += 1
+        self.refreshed_at = time.time()
+        return {"tables": counts, "seconds": round(time.time() - start_time, 3)}
+
+    def refresh(self, cur, months: Optional[Sequence[Any]] = None) -> int:
+        """
+        Refresh the rollups for the given months inside the caller's transaction
+
+        Args:
+            cur: psycopg2 cursor of the transaction that changed the source
+            months: Months whose rows changed (None refreshes everything)
+
+        Returns:
+            Number of rollup rows written (0 when the rollups are not installed)
+        """
+        # Held until the caller commits, so the next refresh sees this one's rows
+        self._lock_writers(cur)
+        self._read_state(cur)
+        if not self.available:
+            return 0
+
+        if months is None:
+            params = None
+        else:
+            months = list(months)
+            params = {
+                "months": [month for month in months if month is not None],
+                "null_month": any(month is None for month in months),
+            }
+
+        written = 0
+        for dimension in self._dimensions():
+            if dimension not in self._tables:
+                continue
+            table = sql.Identifier(self._tables[dimension])
+            if params is None:
+                cur.execute(sql.SQL("TRUNCATE {}").format(table))
+                cur.execute(sql.SQL("INSERT INTO {} ").format(table) + self._select(dimension, False))
+            else:
+                cur.execute(sql.SQL("DELETE FROM {}").format(table) + self._month_filter(), params)
+                cur.execute(sql.SQL("INSERT INTO {} ").format(table) + self._select(dimension, True), params)
+            written += cur.rowcount
+
+        self.refreshes += 1
+        self.refreshed_at = time.time()
+        return written
+
+    # --- Query rewriting ---
+
+    def rewrite(self, query: str) -> Optional[Tuple[str, str]]:
+        """
+        Rewrite an aggregate query over revenue to read from a rollup table
+
+        Eligible queries read only ``revenue`` (no joins, subqueries, set
+        operations, DISTINCT or window functions), reference at most one
+        dimension besides month outside aggregates, and use measures only
+        inside SUM/COUNT/AVG/MIN/MAX of a bare column. Filters and groupings
+        on month and the dimension are kept as written.
+
+        Args:
+            query: Validated SELECT query
+
+        Returns:
+            Tuple of (rewritten SQL, rollup table), or None if not eligible
+        """
+        if not self.rewrite_enabled or not self.loaded or not self.available:
+            return None
+
+        rewritten = self._rewrite(SQLValidator._normalize_query(query))
+        if rewritten is None:
+            self.skipped += 1
+        else:
+            self.rewrites += 1
+        return rewritten
+
+    def _rewrite(self, text: str) -> Optional[Tuple[str, str]]:
+        tokens: List[_Token] = []
+        for match in _TOKEN_RE.finditer(text):
+            kind = match.lastgroup
+            if kind in ("prefixed", "quoted", "dollar"):
+                return None
+            if kind != "space":
+                tokens.append(_Token(kind, match.group(), match.start(), match.end()))
+
+        words = [t.upper for t in tokens if t.kind == "word"]
+        if words.count("SELECT") != 1 or not words or words[0] != "SELECT":
+            return None
+        if DISALLOWED_WORDS.intersection(words):
+            return None
+
+        # Locate FROM revenue [[AS] alias] at depth 0
+        depth = 0
+        from_index = None
+        for i, token in enumerate(tokens):
+            if token.text == "(":
+                depth += 1
+            elif token.text == ")":
+                depth -= 1
+            elif depth == 0 and token.upper == "FROM":
+                from_index = i
+                break
+        if from_index is None:
+            return None
+
+        i = from_index + 1
+        table_start = i
+        if i + 2 < len(tokens) and tokens[i].upper == "PUBLIC" and tokens[i + 1].text == ".":
+            i += 2
+        if i >= len(tokens) or tokens[i].kind != "word" or tokens[i].text.lower() != SOURCE_TABLE:
+            return None
+        table_span = (tokens[table_start].start, tokens[i].end)
+        i += 1
+        qualifiers = {SOURCE_TABLE}
+        if i < len(tokens) and tokens[i].upper == "AS":
+            i += 1
+        if i < len(tokens) and tokens[i].kind == "word" and tokens[i].upper not in CLAUSE_WORDS:
+            qualifiers.add(tokens[i].text.lower())
+            i += 1
+        if i < len(tokens) and tokens[i].upper not in CLAUSE_WORDS and tokens[i].text != ";":
+            return None
+        from_end = i
+
+        columns = self._column_types
+        measures = set(self._measures())
+        dims_used = set()
+        replacements: List[Tuple[int, int, str]] = [(table_span[0], table_span[1], "{table}")]
+        has_aggregate = any(t.upper == "GROUP" for t in tokens[from_end:])
+
+        # Output aliases (a bare name in ORDER BY may refer to them)
+        aliases = {
+            tokens[k + 1].text.lower()
+            for k in range(from_index)
+            if tokens[k].upper == "AS" and k + 1 < len(tokens) and tokens[k + 1].kind == "word"
+        }
+        order_by = next(
+            (k for k in range(from_end, len(tokens) - 1)
+             if tokens[k].upper == "ORDER" and tokens[k + 1].upper == "BY"),
+            len(tokens)
+        )
+
+        k = 0
+        while k < len(tokens):
+            token = tokens[k]
+            if table_start <= k < from_end or token.kind != "word":
+                k += 1
+                continue
+
+            # Output alias definitions and type names are not column references
+            prev = tokens[k - 1] if k > 0 else None
+            if prev is not None and (prev.upper == "AS" or prev.text == "::"):
+                k += 1
+                continue
+
+            nxt = tokens[k + 1] if k + 1 < len(tokens) else None
+            if nxt is not None and nxt.text == "(":
+                if token.upper in REWRITABLE_AGGREGATES:
+                    replaced = self._rewrite_aggregate(tokens, k, qualifiers, measures)
+                    if replaced is None:
+                        return None
+                    end, expression, alias_after = replaced
+                    replacements.append((token.start, tokens[end].end, expression))
+                    if alias_after is not None:
+                        position = tokens[alias_after].end
+                        replacements.append((position, position, f' AS "{token.text.lower()}"'))
+                    has_aggregate = True
+                    k = end + 1
+                    continue
+                if token.upper not in SCALAR_PAREN_WORDS:
+                    return None
+                k += 1
+                continue
+
+            name = token.text.lower()
+            if nxt is not None and nxt.text == "." and name in qualifiers:
+                k += 2
+                continue
+            if prev is not None and prev.text == "." and k >= 2 and tokens[k - 2].text.lower() not in qualifiers:
+                return None
+
+            if name in columns:
+                if k > order_by and name in aliases:
+                    k += 1
+                    continue
+                if name in measures or (name not in DIMENSIONS and name != TIME_DIMENSION):
+                    # Measures outside aggregates and non-rollup columns need the base rows
+                    return None
+                if name != TIME_DIMENSION:
+                    dims_used.add(name)
+            k += 1
+
+        if not has_aggregate or len(dims_used) > 1:
+            return None
+
+        dimension = next(iter(dims_used), None)
+        table = self._tables.get(dimension)
+        if table is None:
+            return None
+
+        parts = []
+        last = 0
+        for start, end, replacement in sorted(replacements):
+            parts.append(text[last:start])
+            parts.append(replacement.replace("{table}", table))
+            last = end
+        parts.append(text[last:])
+        return "".join(parts), table
+
+    def _rewrite_aggregate(
+        self,
+        tokens: List[_Token],
+        k: int,
+        qualifiers: set,
+        measures: set
+    ) -> Optional[Tuple[int, str, Optional[int]]]:
+        """
+        Rewrite one SUM/COUNT/AVG/MIN/MAX call over a bare measure column
+
+        Returns:
+            Tuple of (index of the closing parenthesis, replacement SQL, index
+            of the token to place an output alias after or None)
+        """
+        function = tokens[k].upper
+        args = []
+        j = k + 2
+        while j < len(tokens) and tokens[j].text != ")":
+            args.append(tokens[j])
+            j += 1
+        if j >= len(tokens):
+            return None
+
+        prefix = ""
+        if len(args) == 3 and args[1].text == "." and args[0].text.lower() in qualifiers:
+            prefix = args[0].text + "."
+            args = args[2:]
+
+        if function == "COUNT" and len(args) == 1 and args[0].text == "*":
+            expression = f"CAST(COALESCE(SUM({prefix}row_count), 0) AS bigint)"
+        elif len(args) == 1 and args[0].kind == "word" and args[0].text.lower() in measures:
+            measure = args[0].text.lower()
+            base_type = self._column_types[measure]
+            column = f"{prefix}{measure}"
+            if function == "SUM":
+                expression = f"CAST(SUM({column}_sum) AS {_sum_result_type(base_type)})"
+            elif function == "COUNT":
+                expression = f"CAST(COALESCE(SUM({column}_count), 0) AS bigint)"
+            elif function == "AVG":
+                if base_type in FLOAT_TYPES:
+                    expression = (
+                        f"(SUM({column}_sum) / CAST(NULLIF(SUM({column}_count), 0) AS double precision))"
+                    )
+                else:
+                    expression = f"(SUM({column}_sum) / CAST(NULLIF(SUM({column}_count), 0) AS numeric))"
+            else:
+                expression = f"{function}({column}_{function.lower()})"
+        else:
+            return None
+
+        # Keep the output column name of an unaliased aggregate item ("count",
+        # "avg", ...), optionally cast: the alias goes after the cast
+        item_end = j
+        if item_end + 2 < len(tokens) and tokens[item_end + 1].text == "::" and tokens[item_end + 2].kind == "word":
+            item_end += 2
+        following = tokens[item_end + 1] if item_end + 1 < len(tokens) else None
+        preceding = tokens[k - 1] if k > 0 else None
+        bare_item = (
+            preceding is not None and (preceding.upper == "SELECT" or preceding.text == ",")
+            and (following is None or following.text == "," or following.upper == "FROM")
+            and self._in_select_list(tokens, k)
+        )
+        return j, expression, (item_end if bare_item else None)
+
+    @staticmethod
+    def _in_select_list(tokens: List[_Token], k: int) -> bool:
+        depth = 0
+        for token in tokens[:k]:
+            if token.text == "(":
+                depth += 1
+            elif token.text == ")":
+                depth -= 1
+            elif depth == 0 and token.upper == "FROM":
+                return False
+        return depth == 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Installed rollup tables and rewrite counters"""
+        return {
+            "enabled": self.rewrite_enabled,
+            "tables": sorted(self._tables.values()),
+            "rewrites": self.rewrites,
+            "not_eligible": self.skipped,
+            "refreshes": self.refreshes,
+            "refreshed_at": self.refreshed_at,
+        }
+
+
+def _build_manager() -> RollupManager:
+    from db.connection import db
+    return RollupManager(
+        db,
+        rewrite_enabled=os.getenv("SQL_ROLLUP_REWRITE", "true").lower() != "false",
+        retry_seconds=float(os.getenv("SQL_ROLLUP_RETRY_SECONDS", "30")),
+    )
+
+
+# Global rollup manager instance
+rollup_manager = _build_manager()
+
+
+def _refresh_all() -> Dict[str, Any]:
+    """Recompute every installed rollup in one transaction"""
+    from db.connection import db
+    start_time = time.time()
+    with db.get_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                rows = rollup_manager.refresh(cur)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return {"rows": rows, "seconds": round(time.time() - start_time, 3)}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in ("build", "refresh"):
+        print(__doc__)
+        sys.exit(1)
+
+    from db.connection import db
+    db.initialize()
+    try:
+        print(rollup_manager.build() if sys.argv[1] == "build" else _refresh_all())
+    finally:
+        db.close()
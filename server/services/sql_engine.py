@@ -1,23 +1,165 @@
 """SQL query execution engine using psycopg2"""
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Iterator
+import itertools
+import os
 import time
 import psycopg2.extras
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import psycopg
+except ImportError:  # async pool is optional; falls back to the threadpool
+    psycopg = None
 
 from db.connection import db
 from services.sql_validator import sql_validator
+from services.result_formats import pg_type_name, encode_json
+from services.result_cache import result_cache
+from services.prepared_statements import prepared_statements
+from services.rollups import rollup_manager
+from services.columnar import columnar_replica
+from services.approximate import apply_row_budget, sampled_replica
+from services import query_control
+from services.metrics import timed
+from services.query_control import QueryCancellation
+from db.schema import schema_catalog
 
 
 class SQLEngine:
     """Handles SQL query execution with validation"""
     
+    # Rows fetched per round trip by server-side (named) cursors
+    DEFAULT_ITERSIZE = int(os.getenv("SQL_STREAM_ITERSIZE", "2000"))
+    
     def __init__(self):
         self.db = db
         self.validator = sql_validator
+        self.result_cache = result_cache
+        self.prepared = prepared_statements
+        self.rollups = rollup_manager
+        self.replica = columnar_replica
+        self.sample = sampled_replica
+        self._cursor_ids = itertools.count(1)
+        
+        if self.prepared is not None:
+            # Statements planned against the old schema must be re-prepared
+            schema_catalog.on_change(self.prepared.invalidate)
+        # Rollup eligibility depends on the revenue columns and installed tables
+        schema_catalog.on_change(self.rollups.invalidate)
+        if self.replica is not None:
+            schema_catalog.on_change(self.replica.invalidate)
+        if self.sample is not None:
+            schema_catalog.on_change(self.sample.invalidate)
+    
+    def _rollup_rewrite(self, query: str):
+        """
+        Rewrite an aggregate over revenue onto a rollup table when eligible
+        
+        Returns:
+            Tuple of (query to execute, rollup table or None)
+        """
+        rewritten = self.rollups.rewrite(query)
+        if rewritten is None:
+            return query, None
+        return rewritten
+    
+    def _in_memory(self, query: str, parameters: Optional[Dict[str, Any]], approximate: bool):
+        """
+        Answer from the replica, or in approximate mode from the revenue sample
+        
+        Returns:
+            Result dictionary, or None to run the query in PostgreSQL
+        """
+        with timed("replica"):
+            if self.replica is not None:
+                result = self.replica.execute(query, parameters)
+                if result is not None:
+                    return result
+            if approximate and self.sample is not None:
+                return self.sample.execute(query, parameters)
+            return None
+    
+    @staticmethod
+    def _within_budget(result: Dict[str, Any], row_budget: Optional[int]) -> Dict[str, Any]:
+        """Trim a result fetched under a row budget (budget + 1 rows) and flag the truncation"""
+        if row_budget is not None and result["row_count"] > row_budget:
+            result["data"] = result["data"][:row_budget]
+            result["row_count"] = row_budget
+            result["truncated"] = True
+            result["row_budget"] = row_budget
+        return result
+    
+    @staticmethod
+    def _error_result(error: str, start_time: Optional[float] = None) -> Dict[str, Any]:
+        """Build the failure result shape shared by every execution path"""
+        return {
+            "success": False,
+            "data": None,
+            "columns": None,
+            "row_count": 0,
+            "execution_time_ms": (time.time() - start_time) * 1000 if start_time else 0,
+            "error": error
+        }
+    
+    @staticmethod
+    def _success_result(rows, description, start_time: float) -> Dict[str, Any]:
+        """Build the success result shape from fetched row tuples and a cursor description"""
+        # Get column names and logical types from cursor description
+        columns = [desc[0] for desc in description] if description else []
+        column_types = [pg_type_name(desc[1]) for desc in description] if description else []
+        
+        # One dictionary per row, built straight from the tuples
+        data = [dict(zip(columns, row)) for row in rows]
+        
+        execution_time = (time.time() - start_time) * 1000  # Convert to ms
+        
+        return {
+            "success": True,
+            "data": data,
+            "columns": columns,
+            "column_types": column_types,
+            "row_count": len(data),
+            "execution_time_ms": execution_time,
+            "cached": False,
+            "error": None
+        }
+    
+    def _cache_lookup(self, query: str, parameters: Optional[Dict[str, Any]], start_time: float):
+        """
+        Look up a query in the result cache
+        
+        Returns:
+            Tuple of (cache key or None, cached result copy or None)
+        """
+        if self.result_cache is None:
+            return None, None
+        
+        key = self.result_cache.make_key(query, parameters)
+        cached = self.result_cache.get(key)
+        if cached is None:
+            return key, None
+        
+        # Shallow copy so callers can annotate the result without touching the cache
+        result = dict(cached)
+        result["cached"] = True
+        result["execution_time_ms"] = (time.time() - start_time) * 1000
+        return key, result
+    
+    def _cache_store(self, key, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Cache a fresh result and hand the caller its own copy"""
+        if key is not None:
+            self.result_cache.set(key, result)
+            return dict(result)
+        return result
     
     def execute_query(
         self, 
         query: str, 
-        parameters: Optional[Dict[str, Any]] = None
+        parameters: Optional[Dict[str, Any]] = None,
+        request_class: str = query_control.SQL,
+        cancellation: Optional[QueryCancellation] = None,
+        approximate: bool = False,
+        row_budget: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Execute a SQL query and return results
@@ -25,6 +167,101 @@ class SQLEngine:
         Args:
             query: SQL query string
             parameters: Optional query parameters for parameterized queries
+            request_class: Request class selecting the statement_timeout
+            cancellation: Handle that can cancel the query from another thread
+            approximate: Estimate aggregates over revenue from the row sample
+                when the replica cannot answer exactly
+            row_budget: Return at most this many rows of a raw-row (non
+                aggregate) query; "truncated" is set when rows were cut
+            
+        Successful results are served from / stored in the result cache,
+        keyed by normalized SQL, parameters and the current data version.
+        Simple aggregates over revenue are answered from the in-memory
+        replica when it is loaded ("replica": true in the result); other
+        eligible aggregates read a rollup table (named under "rollup").
+        Approximate answers carry "approximate" and per-row "bounds" and
+        are never cached.
+        
+        Returns:
+            Dictionary with query results, columns, row count, and execution time
+        """
+        start_time = time.time()
+        
+        # Validate SQL query before execution
+        is_valid, error_msg = self.validator.validate_query(query)
+        if not is_valid:
+            return self._error_result(f"SQL validation failed: {error_msg}")
+        
+        # Simple aggregates over revenue are answered from the in-memory replica
+        result = self._in_memory(query, parameters, approximate)
+        if result is not None:
+            return result
+        
+        query, row_budget = apply_row_budget(query, row_budget)
+        cache_key, cached = self._cache_lookup(query, parameters, start_time)
+        if cached is not None:
+            return cached
+        
+        self.rollups.ensure_loaded()
+        query, rollup = self._rollup_rewrite(query)
+        
+        timeout = query_control.timeout_statement(request_class)
+        try:
+            with self.db.get_connection() as conn:
+                if cancellation is not None:
+                    cancellation.attach(conn)
+                try:
+                    with conn.cursor() as cur:
+                        with timed("db"):
+                            # Execute query with parameters if provided
+                            # For named parameters, use %(name)s syntax
+                            if self.prepared is not None:
+                                # Recurring SQL runs as a server-side prepared statement
+                                self.prepared.execute(cur, query, parameters, setup=timeout)
+                            else:
+                                cur.execute(timeout)
+                                cur.execute(query, parameters or None)
+                            
+                            # Fetch all rows
+                            rows = cur.fetchall()
+                        
+                        with timed("frame"):
+                            result = self._success_result(rows, cur.description, start_time)
+                        result["rollup"] = rollup
+                        return self._cache_store(cache_key, self._within_budget(result, row_budget))
+                finally:
+                    if cancellation is not None:
+                        cancellation.detach()
+                
+        except psycopg2.Error as e:
+            return self._error_result(f"Database error: {str(e)}", start_time)
+        except Exception as e:
+            return self._error_result(f"Query execution failed: {str(e)}", start_time)
+    
+    async def execute_query_async(
+        self,
+        query: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        request_class: str = query_control.SQL,
+        cancellation: Optional[QueryCancellation] = None,
+        approximate: bool = False,
+        row_budget: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Execute a SQL query without blocking the event loop
+        
+        Uses the psycopg 3 async pool when it is initialized; otherwise the
+        blocking psycopg2 path runs on the threadpool. Cancelling the awaiting
+        task cancels a psycopg 3 query on the server; the threadpool path is
+        cancelled through ``cancellation``.
+        
+        Args:
+            query: SQL query string
+            parameters: Optional query parameters for parameterized queries
+            request_class: Request class selecting the statement_timeout
+            cancellation: Handle that can cancel the threadpool query
+            approximate: Estimate aggregates from the revenue sample (see execute_query)
+            row_budget: Row cap for raw-row queries (see execute_query)
             
         Returns:
             Dictionary with query results, columns, row count, and execution time
@@ -33,67 +270,143 @@ class SQLEngine:
         
         # Validate SQL query before execution
         is_valid, error_msg = self.validator.validate_query(query)
+        if not is_valid:
+            return self._error_result(f"SQL validation failed: {error_msg}")
+        
+        # In-memory answers are CPU-only and fast enough to run on the event loop
+        result = self._in_memory(query, parameters, approximate)
+        if result is not None:
+            return result
+        
+        if not self.db.async_available:
+            return await run_in_threadpool(
+                self.execute_query, query, parameters, request_class, cancellation, False, row_budget
+            )
+        
+        query, row_budget = apply_row_budget(query, row_budget)
+        cache_key, cached = self._cache_lookup(query, parameters, start_time)
+        if cached is not None:
+            return cached
+        
+        if not self.rollups.loaded:
+            await run_in_threadpool(self.rollups.ensure_loaded)
+        query, rollup = self._rollup_rewrite(query)
+        
+        try:
+            async with self.db.get_async_connection() as conn:
+                async with conn.cursor() as cur:
+                    timeout = query_control.timeout_statement(request_class)
+                    with timed("db"):
+                        if self.prepared is not None:
+                            await self.prepared.execute_async(cur, query, parameters, setup=timeout)
+                        else:
+                            await cur.execute(timeout)
+                            await cur.execute(query, parameters or None)
+                        rows = await cur.fetchall()
+                    
+                    with timed("frame"):
+                        result = self._success_result(rows, cur.description, start_time)
+                    result["rollup"] = rollup
+                    return self._cache_store(cache_key, self._within_budget(result, row_budget))
+        
+        except psycopg.Error as e:
+            return self._error_result(f"Database error: {str(e)}", start_time)
+        except Exception as e:
+            return self._error_result(f"Query execution failed: {str(e)}", start_time)
+    
+    def stream_query(
+        self,
+        query: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        itersize: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Validate a SQL query and prepare a streamed (NDJSON) execution
+        
+        The query runs on a named server-side cursor, so only ``itersize``
+        rows are held in memory at a time regardless of the result size.
+        
+        Args:
+            query: SQL query string
+            parameters: Optional query parameters for parameterized queries
+            itersize: Rows fetched per round trip (defaults to DEFAULT_ITERSIZE)
+            
+        Returns:
+            Dictionary with success flag and either an NDJSON byte-chunk
+            iterator under "stream" or an error message under "error"
+        """
+        is_valid, error_msg = self.validator.validate_query(query)
         if not is_valid:
             return {
                 "success": False,
-                "data": None,
-                "columns": None,
-                "row_count": 0,
-                "execution_time_ms": 0,
+                "stream": None,
                 "error": f"SQL validation failed: {error_msg}"
             }
         
+        batch_size = itersize if itersize and itersize > 0 else self.DEFAULT_ITERSIZE
+        return {
+            "success": True,
+            "stream": self._iter_ndjson(query, parameters, batch_size),
+            "error": None
+        }
+    
+    def _iter_ndjson(
+        self,
+        query: str,
+        parameters: Optional[Dict[str, Any]],
+        itersize: int
+    ) -> Iterator[bytes]:
+        """
+        Execute a query on a named cursor and yield NDJSON chunks
+        
+        Emits one line per message:
+            {"type": "columns", "columns": [...]}
+            {"type": "rows", "rows": [...]}       (one per fetched batch)
+            {"type": "end", "row_count": n, "execution_time_ms": t}
+        or {"type": "error", "error": "..."} if execution fails mid-stream.
+        """
+        start_time = time.time()
+        row_count = 0
+        
+        def line(payload: Dict[str, Any]) -> bytes:
+            return encode_json(payload) + b"\n"
+        
         try:
             with self.db.get_connection() as conn:
-                with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                    # Execute query with parameters if provided
-                    if parameters:
-                        # Convert parameters dict to list for psycopg2
-                        # For named parameters, use %(name)s syntax
-                        cur.execute(query, parameters)
-                    else:
-                        cur.execute(query)
+                cursor_name = f"xdive_stream_{next(self._cursor_ids)}"
+                with conn.cursor(
+                    name=cursor_name,
+                    cursor_factory=psycopg2.extras.RealDictCursor
+                ) as cur:
+                    cur.itersize = itersize
+                    # Runs before the cursor is declared, in the same transaction
+                    with conn.cursor() as setup:
+                        setup.execute(query_control.timeout_statement(query_control.STREAM))
+                    cur.execute(query, parameters or None)
                     
-                    # Fetch all rows
-                    rows = cur.fetchall()
-                    
-                    # Convert to list of dictionaries
-                    data = [dict(row) for row in rows]
-                    
-                    # Get column names from cursor description
+                    # Named cursors only expose a description after the first fetch
+                    batch = cur.fetchmany(itersize)
                     columns = [desc[0] for desc in cur.description] if cur.description else []
+                    yield line({"type": "columns", "columns": columns})
                     
-                    execution_time = (time.time() - start_time) * 1000  # Convert to ms
-                    
-                    return {
-                        "success": True,
-                        "data": data,
-                        "columns": columns,
-                        "row_count": len(data),
-                        "execution_time_ms": execution_time,
-                        "error": None
-                    }
+                    while batch:
+                        row_count += len(batch)
+                        yield line({"type": "rows", "rows": batch})
+                        batch = cur.fetchmany(itersize)
                 
+                # Close the read transaction opened by the named cursor
+                conn.rollback()
+            
+            yield line({
+                "type": "end",
+                "row_count": row_count,
+                "execution_time_ms": (time.time() - start_time) * 1000
+            })
+        
         except psycopg2.Error as e:
-            execution_time = (time.time() - start_time) * 1000
-            return {
-                "success": False,
-                "data": None,
-                "columns": None,
-                "row_count": 0,
-                "execution_time_ms": execution_time,
-                "error": f"Database error: {str(e)}"
-            }
+            yield line({"type": "error", "error": f"Database error: {str(e)}"})
         except Exception as e:
-            execution_time = (time.time() - start_time) * 1000
-            return {
-                "success": False,
-                "data": None,
-                "columns": None,
-                "row_count": 0,
-                "execution_time_ms": execution_time,
-                "error": f"Query execution failed: {str(e)}"
-            }
+            yield line({"type": "error", "error": f"Query execution failed: {str(e)}"})
 
 
 # Global SQL engine instance
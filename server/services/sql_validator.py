@@ -1,17 +1,61 @@
 """SQL query validation module"""
 import re
-from typing import List, Tuple
+from functools import lru_cache
+from typing import FrozenSet, List, NamedTuple, Optional, Tuple
+
+from services.metrics import timed
+
+
+# One alternation scanned left to right: every character of the query is
+# consumed by exactly one token class (with its leading whitespace), so a
+# single finditer() pass classifies keywords, literals, comments and parentheses.
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<lead>\s*)
+    (?:
+      (?P<line_comment>--[^\n]*)
+    | (?P<block_comment>/\*.*?\*/)
+    | (?P<escape_string>[Ee]'(?:[^'\\]|\\.|'')*')
+    | (?P<unclosed_escape>[Ee]')
+    | (?P<string>[BbXxNn]?'(?:[^']|'')*')
+    | (?P<quoted_ident>"(?:[^"]|"")*")
+    | (?P<dollar_string>\$(?P<tag>(?:[A-Za-z_][A-Za-z0-9_]*)?)\$.*?\$(?P=tag)\$)
+    | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    | (?P<lparen>\()
+    | (?P<rparen>\))
+    | (?P<semicolon>;)
+    | (?P<unclosed>/\*|['"]|\$(?:[A-Za-z_][A-Za-z0-9_]*)?\$)
+    | (?P<other>[0-9.]+|[^\sA-Za-z_'"();$/-]+|.)
+    | (?P<ws>$)
+    )
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+
+class QueryAnalysis(NamedTuple):
+    """Result of the single-pass scan of a query"""
+    keywords: FrozenSet[str]            # Upper-cased words outside literals/comments
+    first_token: Optional[str]          # First token (upper-cased if a word)
+    union_select: bool                  # UNION immediately followed by SELECT
+    balanced_parens: bool               # Parentheses balance outside literals
+    unclosed: bool                      # Unterminated literal or block comment
+    multiple_statements: bool           # A token follows a semicolon
+    normalized: str                     # Comments removed, whitespace collapsed
 
 
 class SQLValidator:
     """Validates SQL queries before execution"""
-    
+
     # Dangerous SQL keywords that should be blocked
     DANGEROUS_KEYWORDS = [
-        "DROP", "DELETE", "TRUNCATE", "ALTER", "CREATE", 
+        "DROP", "DELETE", "TRUNCATE", "ALTER", "CREATE",
         "INSERT", "UPDATE", "GRANT", "REVOKE", "EXEC", "EXECUTE"
     ]
-    
+
+    # Write operations rejected by is_read_only
+    WRITE_KEYWORDS = ["INSERT", "UPDATE", "DELETE", "DROP", "CREATE", "ALTER", "TRUNCATE"]
+
     # Allowed SQL keywords for SELECT queries
     ALLOWED_KEYWORDS = [
         "SELECT", "FROM", "WHERE", "JOIN", "INNER", "LEFT", "RIGHT", "FULL",
@@ -21,96 +65,198 @@ class SQLValidator:
         "BETWEEN", "IS", "NULL", "UNION", "INTERSECT", "EXCEPT", "WITH",
         "CAST", "::", "COALESCE", "NULLIF"
     ]
-    
+
+    # Recent verdicts are memoized; longer queries are always re-scanned
+    MEMO_SIZE = 1024
+    MEMO_MAX_QUERY_LENGTH = 16384
+
+    @staticmethod
+    def _scan(query: str) -> QueryAnalysis:
+        """
+        Tokenize a query in one pass
+
+        Keywords inside string literals, quoted identifiers, dollar-quoted
+        strings and comments are ignored.
+
+        Args:
+            query: Raw SQL query
+
+        Returns:
+            QueryAnalysis summary of the query
+        """
+        keywords = set()
+        first_token = None
+        previous_word = None
+        union_select = False
+        depth = 0
+        balanced = True
+        unclosed = False
+        after_semicolon = False
+        multiple_statements = False
+        parts: List[str] = []
+        pending_space = False
+
+        for match in _TOKEN_RE.finditer(query):
+            kind = match.lastgroup
+            if match.start(kind) != match.start():
+                pending_space = True
+
+            if kind == "ws" or kind == "line_comment" or kind == "block_comment":
+                pending_space = True
+                continue
+
+            if kind == "semicolon":
+                after_semicolon = True
+            elif after_semicolon:
+                # Only trailing semicolons may end the statement
+                multiple_statements = True
+
+            text = match.group(kind)
+            if pending_space and parts:
+                parts.append(" ")
+            pending_space = False
+            parts.append(text)
+
+            if kind == "word":
+                word = text.upper()
+                keywords.add(word)
+                if first_token is None:
+                    first_token = word
+                if word == "SELECT" and previous_word == "UNION":
+                    union_select = True
+                previous_word = word
+                continue
+
+            if first_token is None:
+                first_token = text
+            # Only adjacent words form "UNION SELECT"
+            previous_word = None
+
+            if kind == "lparen":
+                depth += 1
+            elif kind == "rparen":
+                depth -= 1
+                if depth < 0:
+                    balanced = False
+            elif kind == "unclosed" or kind == "unclosed_escape":
+                unclosed = True
+
+        return QueryAnalysis(
+            keywords=frozenset(keywords),
+            first_token=first_token,
+            union_select=union_select,
+            balanced_parens=balanced and depth == 0,
+            unclosed=unclosed,
+            multiple_statements=multiple_statements,
+            normalized="".join(parts),
+        )
+
+    @staticmethod
+    @lru_cache(maxsize=MEMO_SIZE)
+    def _scan_memoized(query: str) -> QueryAnalysis:
+        return SQLValidator._scan(query)
+
+    @staticmethod
+    def _analyze(query: str) -> QueryAnalysis:
+        """Scan a query, reusing the memoized analysis for recent queries"""
+        if len(query) <= SQLValidator.MEMO_MAX_QUERY_LENGTH:
+            return SQLValidator._scan_memoized(query)
+        return SQLValidator._scan(query)
+
     @staticmethod
     def validate_query(query: str) -> Tuple[bool, str]:
         """
         Validate SQL query
-        
+
         Args:
             query: SQL query string to validate
-            
+
         Returns:
             Tuple of (is_valid, error_message)
         """
+        with timed("validate"):
+            return SQLValidator._check(query)
+
+    @staticmethod
+    def _check(query: str) -> Tuple[bool, str]:
         if not query or not query.strip():
             return False, "Query cannot be empty"
-        
-        # Normalize query - remove comments and extra whitespace
-        normalized = SQLValidator._normalize_query(query)
-        
-        # Check for dangerous keywords
+
+        analysis = SQLValidator._analyze(query)
+
+        # Check for dangerous keywords (outside literals and comments)
         for keyword in SQLValidator.DANGEROUS_KEYWORDS:
-            # Use word boundary to avoid false positives
-            pattern = r'\b' + re.escape(keyword) + r'\b'
-            if re.search(pattern, normalized, re.IGNORECASE):
+            if keyword in analysis.keywords:
                 return False, f"Dangerous SQL keyword '{keyword}' is not allowed. Only SELECT queries are permitted."
-        
+
         # Ensure query starts with SELECT
-        if not re.match(r'^\s*SELECT\s+', normalized, re.IGNORECASE):
+        if analysis.first_token != "SELECT":
             return False, "Only SELECT queries are allowed"
-        
+
+        # One statement only: psycopg2 sends the whole text, so anything after a
+        # semicolon would run as a second statement
+        if analysis.multiple_statements:
+            return False, "Multiple SQL statements are not allowed"
+
         # Basic syntax validation - check for balanced parentheses
-        if normalized.count('(') != normalized.count(')'):
+        if not analysis.balanced_parens:
             return False, "Unbalanced parentheses in query"
-        
-        # Check for SQL injection patterns (basic)
-        sql_injection_patterns = [
-            r';\s*(DROP|DELETE|INSERT|UPDATE|ALTER|CREATE)',
-            r'--',
-            r'/\*',
-            r'UNION\s+SELECT',
-        ]
-        
-        for pattern in sql_injection_patterns:
-            if re.search(pattern, normalized, re.IGNORECASE):
-                return False, "Potentially malicious SQL pattern detected"
-        
+
+        # Check for SQL injection patterns (basic): stacked UNION SELECT and
+        # unterminated literals/comments that could swallow the rest of a query
+        if analysis.union_select or analysis.unclosed:
+            return False, "Potentially malicious SQL pattern detected"
+
         return True, ""
-    
+
     @staticmethod
     def _normalize_query(query: str) -> str:
         """
         Normalize SQL query by removing comments and extra whitespace
-        
+
+        String literals and quoted identifiers are preserved verbatim.
+
         Args:
             query: Raw SQL query
-            
+
         Returns:
             Normalized query string
         """
-        # Remove single-line comments (--)
-        query = re.sub(r'--.*$', '', query, flags=re.MULTILINE)
-        
-        # Remove multi-line comments (/* */)
-        query = re.sub(r'/\*.*?\*/', '', query, flags=re.DOTALL)
-        
-        # Normalize whitespace
-        query = ' '.join(query.split())
-        
-        return query
-    
+        return SQLValidator._analyze(query).normalized
+
     @staticmethod
     def is_read_only(query: str) -> bool:
         """
         Check if query is read-only (SELECT only)
-        
+
         Args:
             query: SQL query string
-            
+
         Returns:
             True if query appears to be read-only
         """
-        normalized = SQLValidator._normalize_query(query)
-        
+        if not query or not query.strip():
+            return False
+
+        analysis = SQLValidator._analyze(query)
+
         # Check for write operations
-        write_keywords = ["INSERT", "UPDATE", "DELETE", "DROP", "CREATE", "ALTER", "TRUNCATE"]
-        for keyword in write_keywords:
-            if re.search(r'\b' + re.escape(keyword) + r'\b', normalized, re.IGNORECASE):
-                return False
-        
+        if any(keyword in analysis.keywords for keyword in SQLValidator.WRITE_KEYWORDS):
+            return False
+
         # Must start with SELECT
-        return bool(re.match(r'^\s*SELECT\s+', normalized, re.IGNORECASE))
+        return analysis.first_token == "SELECT"
+
+    @staticmethod
+    def memo_stats() -> dict:
+        """Hit/miss statistics of the verdict memo"""
+        info = SQLValidator._scan_memoized.cache_info()
+        return {
+            "hits": info.hits,
+            "misses": info.misses,
+            "entries": info.currsize,
+            "max_entries": info.maxsize,
+        }
 
 
 # Global validator instance
@@ -0,0 +1,337 @@
+"""
+Columnar staging cache for parsed workbook sheets
+
+Parsing .xlsb/.xlsx workbooks is slow and single-threaded, so each
+(workbook, sheet) is parsed once into Parquet parts and reused until the
+file changes. Entries are keyed by the SHA-256 of the file contents and
+the sheet name: a renamed or copied workbook is a hit, an edited one is a
+miss. ``stage`` parses the missing sheets in a process pool (one task per
+sheet, written straight to the cache so rows never travel back through
+the pool) and loading then streams the staged parts:
+
+    <INGEST_STAGING_PATH>/<key>/part-00000.parquet ...   one part per chunk
+    <INGEST_STAGING_PATH>/<key>/manifest.json             header, rows, source
+
+Each part stores its columns positionally (c0, c1, ...; the normalized
+header is in the manifest) with types inferred per part. A column whose
+values have more than one Python type within a part (int and float, or
+numbers and text) is stored as type-tagged text and decoded back to the
+same values, so staged rows equal the rows the readers emit. Least
+recently used entries are removed once the cache exceeds
+INGEST_STAGING_MAX_MB.
+
+Needs pyarrow (see requirements.txt); without it build_staging_cache
+warns and returns None, and workbooks are streamed without staging.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time as clock_time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import hashlib
+import importlib.util
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+from services.file_readers import RecordChunk, iter_record_chunks
+
+
+# Bump when the staged layout or the readers' value conversion changes
+STAGING_VERSION = 2
+
+MANIFEST = "manifest.json"
+
+# Parquet field metadata marking a type-tagged (mixed) column
+_MIXED_KEY = b"xdive_mixed"
+
+# Tag -> decoder of a mixed column value ("i:1", "f:1.0", "s:text", ...)
+_DECODERS = {
+    "b": lambda text: text == "1",
+    "i": int,
+    "f": float,
+    "s": str,
+    "t": datetime.fromisoformat,
+    "d": date.fromisoformat,
+    "h": clock_time.fromisoformat,
+}
+
+
+def file_digest(file_path: str) -> str:
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as handle:
+        for block in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _encode_mixed(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    # bool before int (a subclass), datetime before date (likewise)
+    if isinstance(value, bool):
+        return "b:1" if value else "b:0"
+    if isinstance(value, int):
+        return f"i:{value}"
+    if isinstance(value, float):
+        # repr round-trips floats exactly
+        return f"f:{value!r}"
+    if isinstance(value, datetime):
+        return f"t:{value.isoformat()}"
+    if isinstance(value, date):
+        return f"d:{value.isoformat()}"
+    if isinstance(value, clock_time):
+        return f"h:{value.isoformat()}"
+    return f"s:{value}"
+
+
+def _decode_mixed(text: Optional[str]) -> Any:
+    return None if text is None else _DECODERS[text[0]](text[2:])
+
+
+def _arrow_column(pa, values: List[Any]) -> Tuple[Any, bool]:
+    """
+    Arrow array for one column of a chunk
+
+    Returns:
+        Tuple of (array, whether it holds type-tagged mixed values)
+    """
+    if len({type(value) for value in values if value is not None}) <= 1:
+        try:
+            return pa.array(values), False
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+            # e.g. integers beyond int64
+            pass
+    return pa.array([_encode_mixed(value) for value in values], type=pa.string()), True
+
+
+def _stage_sheet(file_path: str, sheet_name: Optional[str], entry_dir: str, chunk_size: int) -> Dict[str, Any]:
+    """
+    Parse one workbook sheet into Parquet parts (runs in a worker process)
+
+    Writes to a scratch directory renamed into place when complete, so a
+    crashed or concurrent parse never leaves a partial entry behind.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    start_time = time.time()
+    scratch = f"{entry_dir}.{uuid.uuid4().hex}.tmp"
+    os.makedirs(scratch)
+    try:
+        header: List[str] = []
+        rows = 0
+        parts = 0
+        for header, chunk in iter_record_chunks(file_path, chunk_size=chunk_size, sheet_name=sheet_name):
+            arrays = [_arrow_column(pa, list(values)) for values in zip(*chunk, strict=True)]
+            table = pa.Table.from_arrays(
+                [array for array, _ in arrays],
+                schema=pa.schema([
+                    pa.field(f"c{i}", array.type, metadata={_MIXED_KEY: b"1"} if mixed else None)
+                    for i, (array, mixed) in enumerate(arrays)
+                ]),
+            )
+            pq.write_table(table, os.path.join(scratch, f"part-{parts:05d}.parquet"))
+            rows += len(chunk)
+            parts += 1
+
+        manifest = {
+            "version": STAGING_VERSION,
+            "source": os.path.basename(file_path),
+            "sheet": sheet_name,
+            "header": header,
+            "rows": rows,
+            "parts": parts,
+            "parse_seconds": round(time.time() - start_time, 3),
+        }
+        with open(os.path.join(scratch, MANIFEST), "w", encoding="utf-8") as handle:
+            json.dump(manifest, handle)
+        try:
+            os.rename(scratch, entry_dir)
+        except OSError:
+            # Another process staged the same contents first
+            shutil.rmtree(scratch, ignore_errors=True)
+        return manifest
+    except BaseException:
+        shutil.rmtree(scratch, ignore_errors=True)
+        raise
+
+
+class StagingCache:
+    """Parsed workbook sheets staged as Parquet, keyed by file hash and sheet"""
+
+    def __init__(self, path: str, max_bytes: Optional[int] = 2 * 1024 ** 3, workers: Optional[int] = None):
+        """
+        Args:
+            path: Cache directory (created on first use)
+            max_bytes: Size above which least recently used entries are removed (None: unbounded)
+            workers: Parse processes (default: CPU count)
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.workers = workers or os.cpu_count() or 1
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def entry_key(self, digest: str, sheet_name: Optional[str]) -> str:
+        raw = json.dumps([STAGING_VERSION, digest, sheet_name])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:40]
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.path, key)
+
+    def stage(self, sources: Sequence[Tuple[str, Optional[str]]], chunk_size: int = 5000,
+              workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Make sure every (file, sheet) is staged, parsing the missing ones in parallel
+
+        Args:
+            sources: (workbook path, sheet name or None for the first sheet)
+            chunk_size: Rows per Parquet part
+            workers: Parse processes (default: the cache's setting)
+
+        Returns:
+            One manifest per source, in order, with "path" (the staged
+            entry), "file" and "cached" added
+        """
+        os.makedirs(self.path, exist_ok=True)
+        keys = [self.entry_key(file_digest(file_path), sheet_name) for file_path, sheet_name in sources]
+
+        pending: Dict[str, Tuple[str, Optional[str]]] = {}
+        for key, source in zip(keys, sources, strict=True):
+            if key not in pending and not os.path.exists(os.path.join(self._entry_dir(key), MANIFEST)):
+                pending[key] = source
+
+        if len(pending) > 1 and (workers or self.workers) > 1:
+            # Spawned, not forked: the server process holds threads and pooled sockets
+            with ProcessPoolExecutor(
+                max_workers=min(workers or self.workers, len(pending)),
+                mp_context=multiprocessing.get_context("spawn"),
+            ) as pool:
+                futures = [
+                    pool.submit(_stage_sheet, file_path, sheet_name, self._entry_dir(key), chunk_size)
+                    for key, (file_path, sheet_name) in pending.items()
+                ]
+                for future in futures:
+                    future.result()
+        else:
+            for key, (file_path, sheet_name) in pending.items():
+                _stage_sheet(file_path, sheet_name, self._entry_dir(key), chunk_size)
+
+        entries = []
+        for key, (file_path, _) in zip(keys, sources, strict=True):
+            entry_dir = self._entry_dir(key)
+            with open(os.path.join(entry_dir, MANIFEST), encoding="utf-8") as handle:
+                manifest = json.load(handle)
+            # Recently used entries survive eviction
+            os.utime(entry_dir)
+            # A file listed twice (or a copy of it) is parsed once
+            cached = pending.pop(key, None) is None
+            if cached:
+                self.hits += 1
+            else:
+                self.misses += 1
+            entries.append({**manifest, "file": file_path, "path": entry_dir, "cached": cached})
+
+        self._evict(keep={entry["path"] for entry in entries})
+        return entries
+
+    @staticmethod
+    def iter_chunks(entry: Dict[str, Any]) -> Iterator[RecordChunk]:
+        """Stream a staged sheet as (header, rows) chunks, one Parquet part at a time"""
+        import pyarrow.parquet as pq
+
+        header = entry["header"]
+        for part in range(entry["parts"]):
+            table = pq.read_table(os.path.join(entry["path"], f"part-{part:05d}.parquet"))
+            columns = []
+            for field, column in zip(table.schema, table.columns, strict=True):
+                values = column.to_pylist()
+                if field.metadata and _MIXED_KEY in field.metadata:
+                    values = [_decode_mixed(value) for value in values]
+                columns.append(values)
+            yield header, list(zip(*columns, strict=True))
+
+    def _size(self, entry_dir: str) -> int:
+        return sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+
+    def _evict(self, keep: set) -> None:
+        """Remove least recently used entries above max_bytes (never the ones just staged)"""
+        if self.max_bytes is None:
+            return
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.is_dir() and not entry.name.endswith(".tmp"):
+                entries.append((entry.stat().st_mtime, entry.path, self._size(entry.path)))
+        total = sum(size for _, _, size in entries)
+        for _, entry_dir, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if entry_dir in keep:
+                continue
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove every staged entry"""
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics
+
+        Returns:
+            Hits, misses, evictions, entries and bytes on disk
+        """
+        entries = 0
+        size = 0
+        if os.path.isdir(self.path):
+            for entry in os.scandir(self.path):
+                if entry.is_dir() and not entry.name.endswith(".tmp"):
+                    entries += 1
+                    size += self._size(entry.path)
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+            "workers": self.workers,
+        }
+
+
+def build_staging_cache() -> Optional[StagingCache]:
+    """
+    Build the workbook staging cache from environment configuration
+
+    Environment:
+        INGEST_STAGING_ENABLED: "false" disables the cache (workbooks are streamed)
+        INGEST_STAGING_PATH: Cache directory (default <tmp>/xdive_staging)
+        INGEST_STAGING_MAX_MB: Size budget in MiB (default 2048, "none" = unbounded)
+        INGEST_WORKERS: Parse processes (default: CPU count)
+
+    Returns:
+        Configured cache, or None when disabled or pyarrow is not installed
+    """
+    if os.getenv("INGEST_STAGING_ENABLED", "true").lower() == "false":
+        return None
+    if importlib.util.find_spec("pyarrow") is None:
+        print("WARNING: workbook staging cache disabled: pyarrow is not installed "
+              "(pip install -r requirements.txt, or set INGEST_STAGING_ENABLED=false)")
+        return None
+
+    max_mb = os.getenv("INGEST_STAGING_MAX_MB", "2048")
+    return StagingCache(
+        path=os.getenv("INGEST_STAGING_PATH", os.path.join(tempfile.gettempdir(), "xdive_staging")),
+        max_bytes=None if max_mb.lower() == "none" else int(float(max_mb) * 1024 * 1024),
+        workers=int(os.getenv("INGEST_WORKERS", "0")) or None,
+    )
+
+
+# Global staging cache instance (None when disabled)
+staging_cache = build_staging_cache()
@@ -0,0 +1,172 @@
+"""
+Startup warm-up and readiness
+
+The heavy services are built lazily so importing the app (every worker
+boot, every --reload) stays fast: the Gemini client and its import, the
+chromadb similarity index, the columnar replica and the schema snapshot
+are all created on first use. The lifespan hook opens the database pools
+before serving and then runs ``warm_up`` in the background, so the first
+requests do not pay for those either:
+
+    schema      pg_catalog snapshot, sampled prompt values, rollup state
+    replica     columnar replica of revenue
+    model       google.generativeai import and the Gemini model
+    nl_cache    similarity index of the NL-to-SQL cache (chromadb)
+    llm         optional priming Gemini call (WARMUP_LLM=true)
+
+``warmup_state`` records every step for the readiness endpoint: the
+service is ready once the database is open and warm-up has finished.
+Failed warm-up steps do not block readiness (the service falls back as it
+would at runtime) but are listed as degraded.
+"""
+from typing import Any, Callable, Dict, Optional
+import os
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+PENDING = "pending"
+OK = "ok"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+# Question of the priming Gemini call
+PRIMING_QUESTION = "How many rows does the revenue table have?"
+
+
+class WarmupState:
+    """Outcome and duration of each startup step"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.steps: Dict[str, Dict[str, Any]] = {}
+
+    def begin(self, step: str) -> None:
+        self.steps[step] = {"status": PENDING, "seconds": None, "error": None}
+
+    def end(self, step: str, status: str, started: float, error: Optional[str] = None) -> None:
+        self.steps[step] = {"status": status, "seconds": round(time.perf_counter() - started, 3), "error": error}
+
+    @property
+    def live_seconds(self) -> float:
+        return time.time() - self.started_at
+
+    @property
+    def ready(self) -> bool:
+        """Database open and warm-up finished"""
+        return self.steps.get("database", {}).get("status") == OK and self.finished_at is not None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Readiness summary for the health endpoints"""
+        return {
+            "ready": self.ready,
+            "warm": self.finished_at is not None,
+            "uptime_seconds": round(self.live_seconds, 3),
+            "warmup_seconds": round(self.finished_at - self.started_at, 3) if self.finished_at else None,
+            "degraded": [step for step, outcome in self.steps.items() if outcome["status"] == FAILED],
+            "steps": dict(self.steps),
+        }
+
+
+# Global warm-up state (reset at each lifespan startup)
+warmup_state = WarmupState()
+
+
+async def _step(step: str, action: Callable[[], Any], blocking: bool = True) -> None:
+    """Run one warm-up step (on the threadpool when it blocks) and record its outcome"""
+    warmup_state.begin(step)
+    started = time.perf_counter()
+    try:
+        result = await run_in_threadpool(action) if blocking else await action()
+    except Exception as e:
+        print(f"WARNING: warm-up step '{step}' failed: {e}")
+        warmup_state.end(step, FAILED, started, str(e))
+        return
+    warmup_state.end(step, SKIPPED if result is False else OK, started)
+
+
+async def open_database() -> None:
+    """Open the psycopg2 pool (pre-warmed to DB_POOL_MIN_SIZE) and the async pool"""
+    from db.connection import db
+
+    warmup_state.reset()
+    warmup_state.begin("database")
+    started = time.perf_counter()
+    try:
+        db.initialize()
+        print("Database connection initialized successfully")
+    except Exception as e:
+        print(f"CRITICAL: Database initialization failed: {e}")
+        warmup_state.end("database", FAILED, started, str(e))
+        return
+    warmup_state.end("database", OK, started)
+
+    # Async routes fall back to running psycopg2 calls on the threadpool without it
+    await _step("async_database", db.initialize_async, blocking=False)
+
+
+def _load_schema() -> None:
+    from db.schema import schema_catalog
+    from services.prompt_builder import prompt_builder
+    from services.rollups import rollup_manager
+
+    schema_catalog.get_snapshot()
+    prompt_builder.ensure_values()
+    rollup_manager.load()
+
+
+def _load_replica():
+    from services.columnar import columnar_replica
+
+    if columnar_replica is None:
+        return False
+    stats = columnar_replica.load()
+    print(f"Columnar replica loaded: {stats['rows']} rows in {stats['seconds']}s")
+
+
+def _build_model():
+    from services.gemini_sql import sql_service
+
+    return sql_service.model is not None
+
+
+def _open_nl_cache():
+    from services.gemini_sql import sql_service
+
+    if sql_service.nl_cache is None:
+        return False
+    return sql_service.nl_cache.open_index() is not None
+
+
+async def _prime_llm():
+    if os.getenv("WARMUP_LLM", "false").lower() != "true":
+        return False
+    from services.gemini_sql import sql_service
+    from services.prompts import get_full_prompt
+
+    # Opens the HTTP/gRPC channel and authenticates before the first question
+    await sql_service.model.generate_content_async(get_full_prompt(PRIMING_QUESTION, sql_service.FALLBACK_DDL))
+
+
+async def warm_up() -> Dict[str, Any]:
+    """
+    Build the lazily created services ahead of the first requests
+
+    Returns:
+        Readiness summary (see WarmupState.snapshot)
+    """
+    database_open = warmup_state.steps.get("database", {}).get("status") == OK
+    if database_open:
+        await _step("schema", _load_schema)
+        # Queries fall back to PostgreSQL until a replica reload succeeds
+        await _step("replica", _load_replica)
+    await _step("model", _build_model)
+    await _step("nl_cache", _open_nl_cache)
+    await _step("llm", _prime_llm, blocking=False)
+    warmup_state.finished_at = time.time()
+    print(f"Warm-up finished in {warmup_state.finished_at - warmup_state.started_at:.2f}s")
+    return warmup_state.snapshot()
@@ -1,3 +1,4 @@
+import io
 import os
 import pandas as pd
 import psycopg2
@@ -21,11 +22,15 @@ cur.execute("SELECT version();")
 print(cur.fetchone())
 
 
-for i, row in df.iterrows():
-    cur.execute(
-        "INSERT INTO employees (emp_id,emp_name,salary,support,expense,cost) VALUES (%s, %s, %s, %s, %s, %s)",
-        (row['emp_id'], row['emp_name'], row['salary'], row['support'], row['expense'], row['cost'])
-    )
+# One COPY instead of an INSERT per row
+buffer = io.StringIO()
+df[['emp_id', 'emp_name', 'salary', 'support', 'expense', 'cost']].to_csv(buffer, index=False, header=False)
+buffer.seek(0)
+cur.copy_expert(
+    "COPY employees (emp_id,emp_name,salary,support,expense,cost) FROM STDIN WITH (FORMAT csv)",
+    buffer
+)
+conn.commit()
 
 cur.close()
 conn.close()
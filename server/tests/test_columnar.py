@@ -0,0 +1,178 @@
+"""
+ColumnarReplica.execute against fixed in-memory snapshots (no database)
+
+Expected results follow PostgreSQL semantics: NULLs sort last ascending
+and first descending, SUM over only NULLs is NULL, COUNT(column) skips
+NULLs. Run from the server directory: python -m pytest tests
+"""
+from datetime import date
+
+import numpy as np
+import pytest
+
+from services.columnar import ColumnarReplica, _ColumnBuilder, _Snapshot
+
+
+COLUMNS = [
+    ("customer", "text"),
+    ("skill", "text"),
+    ("month", "date"),
+    ("actual_revenue", "real"),
+    ("actual_hrs", "integer"),
+]
+
+ROWS = [
+    ("Acme", "Python", date(2025, 1, 1), 100.0, 10),
+    ("acme", "Java", date(2025, 1, 1), 50.0, 5),
+    ("Beta", "Python", date(2025, 2, 1), 200.0, None),
+    (None, "Go", date(2025, 2, 1), 30.0, 3),
+    ("Cyan", None, None, None, 7),
+    ("Beta", "Java", date(2025, 3, 1), 20.0, 2),
+]
+
+
+def _replica(c_collation: bool, batch_size: int = 4) -> ColumnarReplica:
+    builders = [_ColumnBuilder(name, pg_type) for name, pg_type in COLUMNS]
+    # Several batches, as in a load: dictionary codes must be remapped across them
+    for start in range(0, len(ROWS), batch_size):
+        batch = ROWS[start:start + batch_size]
+        for builder, values in zip(builders, zip(*batch)):
+            builder.extend(values)
+    snapshot = _Snapshot({builder.name: builder.finish() for builder in builders}, len(ROWS), c_collation, 0.0)
+    replica = ColumnarReplica(database=None, refresh_seconds=0)
+    replica._snapshot = snapshot
+    return replica
+
+
+@pytest.fixture
+def replica():
+    """Snapshot of a database with the C collation (text ranges answered in memory)"""
+    return _replica(c_collation=True)
+
+
+@pytest.fixture
+def collated():
+    """Snapshot of a database with a linguistic collation such as en_US.UTF-8"""
+    return _replica(c_collation=False)
+
+
+def rows(result):
+    return [tuple(row.values()) for row in result["data"]]
+
+
+def test_batches_build_sorted_dictionaries():
+    column = _replica(c_collation=True, batch_size=2)._snapshot.columns["customer"]
+    assert column.dictionary == ["Acme", "Beta", "Cyan", "acme"]
+    assert [column.value(code) for code in column.values.tolist()] == [row[0] for row in ROWS]
+    hours = _replica(c_collation=True, batch_size=2)._snapshot.columns["actual_hrs"]
+    assert hours.values.dtype == np.int64
+    assert hours.valid.tolist() == [row[4] is not None for row in ROWS]
+
+
+def test_null_groups_sort_last_ascending(replica):
+    result = replica.execute(
+        "SELECT customer, SUM(actual_revenue) AS total, COUNT(*) AS n FROM revenue GROUP BY customer ORDER BY customer"
+    )
+    assert result["columns"] == ["customer", "total", "n"]
+    assert result["column_types"] == ["text", "float", "integer"]
+    assert rows(result) == [
+        ("Acme", 100.0, 1),
+        ("Beta", 220.0, 2),
+        ("Cyan", None, 1),
+        ("acme", 50.0, 1),
+        (None, 30.0, 1),
+    ]
+
+
+def test_order_by_alias_descending_puts_nulls_first(replica):
+    result = replica.execute(
+        "SELECT customer, SUM(actual_revenue) AS total FROM revenue GROUP BY customer ORDER BY total DESC LIMIT 3"
+    )
+    assert rows(result) == [("Cyan", None), ("Beta", 220.0), ("Acme", 100.0)]
+
+
+def test_order_by_position_limit_offset(replica):
+    result = replica.execute(
+        "SELECT customer, COUNT(*) FROM revenue GROUP BY customer ORDER BY 2 DESC, 1 LIMIT 2 OFFSET 1"
+    )
+    # Unaliased aggregates are named like in PostgreSQL
+    assert result["columns"] == ["customer", "count"]
+    assert rows(result) == [("Acme", 1), ("Cyan", 1)]
+
+
+def test_null_date_group_and_counts(replica):
+    result = replica.execute("SELECT month, SUM(actual_revenue) FROM revenue GROUP BY month ORDER BY month")
+    assert rows(result) == [
+        (date(2025, 1, 1), 150.0),
+        (date(2025, 2, 1), 230.0),
+        (date(2025, 3, 1), 20.0),
+        (None, None),
+    ]
+    result = replica.execute("SELECT COUNT(actual_hrs) AS hrs, COUNT(*) AS n, AVG(actual_hrs) AS avg_hrs FROM revenue")
+    assert rows(result) == [(5, 6, 5.4)]
+
+
+def test_is_null_and_numeric_between(replica):
+    result = replica.execute("SELECT COUNT(*) AS n FROM revenue WHERE customer IS NULL OR skill IS NULL")
+    # OR is outside the subset
+    assert result is None
+    result = replica.execute("SELECT COUNT(*) AS n FROM revenue WHERE customer IS NOT NULL AND skill IS NULL")
+    assert rows(result) == [(1,)]
+    result = replica.execute("SELECT COUNT(*) AS n FROM revenue WHERE actual_revenue BETWEEN 30 AND 100")
+    assert rows(result) == [(3,)]
+    # NULL revenue is neither between nor not between
+    result = replica.execute("SELECT COUNT(*) AS n FROM revenue WHERE actual_revenue NOT BETWEEN 30 AND 100")
+    assert rows(result) == [(2,)]
+
+
+def test_text_between_with_c_collation(replica):
+    # Byte order: 'B' < 'Beta' < 'Cyan' < 'a' < 'acme'
+    result = replica.execute("SELECT COUNT(*) AS n FROM revenue WHERE customer BETWEEN 'B' AND 'a'")
+    assert rows(result) == [(3,)]
+    result = replica.execute("SELECT COUNT(*) AS n FROM revenue WHERE customer NOT BETWEEN 'B' AND 'a'")
+    assert rows(result) == [(2,)]
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT COUNT(*) FROM revenue WHERE customer BETWEEN 'a' AND 'c'",
+    "SELECT COUNT(*) FROM revenue WHERE customer NOT BETWEEN 'a' AND 'c'",
+    "SELECT COUNT(*) FROM revenue WHERE customer < 'b'",
+    "SELECT MIN(customer) FROM revenue",
+])
+def test_text_ranges_fall_back_under_other_collations(collated, query):
+    # en_US orders 'acme' next to 'Acme'; only PostgreSQL knows the collation
+    assert collated.execute(query) is None
+
+
+def test_text_equality_and_date_between_under_other_collations(collated):
+    result = collated.execute("SELECT COUNT(*) AS n FROM revenue WHERE customer = 'Beta'")
+    assert rows(result) == [(2,)]
+    result = collated.execute(
+        "SELECT COUNT(*) AS n FROM revenue WHERE month BETWEEN '2025-01-01' AND '2025-02-01'"
+    )
+    assert rows(result) == [(4,)]
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT customer, SUM(actual_revenue) FROM revenue GROUP BY customer HAVING SUM(actual_revenue) > 100",
+    "SELECT * FROM revenue",
+    "SELECT customer FROM revenue",
+    "SELECT COUNT(*) FROM employees",
+    "SELECT COUNT(*) FROM revenue r JOIN employees e ON e.name = r.customer",
+    "SELECT COUNT(*) FROM revenue WHERE customer IN (SELECT customer FROM revenue)",
+    "SELECT COUNT(DISTINCT customer) FROM revenue",
+    "SELECT SUM(actual_revenue) OVER () FROM revenue",
+    "SELECT SUM(customer) FROM revenue",
+    "SELECT COUNT(*) FROM revenue WHERE emp_name = 'x'",
+    'SELECT "customer", COUNT(*) FROM revenue GROUP BY "customer"',
+])
+def test_unsupported_sql_returns_none(replica, query):
+    assert replica.execute(query) is None
+    assert replica.unsupported == 1
+
+
+def test_parameters_and_missing_snapshot_return_none(replica):
+    query = "SELECT COUNT(*) FROM revenue WHERE customer = %(customer)s"
+    assert replica.execute(query, {"customer": "Beta"}) is None
+    replica._snapshot = None
+    assert replica.execute("SELECT COUNT(*) FROM revenue") is None
@@ -0,0 +1,127 @@
+"""
+RollupManager.rewrite against a fixed catalog state (no database)
+
+Run from the server directory: python -m pytest tests
+"""
+import pytest
+
+from services.rollups import RollupManager, rollup_table
+
+
+COLUMN_TYPES = {
+    "month": "date",
+    "customer": "text",
+    "skill": "text",
+    "emp_name": "text",
+    "actual_revenue": "real",
+    "actual_hrs": "integer",
+}
+
+CUSTOMER = rollup_table("customer")
+MONTH = rollup_table(None)
+
+
+@pytest.fixture
+def manager():
+    manager = RollupManager(database=None)
+    manager._column_types = dict(COLUMN_TYPES)
+    # The skill rollup is not installed
+    manager._tables = {None: MONTH, "customer": CUSTOMER}
+    manager.loaded = True
+    return manager
+
+
+def test_group_by_dimension_reads_its_rollup(manager):
+    rewritten, table = manager.rewrite("SELECT customer, SUM(actual_revenue) FROM revenue GROUP BY customer")
+    assert table == CUSTOMER
+    # The unaliased aggregate keeps PostgreSQL's output name
+    assert rewritten == (
+        'SELECT customer, CAST(SUM(actual_revenue_sum) AS real) AS "sum" '
+        f"FROM {CUSTOMER} GROUP BY customer"
+    )
+
+
+def test_totals_read_the_month_rollup(manager):
+    rewritten, table = manager.rewrite(
+        "SELECT COUNT(*), COUNT(actual_hrs), AVG(actual_hrs), MIN(actual_revenue) FROM revenue "
+        "WHERE month BETWEEN '2025-01-01' AND '2025-03-01'"
+    )
+    assert table == MONTH
+    assert 'CAST(COALESCE(SUM(row_count), 0) AS bigint) AS "count"' in rewritten
+    assert 'CAST(COALESCE(SUM(actual_hrs_count), 0) AS bigint) AS "count"' in rewritten
+    # Integer AVG recombines as numeric sum / count
+    assert '(SUM(actual_hrs_sum) / CAST(NULLIF(SUM(actual_hrs_count), 0) AS numeric)) AS "avg"' in rewritten
+    assert 'MIN(actual_revenue_min) AS "min"' in rewritten
+    assert rewritten.endswith("WHERE month BETWEEN '2025-01-01' AND '2025-03-01'")
+
+
+def test_aliases_having_order_by_and_limit_are_kept(manager):
+    rewritten, table = manager.rewrite(
+        "SELECT customer, SUM(actual_revenue) AS total FROM revenue GROUP BY customer "
+        "HAVING SUM(actual_revenue) > 100 ORDER BY total DESC LIMIT 5"
+    )
+    assert table == CUSTOMER
+    assert rewritten == (
+        f"SELECT customer, CAST(SUM(actual_revenue_sum) AS real) AS total FROM {CUSTOMER} GROUP BY customer "
+        "HAVING CAST(SUM(actual_revenue_sum) AS real) > 100 ORDER BY total DESC LIMIT 5"
+    )
+
+
+def test_null_group_filters_are_kept(manager):
+    rewritten, table = manager.rewrite(
+        "SELECT month, COUNT(*) FROM revenue WHERE customer IS NULL OR month IS NULL GROUP BY month"
+    )
+    assert table == CUSTOMER
+    assert "WHERE customer IS NULL OR month IS NULL GROUP BY month" in rewritten
+
+
+def test_table_alias_and_text_between(manager):
+    rewritten, table = manager.rewrite(
+        "SELECT r.customer, MAX(r.actual_hrs) FROM revenue r "
+        "WHERE r.customer BETWEEN 'a' AND 'c' GROUP BY r.customer"
+    )
+    assert table == CUSTOMER
+    # The range test runs in PostgreSQL on the rollup, under the database collation
+    assert rewritten == (
+        f'SELECT r.customer, MAX(r.actual_hrs_max) AS "max" FROM {CUSTOMER} r '
+        "WHERE r.customer BETWEEN 'a' AND 'c' GROUP BY r.customer"
+    )
+
+
+@pytest.mark.parametrize("query", [
+    # Two dimensions
+    "SELECT customer, month, SUM(actual_revenue) FROM revenue GROUP BY customer, skill, month",
+    # Measure outside an aggregate
+    "SELECT customer, actual_revenue FROM revenue GROUP BY customer, actual_revenue",
+    "SELECT SUM(actual_revenue * 2) FROM revenue",
+    # Column that is not in the rollups
+    "SELECT emp_name, COUNT(*) FROM revenue GROUP BY emp_name",
+    # Dimension whose rollup is not installed
+    "SELECT skill, COUNT(*) FROM revenue GROUP BY skill",
+    # Constructs that change meaning over pre-aggregated rows
+    "SELECT COUNT(DISTINCT customer) FROM revenue",
+    "SELECT customer, SUM(actual_revenue) OVER () FROM revenue",
+    "SELECT customer, STRING_AGG(skill, ',') FROM revenue GROUP BY customer",
+    "SELECT r.customer, COUNT(*) FROM revenue r JOIN employees e ON e.name = r.emp_name GROUP BY r.customer",
+    "SELECT COUNT(*) FROM revenue WHERE customer IN (SELECT customer FROM revenue)",
+    "SELECT COUNT(*) FROM revenue UNION SELECT COUNT(*) FROM revenue",
+    # Another table, or no aggregate at all
+    "SELECT COUNT(*) FROM employees",
+    "SELECT customer FROM revenue",
+    # Quoted identifiers are not analyzed
+    'SELECT "customer", COUNT(*) FROM revenue GROUP BY "customer"',
+])
+def test_ineligible_queries_return_none(manager, query):
+    assert manager.rewrite(query) is None
+    assert manager.skipped == 1
+
+
+def test_disabled_or_unloaded_returns_none(manager):
+    query = "SELECT COUNT(*) FROM revenue"
+    manager.rewrite_enabled = False
+    assert manager.rewrite(query) is None
+    manager.rewrite_enabled = True
+    manager.loaded = False
+    assert manager.rewrite(query) is None
+    manager.loaded = True
+    assert manager.rewrite(query) is not None
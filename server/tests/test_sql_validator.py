@@ -0,0 +1,107 @@
+"""
+SQLValidator tokenizer and verdicts
+
+Keywords only count outside literals and comments, the way PostgreSQL
+lexes the text. Run from the server directory: python -m pytest tests
+"""
+import pytest
+
+from services.sql_validator import SQLValidator
+
+
+def valid(query):
+    return SQLValidator._check(query)[0]
+
+
+def analyze(query):
+    return SQLValidator._scan(query)
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT 'DROP TABLE revenue' AS text",
+    "SELECT 'it''s; DELETE' FROM revenue",
+    "SELECT E'\\' DROP' FROM revenue",
+    "SELECT E'a\\\\' FROM revenue WHERE x = 'b'",
+    "SELECT \"DROP\" FROM revenue",
+    "SELECT $$ DROP TABLE revenue; $$",
+    "SELECT $tag$ it's $$ ; DELETE $tag$",
+    "SELECT $a$ $b$ DROP $b$ $a$",
+    "SELECT 1 /* DROP */ FROM revenue",
+    "SELECT 1 -- ; DROP TABLE revenue",
+    "SELECT * FROM revenue WHERE id = $1",
+])
+def test_keywords_inside_literals_and_comments_are_ignored(query):
+    assert valid(query)
+
+
+def test_dollar_quote_needs_its_own_closing_tag():
+    # PostgreSQL reads $a$ $$ ' $a$ as one literal, so DROP is a second statement
+    query = "SELECT $a$ $$ ' $a$; DROP TABLE revenue; --'"
+    assert not valid(query)
+    assert "DROP" in analyze(query).keywords
+    # $$ does not close $a$ (nor $a$ a $$ string)
+    assert analyze("SELECT $a$ x $$ y $a$").keywords == {"SELECT"}
+    assert analyze("SELECT $$ x $a$ y $$").keywords == {"SELECT"}
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT * FROM revenue; SELECT 2",
+    "SELECT 1; COMMIT",
+    "SELECT $a$ x $a$; COMMIT; SELECT 1",
+    "SELECT 1;SELECT 2;",
+    "SELECT 1; /* c */ SELECT 2",
+])
+def test_multiple_statements_are_rejected(query):
+    assert analyze(query).multiple_statements
+    assert not valid(query)
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT 1;",
+    "SELECT 1 ;  ",
+    "SELECT 1; -- trailing comment",
+    "SELECT 1; /* trailing */",
+    "SELECT ';' AS semicolon FROM revenue",
+])
+def test_trailing_semicolons_and_quoted_semicolons_are_allowed(query):
+    assert not analyze(query).multiple_statements
+    assert valid(query)
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT 'unclosed FROM revenue",
+    "SELECT \"unclosed FROM revenue",
+    "SELECT E'unclosed \\' FROM revenue",
+    "SELECT $a$ unclosed FROM revenue",
+    "SELECT $a$ closed by the wrong tag $$",
+    "SELECT 1 /* unclosed",
+])
+def test_unclosed_literals_and_comments_are_rejected(query):
+    assert analyze(query).unclosed
+    assert not valid(query)
+
+
+def test_nested_block_comment_is_not_treated_as_closed_early():
+    # PostgreSQL nests /* */; the scanner stops at the first */, leaving "*/"
+    # outside, which must not be read as a comment or literal boundary
+    analysis = analyze("SELECT 1 /* outer /* inner */ DROP */ FROM revenue")
+    assert "DROP" in analysis.keywords
+    assert not valid("SELECT 1 /* outer /* inner */ DROP */ FROM revenue")
+
+
+@pytest.mark.parametrize("query, message", [
+    ("", "Query cannot be empty"),
+    ("DELETE FROM revenue", "Dangerous SQL keyword 'DELETE'"),
+    ("WITH t AS (SELECT 1) SELECT * FROM t", "Only SELECT queries are allowed"),
+    ("SELECT (1", "Unbalanced parentheses"),
+    ("SELECT 1 UNION SELECT 2", "Potentially malicious SQL pattern"),
+])
+def test_error_messages(query, message):
+    ok, error = SQLValidator._check(query)
+    assert not ok
+    assert error.startswith(message)
+
+
+def test_normalize_keeps_literals_verbatim():
+    normalized = SQLValidator._normalize_query("SELECT  'a  b' , $$ x  y $$ -- c\n FROM   revenue")
+    assert normalized == "SELECT 'a  b' , $$ x  y $$ FROM revenue"